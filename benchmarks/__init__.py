@@ -0,0 +1 @@
+"""Performance benchmarks for the site build pipeline."""
@@ -0,0 +1,163 @@
+"""Synthetic ``notes/`` tree generator for benchmarks.
+
+The generated tree mimics the real notes: nested category directories with an
+``index.md`` each, Chinese and English titles, front matter with and without
+``slug``, cross-links in both ``.md`` and legacy ``.html`` form, tables and
+fenced code blocks. Output is fully determined by the seed.
+"""
+from __future__ import annotations
+
+import random
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+from site_builder import config
+
+_ZH_TOPICS = ["检索增强生成", "大语言模型", "向量数据库", "设计模式", "微服务", "数据库", "算法", "机器学习", "提示工程"]
+_EN_TOPICS = ["RAG", "LLM", "Python", "Docker", "Kubernetes", "Redis", "MongoDB", "TypeScript", "Prompt", "NLP"]
+_ZH_WORDS = ["实践", "原理", "入门", "总结", "对比", "架构", "优化", "笔记", "指南", "问题", "性能", "部署"]
+_EN_WORDS = ["guide", "notes", "deep", "dive", "intro", "patterns", "tuning", "design", "tips", "internals"]
+_ZH_SENTENCES = [
+    "这一节介绍核心概念以及在实际项目中的使用方式。",
+    "为了降低延迟，我们在查询路径上加入了缓存，并记录了命中率。",
+    "下面的示例展示了如何把配置拆分到独立的模块中。",
+    "在生产环境中需要关注资源占用、失败重试和监控告警。",
+]
+_EN_SENTENCES = [
+    "This section walks through the core ideas and how they are used in practice.",
+    "Batching requests amortises the fixed cost of each call across many items.",
+    "The example below keeps configuration in a separate module.",
+]
+_CODE_SAMPLES = [
+    ("python", "def handler(event):\n    items = [x for x in event['items'] if x]\n    return {'count': len(items)}\n"),
+    ("javascript", "export async function load(url) {\n  const res = await fetch(url);\n  return res.json();\n}\n"),
+    ("bash", "docker compose up -d\ncurl -s http://localhost:8080/health | jq .\n"),
+]
+
+
+@dataclass
+class CorpusSpec:
+    posts: int = 1000
+    depth: int = 3
+    fanout: int = 5
+    seed: int = 0
+    slug_ratio: float = 0.5
+    links_per_post: int = 3
+    code_ratio: float = 0.6
+    paragraphs: int = 6
+
+
+@dataclass
+class Corpus:
+    root: Path
+    spec: CorpusSpec
+    posts: List[Path] = field(default_factory=list)
+    directories: List[Path] = field(default_factory=list)
+
+    @property
+    def notes_dir(self) -> Path:
+        return self.root / "notes"
+
+
+def _title(rng: random.Random, index: int) -> str:
+    if rng.random() < 0.6:
+        return f"{rng.choice(_ZH_TOPICS)}{rng.choice(_ZH_WORDS)}{rng.choice(_ZH_WORDS)} {index}"
+    return f"{rng.choice(_EN_TOPICS)} {rng.choice(_EN_WORDS)} {rng.choice(_EN_WORDS)} {index}"
+
+
+def _make_directories(notes_dir: Path, spec: CorpusSpec, rng: random.Random) -> List[Path]:
+    dirs: List[Path] = []
+    frontier = [notes_dir]
+    for level in range(spec.depth):
+        next_frontier: List[Path] = []
+        for parent in frontier:
+            for i in range(spec.fanout if level == 0 else rng.randint(1, spec.fanout)):
+                name = f"{rng.choice(_ZH_WORDS)}{i}" if rng.random() < 0.5 else f"{rng.choice(_EN_WORDS)}-{i}"
+                path = parent / name
+                if path in dirs:
+                    continue
+                dirs.append(path)
+                next_frontier.append(path)
+        frontier = next_frontier
+    return dirs
+
+
+def _body(rng: random.Random, spec: CorpusSpec, title: str, post: Path, others: List[Path]) -> str:
+    lines = [f"# {title}", ""]
+    for p in range(spec.paragraphs):
+        lines.append(f"## {rng.choice(_ZH_WORDS)} {p + 1}")
+        lines.append("")
+        sentences = _ZH_SENTENCES if rng.random() < 0.7 else _EN_SENTENCES
+        lines.append(" ".join(rng.choice(sentences) for _ in range(rng.randint(2, 5))))
+        lines.append("")
+        if p == 1:
+            lines.append("| 名称 | 说明 |")
+            lines.append("| --- | --- |")
+            for topic in rng.sample(_EN_TOPICS, 3):
+                lines.append(f"| {topic} | **{rng.choice(_ZH_WORDS)}** `{topic.lower()}` |")
+            lines.append("")
+        if p == 2 and rng.random() < spec.code_ratio:
+            lang, code = rng.choice(_CODE_SAMPLES)
+            lines.append(f"```{lang}")
+            lines.append(code.rstrip("\n"))
+            lines.append("```")
+            lines.append("")
+
+    if others:
+        lines.append("## 相关阅读")
+        lines.append("")
+        for target in others:
+            # Siblings are linked relatively, everything else from the site root.
+            href = target.name if target.parent == post.parent else f"/{target.as_posix()}"
+            if rng.random() < 0.3:
+                href = href[:-3] + ".html"
+            lines.append(f"- [{target.stem}]({href})")
+        lines.append("- [外部链接](https://example.com/docs)")
+        lines.append("")
+    return "\n".join(lines)
+
+
+def generate_corpus(root: Path, spec: CorpusSpec) -> Corpus:
+    """(Re)create ``root`` with a ``notes/`` tree described by ``spec`` plus the site template."""
+    rng = random.Random(spec.seed)
+    if root.exists():
+        shutil.rmtree(root)
+    notes_dir = root / "notes"
+    notes_dir.mkdir(parents=True)
+    shutil.copy2(config.TEMPLATE_FILE, root / "template.html")
+
+    corpus = Corpus(root=root, spec=spec)
+    corpus.directories = _make_directories(notes_dir, spec, rng)
+    for directory in corpus.directories:
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / "index.md").write_text(
+            f"# {directory.name}\n\n{rng.choice(_ZH_SENTENCES)}\n", encoding="utf-8"
+        )
+
+    leaves = corpus.directories or [notes_dir]
+    rel_posts: List[Path] = []
+    for i in range(spec.posts):
+        directory = rng.choice(leaves)
+        rel_posts.append((directory / f"post-{i}.md").relative_to(root))
+    by_dir: Dict[Path, List[Path]] = {}
+    for rel in rel_posts:
+        by_dir.setdefault(rel.parent, []).append(rel)
+
+    for i, rel in enumerate(rel_posts):
+        title = _title(rng, i)
+        front = ["---", f"title: {title}"]
+        if rng.random() < spec.slug_ratio:
+            front.append(f"slug: bench-post-{i}")
+        front.append("---")
+        siblings = by_dir[rel.parent]
+        others = [
+            rng.choice(siblings) if rng.random() < 0.4 else rel_posts[rng.randrange(len(rel_posts))]
+            for _ in range(spec.links_per_post)
+        ]
+        text = "\n".join(front) + "\n\n" + _body(rng, spec, title, rel, [o for o in others if o != rel]) + "\n"
+        path = root / rel
+        path.write_text(text, encoding="utf-8")
+        corpus.posts.append(path)
+    return corpus
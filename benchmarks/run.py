@@ -0,0 +1,334 @@
+"""Benchmark harness for the site build pipeline.
+
+Generates a synthetic notes corpus (see :mod:`benchmarks.corpus`), times the
+pipeline stages against it and writes the results as JSON. When a baseline
+file exists the run is compared with it and regressions are reported. A few
+correctness checks run along the way (see ``checks`` in the results); a
+failed check also makes the run exit non-zero.
+
+    python -m benchmarks.run --posts 1000
+    python -m benchmarks.run --posts 10000 --renderer stub --save-baseline
+    python -m benchmarks.run --posts 10000 --renderer stub   # compare with the baseline
+"""
+from __future__ import annotations
+
+import argparse
+import html
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import generate_nav
+from benchmarks.corpus import CorpusSpec, generate_corpus
+from site_builder import config, renderers
+from site_builder.compress import precompress
+from site_builder.markdown_engine import markdown_to_html
+from site_builder.feeds import generate_rss_feed, generate_sitemap
+from site_builder.minify import minify_html
+from site_builder.renderers import MarkdownRenderer, Renderer, rewrite_internal_links
+from site_builder.scanner import collect_markdown_posts, scan_notes_structure
+from site_builder.sources import SourceStore
+from site_builder.utils import extract_keywords, pandoc_available, pandoc_version
+
+logger = logging.getLogger(__name__)
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = REPO_DIR / "benchmarks" / "results"
+DEFAULT_BASELINE = RESULTS_DIR / "baseline.json"
+
+_LINK_RE = re.compile(r"\[([^\]]*)\]\(([^)\s]+)\)")
+
+
+class StubRenderer(Renderer):
+    """Near-free renderer standing in for pandoc: escapes the text and turns
+    markdown links into anchors so link rewriting still has work to do."""
+
+    name = "stub"
+
+    @property
+    def version(self) -> str:
+        return "1"
+
+    def render(self, md_text: str) -> Optional[str]:
+        body = _LINK_RE.sub(r'<a href="\2">\1</a>', html.escape(md_text, quote=False))
+        return f"\n<pre>{body}</pre>\n"
+
+
+@contextmanager
+def use_root(root: Path) -> Iterator[None]:
+    """Point every path in :mod:`site_builder.config` below ROOT_DIR at ``root``."""
+    old_root = config.ROOT_DIR
+    saved: Dict[str, Path] = {}
+    for name, value in vars(config).items():
+        if name.isupper() and isinstance(value, Path):
+            try:
+                rel = value.relative_to(old_root)
+            except ValueError:
+                continue
+            saved[name] = value
+            setattr(config, name, root / rel)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+
+
+_KEYWORDS_SCRIPT = """\
+import json, sys
+from site_builder.utils import extract_keywords
+json.dump([extract_keywords(title) for title in json.load(sys.stdin)], sys.stdout)
+"""
+
+_BUILD_SCRIPT = """\
+import sys
+from pathlib import Path
+import generate_nav
+from benchmarks.run import StubRenderer, use_root
+from site_builder import renderers
+renderers.RENDERERS.setdefault("stub", StubRenderer)
+with use_root(Path(sys.argv[1])):
+    generate_nav.build_site(generate_nav.parse_args(sys.argv[2:]))
+"""
+
+
+def run_python(script: str, args: List[str], seed: str, stdin: str = "") -> str:
+    """Run ``script`` in a fresh interpreter with ``PYTHONHASHSEED=seed``; return its stdout."""
+    proc = subprocess.run(
+        [sys.executable, "-c", script, *args],
+        input=stdin,
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=REPO_DIR,
+        env={**os.environ, "PYTHONHASHSEED": seed},
+    )
+    return proc.stdout
+
+
+def keyword_mismatches(titles: List[str], seeds: Tuple[str, ...] = ("1", "2")) -> List[str]:
+    """Titles whose keywords, or their order, differ between this process and
+    interpreters started with the given ``PYTHONHASHSEED`` values."""
+    runs = [[extract_keywords(title) for title in titles]]
+    for seed in seeds:
+        runs.append(json.loads(run_python(_KEYWORDS_SCRIPT, [], seed, stdin=json.dumps(titles))))
+    return [title for title, first, *others in zip(titles, *runs) if any(kw != first for kw in others)]
+
+
+def _snapshot(root: Path) -> Dict[str, Tuple[int, int]]:
+    return {
+        path.relative_to(root).as_posix(): (stat.st_mtime_ns, stat.st_ino)
+        for path in root.rglob("*")
+        if path.is_file() and (stat := path.stat())
+    }
+
+
+def rewritten_files(root: Path, build: Callable[[], Any]) -> List[str]:
+    """Files under ``root`` that ``build`` created, replaced or modified."""
+    before = _snapshot(root)
+    build()
+    after = _snapshot(root)
+    return sorted(name for name, stamp in after.items() if before.get(name) != stamp)
+
+
+# Inputs that are quadratic (or worse) for a naive markdown parser, by size.
+HOSTILE_MARKDOWN: Dict[str, Callable[[int], str]] = {
+    "nested_brackets": lambda n: "[" * n + "a" + "]" * n,
+    "open_links": lambda n: "[a](" * n,
+    "emphasis": lambda n: "a*_" * n,
+    "nested_quotes": lambda n: ">" * n + " a",
+    "code_spans": lambda n: "x " + "``a`" * n,
+    "comments": lambda n: "x " + "<!--a" * n,
+}
+
+
+def markdown_growth(size: int = 4000, factor: int = 4) -> Dict[str, float]:
+    """How much longer the in-process engine takes on each :data:`HOSTILE_MARKDOWN`
+    input when it is ``factor`` times larger (about ``factor`` when linear)."""
+    growth: Dict[str, float] = {}
+    for name, make in HOSTILE_MARKDOWN.items():
+        small, large = make(size), make(size * factor)
+        small_time = measure(lambda: markdown_to_html(small), 3)["min"]
+        large_time = measure(lambda: markdown_to_html(large), 3)["min"]
+        growth[name] = round(large_time / max(small_time, 1e-6), 1)
+    return growth
+
+
+def measure(func: Callable[[], Any], repeat: int, setup: Optional[Callable[[], None]] = None) -> Dict[str, Any]:
+    runs: List[float] = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return {"min": min(runs), "median": statistics.median(runs), "runs": runs}
+
+
+def run_benchmarks(root: Path, spec: CorpusSpec, renderer: str, repeat: int, jobs: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    corpus = generate_corpus(root, spec)
+    logger.info("语料生成完成: %s 篇文章, %s 个目录 (%.1fs)", len(corpus.posts), len(corpus.directories), time.perf_counter() - started)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    checks: Dict[str, Dict[str, Any]] = {}
+    with use_root(root):
+        results["collect_markdown_posts"] = measure(collect_markdown_posts, repeat)
+        md_files = collect_markdown_posts()
+
+        results["scan_notes_structure"] = measure(lambda: scan_notes_structure(md_files), repeat)
+        sources = SourceStore()
+        scan = scan_notes_structure(md_files, sources=sources)
+        docs = [sources.get(md) for md in md_files]
+
+        results["extract_keywords"] = measure(lambda: [extract_keywords(d.title, d.body) for d in docs], repeat)
+        growth = markdown_growth()
+        # Quadratic growth would be 16x; allow noise above linear (4x).
+        checks["markdown_linear"] = {"ok": max(growth.values()) < 8, "growth": growth}
+
+        mismatched = keyword_mismatches([d.title for d in docs])
+        checks["keywords_deterministic"] = {"ok": not mismatched, "mismatched": mismatched[:20]}
+
+        fragments = MarkdownRenderer().render_many([d.body for d in docs])
+        pairs = [(d.path, f) for d, f in zip(docs, fragments) if f is not None]
+        results["rewrite_internal_links"] = measure(
+            lambda: [rewrite_internal_links(f, path, scan.legacy_to_new) for path, f in pairs], repeat
+        )
+        results["minify_html"] = measure(lambda: [minify_html(f) for _, f in pairs], repeat)
+
+        argv = ["--renderer", renderer, "--jobs", str(jobs)]
+
+        def clean() -> None:
+            for path in (config.DIST_DIR, config.CACHE_DIR):
+                shutil.rmtree(path, ignore_errors=True)
+
+        renderers.get_renderer.cache_clear()
+        results["build_site_cold"] = measure(lambda: generate_nav.build_site(generate_nav.parse_args(argv)), repeat, clean)
+        results["build_site_warm"] = measure(lambda: generate_nav.build_site(generate_nav.parse_args(argv)), repeat)
+        # A rebuild of an unchanged tree must not touch any output, also from
+        # a new process whose set iteration order differs.
+        rewritten = rewritten_files(root, lambda: run_python(_BUILD_SCRIPT, [str(root), *argv], seed="3"))
+        checks["rebuild_writes_nothing"] = {"ok": not rewritten, "rewritten": rewritten[:20]}
+        results["precompress_cold"] = measure(lambda: precompress(jobs=jobs, force=True), repeat)
+        results["precompress_warm"] = measure(lambda: precompress(jobs=jobs), repeat)
+
+        results["generate_sitemap"] = measure(lambda: generate_sitemap(scan.blog_posts), repeat)
+        results["generate_rss_feed"] = measure(lambda: generate_rss_feed(scan.blog_posts), repeat)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "renderer": renderer,
+            "pandoc": pandoc_version() if renderer == "pandoc" and pandoc_available() else None,
+            "jobs": jobs,
+            "repeat": repeat,
+            "corpus": {**vars(spec), "files": len(md_files), "directories": len(corpus.directories)},
+        },
+        "results": results,
+        "checks": checks,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print a comparison table; return the names of benchmarks slower than ``threshold``."""
+    if baseline["meta"].get("corpus") != current["meta"].get("corpus") or (
+        baseline["meta"].get("renderer") != current["meta"].get("renderer")
+    ):
+        print("⚠️  基线的语料或渲染器与本次不同，对比结果仅供参考")
+
+    regressions: List[str] = []
+    print(f"\n{'benchmark':<26}{'baseline(ms)':>14}{'current(ms)':>14}{'ratio':>9}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<26}{'-':>14}{result['median'] * 1e3:>14.1f}{'-':>9}")
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  ⚠️ 回归"
+        print(f"{name:<26}{base['median'] * 1e3:>14.1f}{result['median'] * 1e3:>14.1f}{ratio:>9.2f}{flag}")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="站点构建性能基准")
+    parser.add_argument("--posts", type=int, default=1000, help="合成文章数量（默认: 1000）")
+    parser.add_argument("--depth", type=int, default=3, help="目录嵌套层数（默认: 3）")
+    parser.add_argument("--fanout", type=int, default=5, help="每层最多子目录数（默认: 5）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子（默认: 0）")
+    parser.add_argument(
+        "--renderer",
+        choices=["stub", *renderers.RENDERERS],
+        default="stub",
+        help="build_site 使用的渲染器；stub 不调用 pandoc（默认: stub）",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（默认: 3）")
+    parser.add_argument("--jobs", "-j", type=int, default=generate_nav.default_jobs(), help="build_site 的并行线程数")
+    parser.add_argument("--workdir", type=Path, default=None, help="语料目录（默认: 临时目录，结束后删除）")
+    parser.add_argument("--output", type=Path, default=None, help="结果 JSON 路径（默认: benchmarks/results/<时间>.json）")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="用于对比的基线 JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    parser.add_argument("--threshold", type=float, default=0.15, help="中位数变慢超过该比例视为回归（默认: 0.15）")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    # Keep the per-page build logs out of the benchmark output.
+    logging.getLogger("site_builder").setLevel(logging.WARNING)
+    logging.getLogger("generate_nav").setLevel(logging.WARNING)
+    renderers.RENDERERS.setdefault("stub", StubRenderer)
+
+    spec = CorpusSpec(posts=args.posts, depth=args.depth, fanout=args.fanout, seed=args.seed)
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="sb-bench-"))
+    try:
+        report = run_benchmarks(workdir, spec, args.renderer, args.repeat, args.jobs)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"结果已写入: {output}")
+
+    exit_code = 0
+    for name, check in report["checks"].items():
+        if not check["ok"]:
+            print(f"❌ 检查未通过: {name}: {json.dumps(check, ensure_ascii=False)}")
+            exit_code = 1
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"基线已保存: {args.baseline}")
+    elif args.baseline.exists():
+        regressions = compare(report, json.loads(args.baseline.read_text(encoding="utf-8")), args.threshold)
+        if regressions:
+            print(f"\n发现 {len(regressions)} 项性能回归: {', '.join(regressions)}")
+            exit_code = 1
+    else:
+        for name, result in report["results"].items():
+            print(f"{name:<26}{result['median'] * 1e3:>12.1f} ms")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
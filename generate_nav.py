@@ -4,13 +4,31 @@
 import argparse
 import json
 import logging
+import re
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Dict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
 
-from site_builder import config
+from site_builder import config, minify, profiling
+from site_builder.assets import fingerprint_assets, write_precache_manifest
+from site_builder.compress import precompress
 from site_builder.feeds import generate_rss_feed, generate_sitemap
-from site_builder.renderers import convert_markdown_to_html, generate_directory_page
-from site_builder.scanner import collect_markdown_posts, scan_notes_structure, slug_report
+from site_builder.devserver import serve
+from site_builder.jobs import JobResult, default_jobs, log_failure_summary, replay, run_jobs
+from site_builder.link_graph import LinkGraph, build_link_graph
+from site_builder.manifest import BuildManifest, LinkDeps, directory_page_key, post_page_key
+from site_builder.nav_shards import build_nav_files, write_nav_files
+from site_builder.output import remove_stale, write_if_changed
+from site_builder.render_cache import CachedRenderer, RenderCache
+from site_builder.renderers import RENDERERS, Renderer, convert_markdown_to_html, generate_directory_page, get_renderer
+from site_builder.scanner import scan_notes_structure, scan_notes_tree, slug_report
+from site_builder.search_index import update_search_index
+from site_builder.sources import ScanCache, SourceDocument, SourceStore
+from site_builder.template import use_asset_urls
+from site_builder.utils import content_hash
+from site_builder.watch import watch
 
 
 logging.basicConfig(
@@ -20,30 +38,190 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Build time embedded in nav_data.json; it alone does not make the file change.
+_GENERATED_AT_RE = re.compile(r'"generated_at":[^,}]*')
 
-def build_site(args: argparse.Namespace) -> Dict[str, Any]:
-    md_files = collect_markdown_posts()
+
+@dataclass
+class BuildSession:
+    """State kept between rebuilds in ``--watch`` mode.
+
+    Sources stay loaded (changed files are discarded by the watcher), and the
+    signatures let a rebuild skip rewriting nav_data.json and the feeds when
+    nothing they contain changed.
+    """
+
+    sources: SourceStore = field(default_factory=lambda: SourceStore(ScanCache()))
+    nav_signature: Optional[str] = None
+    feeds_signature: Optional[str] = None
+
+
+def _record_results(results: List[JobResult], manifest: BuildManifest) -> int:
+    """Replay job logs in input order and update the manifest; return the success count."""
+    ok = 0
+    for result in results:
+        _, url, key = result.item
+        if result.ok:
+            replay(result)
+            manifest.record(url, key, result.value)
+            ok += 1
+        else:
+            manifest.forget(url)
+    return ok
+
+
+def _batch_bodies(renderer: Renderer, docs: List[SourceDocument], jobs: int, kind: str) -> Dict[Path, str]:
+    """Convert sources in batches; failed documents are left out and get converted
+    (and their errors reported) individually by the page renderer."""
+    with profiling.span(f"{renderer.name}_batch_{kind}", count=len(docs)):
+        fragments = renderer.render_many([doc.body for doc in docs], jobs=jobs)
+    return {doc.path: fragment for doc, fragment in zip(docs, fragments) if fragment is not None}
+
+
+def _feeds_signature(blog_posts: List[Dict], post_mtimes: Dict[str, float]) -> str:
+    """Covers post titles/URLs/keywords, sitemap dates and the RSS order."""
+    dates = {url: time.strftime("%Y-%m-%d", time.localtime(mtime)) for url, mtime in post_mtimes.items()}
+    latest = sorted(post_mtimes, key=lambda url: post_mtimes[url], reverse=True)[:20]
+    return content_hash(json.dumps([blog_posts, dates, latest], ensure_ascii=False, sort_keys=True))
+
+
+def build_site(args: argparse.Namespace, session: Optional[BuildSession] = None) -> Dict[str, Any]:
+    minify.report.clear()
+    with profiling.span("scan_tree"):
+        tree = scan_notes_tree()
+    md_files = tree.md_files
+    sources = session.sources if session is not None else SourceStore(ScanCache())
     if args.slugs_report:
-        raise SystemExit(slug_report(md_files))
+        status = slug_report(md_files, sources=sources, tree=tree)
+        sources.save_cache(tree.markdown_paths())
+        raise SystemExit(status)
+
+    with profiling.span("scan_notes_structure"):
+        scan_result = scan_notes_structure(md_files, sources=sources, tree=tree)
+    legacy_to_new = scan_result.legacy_to_new
+
+    # Before the manifest is loaded: the asset URLs are part of the template fingerprint.
+    with profiling.span("fingerprint_assets"):
+        asset_urls = fingerprint_assets() if config.FINGERPRINT_ENABLED else {}
+    use_asset_urls(asset_urls)
 
-    scan_result = scan_notes_structure(md_files)
+    renderer = get_renderer(args.renderer)
+    manifest = BuildManifest.load(renderer.cache_id if renderer else "fallback")
+    if args.force:
+        manifest.entries.clear()
+    render_cache = RenderCache() if renderer is not None and config.RENDER_CACHE_ENABLED else None
+    if render_cache is not None:
+        renderer = CachedRenderer(renderer, render_cache)
 
-    converted_ok = 0
+    # Backlinks are only known once every page's links are rewritten; posts start
+    # from the last build's graph and are re-rendered below if theirs changed.
+    previous_graph = LinkGraph.load()
+    backlinks = previous_graph.backlinks_by_url() if previous_graph else {}
+
+    pending_posts = []
+    skipped = 0
     for md in scan_result.md_files:
         rel_md = str(md.relative_to(scan_result.root_dir))
         post = scan_result.md_to_post.get(rel_md)
         if not post:
             continue
-        out_path = config.ROOT_DIR / post["url"]
-        if convert_markdown_to_html(md, out_path, scan_result.legacy_to_new):
-            converted_ok += 1
-    logger.info("文章页生成完成: %s/%s", converted_ok, len(scan_result.md_files))
+        doc = sources.get(md)
+        doc.backlinks = backlinks.get(post["url"], [])
+        key = post_page_key(doc)
+        if manifest.is_fresh(post["url"], key, legacy_to_new):
+            skipped += 1
+            continue
+        pending_posts.append((md, post["url"], key))
 
-    dir_pages_ok = 0
+    post_bodies: Dict[Path, str] = {}
+    if renderer and pending_posts:
+        docs = [sources.get(md) for md, _, _ in pending_posts]
+        post_bodies = _batch_bodies(renderer, docs, args.jobs, "posts")
+
+    def render_post(task: Tuple[Path, str, str]) -> Optional[LinkDeps]:
+        md, url, _ = task
+        link_deps: LinkDeps = {}
+        with profiling.span("post", "file", file=str(md.relative_to(config.ROOT_DIR))):
+            ok = convert_markdown_to_html(
+                md, config.ROOT_DIR / url, legacy_to_new, link_deps, post_bodies.get(md), renderer, sources.get(md)
+            )
+        return link_deps if ok else None
+
+    with profiling.span("convert_markdown_to_html", count=len(pending_posts)):
+        results = run_jobs(render_post, pending_posts, args.jobs)
+    converted_ok = skipped + _record_results(results, manifest)
+    log_failure_summary("文章页", [r for r in results if not r.ok], lambda task: str(task[0].relative_to(config.ROOT_DIR)))
+    logger.info("文章页生成完成: %s/%s（未变更跳过 %s）", converted_ok, len(scan_result.md_files), skipped)
+
+    pending_dirs = []
+    skipped = 0
+    index_docs: Dict[str, Optional[SourceDocument]] = {}
     for directory in scan_result.flat_directories:
-        if generate_directory_page(directory, scan_result.legacy_to_new):
-            dir_pages_ok += 1
-    logger.info("目录页生成完成: %s/%s", dir_pages_ok, len(scan_result.flat_directories))
+        index_doc = sources.find(config.ROOT_DIR / directory["path"] / "index.md")
+        index_docs[directory["url"]] = index_doc
+        key = directory_page_key(directory, index_doc)
+        if manifest.is_fresh(directory["url"], key, legacy_to_new):
+            skipped += 1
+            continue
+        pending_dirs.append((directory, directory["url"], key))
+
+    dir_bodies: Dict[Path, str] = {}
+    docs = [index_docs[url] for _, url, _ in pending_dirs if index_docs[url] is not None]
+    if renderer and docs:
+        dir_bodies = _batch_bodies(renderer, docs, args.jobs, "dirs")
+
+    def render_directory(task: Tuple[Dict, str, str]) -> Optional[LinkDeps]:
+        link_deps: LinkDeps = {}
+        index_doc = index_docs[task[1]]
+        body_html = dir_bodies.get(index_doc.path) if index_doc else None
+        with profiling.span("directory", "file", file=task[0]["path"]):
+            ok = generate_directory_page(task[0], legacy_to_new, link_deps, body_html, renderer, index_doc)
+        return link_deps if ok else None
+
+    with profiling.span("generate_directory_page", count=len(pending_dirs)):
+        results = run_jobs(render_directory, pending_dirs, args.jobs)
+    dir_pages_ok = skipped + _record_results(results, manifest)
+    log_failure_summary("目录页", [r for r in results if not r.ok], lambda task: task[0]["path"])
+    logger.info("目录页生成完成: %s/%s（未变更跳过 %s）", dir_pages_ok, len(scan_result.flat_directories), skipped)
+
+    pages = [(p["title"], p["url"]) for p in scan_result.blog_posts] + [
+        (d["name"], d["url"]) for d in scan_result.flat_directories
+    ]
+    with profiling.span("link_graph"):
+        graph = build_link_graph(pages, {url: entry.get("links", {}) for url, entry in manifest.entries.items()})
+    backlinks = graph.backlinks_by_url()
+    relinked = []
+    for rel_md, post in scan_result.md_to_post.items():
+        doc = sources.get(scan_result.root_dir / rel_md)
+        if doc.backlinks != backlinks.get(post["url"], []):
+            doc.backlinks = backlinks.get(post["url"], [])
+            relinked.append((doc.path, post["url"], post_page_key(doc)))
+    if relinked:
+        docs = [sources.get(md) for md, _, _ in relinked if md not in post_bodies]
+        if renderer and docs:
+            post_bodies.update(_batch_bodies(renderer, docs, args.jobs, "backlinks"))
+        with profiling.span("backlinks", count=len(relinked)):
+            results = run_jobs(render_post, relinked, args.jobs)
+        _record_results(results, manifest)
+        logger.info("反向链接已变更，重新生成 %s 篇文章", len(relinked))
+    graph.save()
+    if render_cache is not None:
+        render_cache.save()
+    if graph.broken:
+        logger.warning("发现 %s 个失效的站内链接，运行 --check-links 查看详情", sum(map(len, graph.broken.values())))
+
+    manifest.prune([url for _, url in pages])
+    manifest.save()
+    with profiling.span("remove_stale"):
+        live = {config.ROOT_DIR / url for _, url in pages}
+        remove_stale(config.POSTS_OUT_DIR.glob("*.html"), live)
+        remove_stale(config.CATEGORIES_OUT_DIR.glob("*/index.html"), live)
+    minify.report.log_summary(top=None if args.verbose else 5)
+
+    post_mtimes = {
+        post["url"]: sources.get(scan_result.root_dir / rel_md).mtime
+        for rel_md, post in scan_result.md_to_post.items()
+    }
 
     nav_data = {
         "nav_menu": scan_result.nav_menu,
@@ -51,24 +229,111 @@ def build_site(args: argparse.Namespace) -> Dict[str, Any]:
         "directory_structure": scan_result.directory_structure,
         "generated_at": datetime.now().timestamp(),
     }
-    config.OUTPUT_FILE.write_text(json.dumps(nav_data, ensure_ascii=False, indent=2), encoding="utf-8")
-    logger.info("✅ 导航数据已保存: %s", config.OUTPUT_FILE)
+    nav_signature = content_hash(json.dumps({k: v for k, v in nav_data.items() if k != "generated_at"}, ensure_ascii=False))
+    if session is not None and session.nav_signature == nav_signature:
+        logger.info("导航数据未变更，跳过写入")
+    else:
+        with profiling.span("nav_data"):
+            text = json.dumps(nav_data, ensure_ascii=False, separators=(",", ":"))
+            written = write_if_changed(config.OUTPUT_FILE, text, _GENERATED_AT_RE)
+        if written:
+            logger.info("✅ 导航数据已保存: %s", config.OUTPUT_FILE)
+        else:
+            logger.info("导航数据未变更，跳过写入")
+    # The manifest also lists recently updated posts, so it is refreshed even
+    # when nav_data.json is unchanged; unchanged files are not rewritten.
+    with profiling.span("nav_shards"):
+        write_nav_files(
+            build_nav_files(scan_result.nav_menu, scan_result.blog_posts, scan_result.directory_structure, post_mtimes)
+        )
 
-    if not args.no_sitemap:
-        generate_sitemap(scan_result.blog_posts)
-    if not args.no_rss:
-        generate_rss_feed(scan_result.blog_posts)
+    if config.SEARCH_ENABLED and not args.no_search:
+        with profiling.span("search_index"):
+            update_search_index(
+                [(post, sources.get(scan_result.root_dir / rel_md)) for rel_md, post in scan_result.md_to_post.items()]
+            )
+
+    feeds_signature = _feeds_signature(scan_result.blog_posts, post_mtimes)
+    if session is not None and session.feeds_signature == feeds_signature:
+        logger.info("标题与顺序未变更，跳过 sitemap/RSS")
+    else:
+        if not args.no_sitemap:
+            with profiling.span("generate_sitemap"):
+                generate_sitemap(scan_result.blog_posts, post_mtimes)
+        if not args.no_rss:
+            with profiling.span("generate_rss_feed"):
+                generate_rss_feed(scan_result.blog_posts, post_mtimes)
 
+    with profiling.span("precache_manifest"):
+        write_precache_manifest(asset_urls)
+
+    if config.PRECOMPRESS_ENABLED if args.gzip is None else args.gzip:
+        with profiling.span("precompress"):
+            precompress(jobs=args.jobs, force=args.force)
+
+    sources.save_cache(tree.markdown_paths())
+    if session is not None:
+        session.nav_signature = nav_signature
+        session.feeds_signature = feeds_signature
     return nav_data
 
 
-def parse_args() -> argparse.Namespace:
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="导航数据自动生成工具")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["build", "serve"],
+        default="build",
+        help="build: 生成站点（默认）；serve: 启动本地预览服务，按需渲染页面并自动刷新",
+    )
     parser.add_argument("--no-sitemap", action="store_true", help="不生成sitemap.xml")
     parser.add_argument("--no-rss", action="store_true", help="不生成RSS feed")
+    parser.add_argument("--no-search", action="store_true", help=f"不生成搜索索引（{config.SEARCH_DIR.relative_to(config.ROOT_DIR)}/）")
+    parser.add_argument(
+        "--gzip",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="为输出的文本文件生成 .gz 预压缩文件（供 gzip_static 使用；默认读取 config.json 的 build.precompress.enabled）",
+    )
     parser.add_argument("--verbose", "-v", action="store_true", help="详细输出模式")
+    parser.add_argument(
+        "--jobs", "-j", type=int, default=default_jobs(), metavar="N", help="并行渲染的工作线程数；内置渲染器转换 Markdown 时为进程数（默认: CPU 核数）"
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=["auto", *RENDERERS],
+        default=None,
+        help="Markdown 渲染器（默认读取 config.json 的 build.renderer）",
+    )
+    parser.add_argument("--force", action="store_true", help="忽略构建缓存，重新生成全部页面")
+    parser.add_argument(
+        "--import-render-cache",
+        type=Path,
+        metavar="ARCHIVE",
+        help="构建前从归档导入渲染缓存（如 CI 上次导出的 .tar.gz）；文件不存在时忽略",
+    )
+    parser.add_argument(
+        "--export-render-cache", type=Path, metavar="ARCHIVE", help="构建后将渲染缓存导出为单个 .tar.gz 归档"
+    )
     parser.add_argument("--slugs-report", action="store_true", help="输出 slug 检查报告（缺失/非法/重复）并退出")
-    return parser.parse_args()
+    parser.add_argument(
+        "--check-links",
+        action="store_true",
+        help="根据最近一次构建记录的链接图，报告失效链接、孤立文章和反向链接并退出（有失效链接时返回 1）",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="serve 监听地址（默认: 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8000, help="serve 监听端口（默认: 8000）")
+    parser.add_argument("--watch", action="store_true", help="构建后持续监听 notes/、template.html、config.json 并增量重建")
+    parser.add_argument(
+        "--poll-interval", type=float, default=1.0, metavar="SEC", help="未安装 watchdog 时的轮询间隔（默认: 1.0 秒）"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help=f"记录各阶段/各文件耗时，输出 Chrome trace 到 {config.PROFILE_DIR}"
+    )
+    parser.add_argument("--profile-top", type=int, default=15, metavar="N", help="耗时报告中列出最慢的 N 个文件（默认: 15）")
+    parser.add_argument("--cprofile", action="store_true", help="配合 --profile，为每个阶段输出 cProfile 数据（建议 -j 1）")
+    return parser.parse_args(argv)
 
 
 def main() -> int:
@@ -76,10 +341,38 @@ def main() -> int:
     if args.verbose:
         logger.setLevel(logging.DEBUG)
 
+    if args.command == "serve":
+        serve(get_renderer(args.renderer), args.host, args.port, args.poll_interval)
+        return 0
+
+    if args.check_links:
+        graph = LinkGraph.load()
+        if graph is None:
+            logger.error("未找到链接图 %s，请先运行一次构建", config.LINK_GRAPH_FILE)
+            return 1
+        print(graph.report())
+        return 1 if graph.broken else 0
+
     print("=== 导航数据自动生成工具 ===")
     print(f"开始时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
-    nav_data = build_site(args)
+    if args.import_render_cache:
+        if args.import_render_cache.exists():
+            RenderCache().import_archive(args.import_render_cache)
+        else:
+            logger.warning("渲染缓存归档不存在，跳过导入: %s", args.import_render_cache)
+
+    session = BuildSession() if args.watch else None
+    if args.profile:
+        profiling.start(cprofile=args.cprofile)
+    try:
+        with profiling.span("build", "total"):
+            nav_data = build_site(args, session)
+    finally:
+        profiler = profiling.stop()
+    if profiler is not None:
+        print(profiler.report(args.profile_top))
+        print(f"\n📊 Trace: {profiler.write_trace()}")
 
     print("\n" + "=" * 50)
     print("生成完成！")
@@ -89,12 +382,27 @@ def main() -> int:
     print(f"🗂️  目录结构数量: {len(nav_data['directory_structure'])}")
     print("\n输出文件:")
     print(f"  • {config.OUTPUT_FILE}")
+    print(f"  • {config.NAV_DIR}/")
     if not args.no_sitemap:
         print(f"  • {config.SITEMAP_FILE}")
     if not args.no_rss:
         print(f"  • {config.RSS_FILE}")
+    if config.SEARCH_ENABLED and not args.no_search:
+        print(f"  • {config.SEARCH_DIR}/")
     print(f"\n完成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
+    if args.export_render_cache:
+        RenderCache().export_archive(args.export_render_cache)
+
+    if session is not None:
+
+        def rebuild(changed: Set[Path]) -> None:
+            for path in changed:
+                session.sources.discard(path)
+            build_site(args, session)
+
+        watch(rebuild, interval=args.poll_interval)
+
     return 0
 
 
@@ -3,6 +3,8 @@
 // ====== 配置 ======
 const CONFIG = {
     NAV_DATA_URL: '/nav_data.json',
+    NAV_INDEX_URL: '/dist/nav/index.json', // 分片导航数据清单（各分类的数据按需加载）
+    SEARCH_INDEX_URL: '/dist/search/', // 构建时生成的分片搜索索引
     LOADING_DELAY: 300, // 加载延迟阈值（毫秒）
     DEBOUNCE_DELAY: 250, // 防抖延迟
     MAX_KEYWORDS: 50, // 最大关键词数量
@@ -127,7 +129,10 @@ function loadThreeIfNeeded() {
 // ====== 状态管理 ======
 const AppState = {
     allKeywords: [],
-    blogPosts: [],
+    indexKeywords: [], // 清单中的高频关键词
+    blogPosts: [], // 当前分类下的文章（分片加载失败时为全部文章）
+    featuredPosts: [], // 清单中最近更新的文章，用于热门文章列表
+    navSharded: false, // 是否只加载了当前分类的分片
     navMenuData: [],
     directoryStructure: [],
     viewCounts: {}, // 文章访问量
@@ -603,27 +608,15 @@ const CacheManager = {
 };
 
 // ====== 数据加载 ======
+// 先加载体积固定的清单，再只加载当前页面所属分类的分片；失败时退回完整的 nav_data.json
 async function loadNavData(retryCount = 0) {
     try {
-        // 尝试从缓存加载
-        const cachedData = CacheManager.loadFromCache();
-        if (cachedData) {
-            // 更新应用状态
-            AppState.navMenuData = cachedData.nav_menu || [];
-            AppState.blogPosts = cachedData.blog_posts || [];
-            AppState.directoryStructure = cachedData.directory_structure || [];
-            
-            // 后台检查更新
-            CacheManager.checkForUpdates().then(hasUpdate => {
-                if (hasUpdate) {
-                    loadNavDataFromNetwork(0, true);
-                }
-            });
-            
-            return cachedData;
-        }
-        
-        // 从网络加载
+        return await loadNavShards();
+    } catch (error) {
+        console.warn('⚠️ 分片导航数据加载失败，改用 nav_data.json:', error.message);
+    }
+    
+    try {
         return await loadNavDataFromNetwork(retryCount);
     } catch (error) {
         console.error('❌ 数据加载失败:', error);
@@ -632,6 +625,52 @@ async function loadNavData(retryCount = 0) {
     }
 }
 
+async function fetchNavJson(url, options = {}) {
+    const controller = new AbortController();
+    const timeoutId = setTimeout(() => controller.abort(), 5000); // 5秒超时
+    try {
+        const response = await fetch(url, { ...options, signal: controller.signal });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        return await response.json();
+    } finally {
+        clearTimeout(timeoutId);
+    }
+}
+
+async function loadNavShards() {
+    const manifest = await fetchNavJson(CONFIG.NAV_INDEX_URL, { cache: 'no-cache' });
+    if (!manifest || !Array.isArray(manifest.nav_menu)) {
+        throw new Error('无效的数据格式');
+    }
+    
+    AppState.navMenuData = manifest.nav_menu;
+    AppState.indexKeywords = manifest.keywords || [];
+    AppState.featuredPosts = manifest.featured || [];
+    AppState.blogPosts = [];
+    AppState.directoryStructure = [];
+    AppState.navSharded = true;
+    
+    // 文章页和目录页通过 meta 标签声明所属分类；分片文件名带内容哈希，可长期缓存
+    const category = document.querySelector('meta[name="nav-category"]')?.content;
+    const shardUrl = category === 'root'
+        ? manifest.root_shard
+        : AppState.navMenuData.find(item => item.id === category)?.shard;
+    if (shardUrl) {
+        const shard = await fetchNavJson(`/${shardUrl}`);
+        AppState.blogPosts = shard.posts || [];
+        AppState.directoryStructure = shard.directory ? [shard.directory] : [];
+    }
+    
+    console.log('✅ 导航数据加载成功:', {
+        navMenuCount: AppState.navMenuData.length,
+        category: category || null,
+        blogPostsCount: AppState.blogPosts.length
+    });
+    return manifest;
+}
+
 async function loadNavDataFromNetwork(retryCount = 0, isBackgroundUpdate = false) {
     try {
         const controller = new AbortController();
@@ -662,6 +701,7 @@ async function loadNavDataFromNetwork(retryCount = 0, isBackgroundUpdate = false
         AppState.navMenuData = data.nav_menu || [];
         AppState.blogPosts = data.blog_posts || [];
         AppState.directoryStructure = data.directory_structure || [];
+        AppState.navSharded = false;
         
         if (!isBackgroundUpdate) {
             console.log('✅ 导航数据加载成功:', {
@@ -794,20 +834,22 @@ function initKeywords() {
     }
 }
 
-// 提取所有关键词
+// 提取所有关键词（优先使用清单中的高频关键词）
 function extractKeywords() {
-    const keywordsSet = new Set();
-    
-    // 遍历所有博客文章，收集关键词
-    AppState.blogPosts.forEach(post => {
-        if (post.keywords && Array.isArray(post.keywords)) {
-            post.keywords.forEach(keyword => {
-                if (keyword && keyword.trim()) {
-                    keywordsSet.add(keyword.trim());
-                }
-            });
-        }
-    });
+    const keywordsSet = new Set(AppState.indexKeywords);
+    
+    // 没有清单时，遍历所有博客文章，收集关键词
+    if (keywordsSet.size === 0) {
+        AppState.blogPosts.forEach(post => {
+            if (post.keywords && Array.isArray(post.keywords)) {
+                post.keywords.forEach(keyword => {
+                    if (keyword && keyword.trim()) {
+                        keywordsSet.add(keyword.trim());
+                    }
+                });
+            }
+        });
+    }
     
     // 转换为数组并排序
     AppState.allKeywords = Array.from(keywordsSet)
@@ -853,6 +895,111 @@ function generateKeywordIndex() {
     keywordList.appendChild(fragment);
 }
 
+// ====== 预构建搜索索引 ======
+// 分词规则需与 site_builder/search_index.py 保持一致：小写英文词/数字（2 个字符以上）、
+// 中文二元组，以及单独出现的中文单字。
+const SearchIndex = {
+    meta: null,
+    shards: new Map(),
+    docChunks: new Map(),
+    
+    tokenize(text) {
+        const normalized = text.normalize('NFKC').toLowerCase();
+        const tokens = normalized.match(/[a-z0-9]{2,}/g) || [];
+        for (const run of normalized.match(/[\u4e00-\u9fff]+/g) || []) {
+            if (run.length === 1) {
+                tokens.push(run);
+                continue;
+            }
+            for (let i = 0; i < run.length - 1; i++) {
+                tokens.push(run.slice(i, i + 2));
+            }
+        }
+        return [...new Set(tokens)];
+    },
+    
+    async fetchJson(url, options) {
+        const response = await fetch(url, options);
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${url}`);
+        }
+        return response.json();
+    },
+    
+    // 分片与文档表按构建哈希缓存，新构建不会与旧分片混用
+    cached(map, key, file) {
+        if (!map.has(key)) {
+            map.set(key, this.fetchJson(`${CONFIG.SEARCH_INDEX_URL}${file}?v=${this.meta.build}`));
+        }
+        return map.get(key);
+    },
+    
+    // 倒排表为 [id 增量, 得分, ...]
+    decode(list) {
+        const postings = new Map();
+        let id = 0;
+        for (let i = 0; i < list.length; i += 2) {
+            id += list[i];
+            postings.set(id, list[i + 1]);
+        }
+        return postings;
+    },
+    
+    // 精确匹配词条；没有时按前缀匹配（同一首字符的词条都在一个分片内）
+    async lookup(token) {
+        const shardName = (token.codePointAt(0) % this.meta.shards).toString(16).padStart(2, '0');
+        const shard = await this.cached(this.shards, shardName, `${shardName}.json`);
+        if (Object.hasOwn(shard, token)) {
+            return this.decode(shard[token]);
+        }
+        const merged = new Map();
+        for (const [term, list] of Object.entries(shard)) {
+            if (!term.startsWith(token)) continue;
+            for (const [id, score] of this.decode(list)) {
+                merged.set(id, Math.max(merged.get(id) || 0, score));
+            }
+        }
+        return merged;
+    },
+    
+    async getDoc(id) {
+        const chunk = Math.floor(id / this.meta.docChunk);
+        const rows = await this.cached(this.docChunks, chunk, `docs-${chunk}.json`);
+        const [url, title, keywords] = rows[id % this.meta.docChunk];
+        return { url, title, keywords };
+    },
+    
+    // 返回按得分排序的文章；查询中没有可索引的词时返回 null
+    async search(query) {
+        const tokens = this.tokenize(query);
+        if (tokens.length === 0) {
+            return null;
+        }
+        if (!this.meta) {
+            this.meta = await this.fetchJson(`${CONFIG.SEARCH_INDEX_URL}meta.json`, { cache: 'no-cache' });
+        }
+        
+        // 所有词都要命中，从最短的倒排表开始求交集
+        const lists = await Promise.all(tokens.map(token => this.lookup(token)));
+        lists.sort((a, b) => a.size - b.size);
+        const scores = new Map(lists[0]);
+        for (const postings of lists.slice(1)) {
+            for (const [id, score] of scores) {
+                if (postings.has(id)) {
+                    scores.set(id, score + postings.get(id));
+                } else {
+                    scores.delete(id);
+                }
+            }
+        }
+        
+        const ranked = [...scores]
+            .sort((a, b) => b[1] - a[1] || a[0] - b[0])
+            .slice(0, this.meta.maxResults);
+        return Promise.all(ranked.map(([id]) => this.getDoc(id)));
+    }
+};
+
 // ====== 搜索功能 ======
 function initSearch() {
     // 检查当前页面是否是搜索结果页
@@ -861,12 +1008,11 @@ function initSearch() {
     }
 }
 
-// 处理搜索请求
-function handleSearch() {
+// 处理搜索请求：优先使用预构建索引，不可用时退回到导航数据过滤
+async function handleSearch() {
     const searchKeyword = Utils.getUrlParameter('keyword');
     
     console.log('🔍 搜索关键词:', searchKeyword);
-    console.log('📚 当前文章数量:', AppState.blogPosts.length);
     
     if (!searchKeyword) {
         console.warn('⚠️ 未提供搜索关键词');
@@ -874,6 +1020,28 @@ function handleSearch() {
         return;
     }
     
+    try {
+        const posts = await SearchIndex.search(searchKeyword);
+        if (posts) {
+            displaySearchResults(searchKeyword, posts);
+            document.title = `搜索: ${searchKeyword} - Ken的知识库`;
+            return;
+        }
+    } catch (error) {
+        console.warn('⚠️ 搜索索引不可用，改用导航数据搜索:', error);
+    }
+    
+    // 分片数据只含当前分类的文章，过滤前需要完整的导航数据
+    if (AppState.navSharded) {
+        try {
+            await loadNavDataFromNetwork();
+        } catch (error) {
+            console.warn('⚠️ 完整导航数据加载失败:', error.message);
+        }
+    }
+    
+    console.log('📚 当前文章数量:', AppState.blogPosts.length);
+    
     // 确保数据已加载
     if (AppState.blogPosts.length === 0) {
         console.warn('⚠️ 文章数据尚未加载，尝试重新加载');
@@ -936,7 +1104,7 @@ function displayNoSearchTerm() {
 }
 
 // 显示搜索结果
-function displaySearchResults(keyword) {
+function displaySearchResults(keyword, matchingPosts = searchPosts(keyword)) {
     const resultsContainer = document.getElementById('search-results');
     const searchStats = document.getElementById('search-stats');
     
@@ -948,9 +1116,6 @@ function displaySearchResults(keyword) {
     // 清空现有结果
     resultsContainer.innerHTML = '';
     
-    // 过滤包含关键词的博客文章
-    const matchingPosts = searchPosts(keyword);
-    
     // 更新搜索统计
     if (searchStats) {
         const count = matchingPosts.length;
@@ -1527,7 +1692,7 @@ async function initPopularPosts() {
     
     try {
         // 获取所有文章的访问量
-        const articlePaths = AppState.blogPosts.map(post => getPostHref(post));
+        const articlePaths = getPopularCandidates().map(post => getPostHref(post));
         await ViewCountManager.getMultiplePageViews(articlePaths);
         
         // 渲染热门文章列表
@@ -1538,12 +1703,17 @@ async function initPopularPosts() {
     }
 }
 
+// 热门文章候选：清单中最近更新的文章，没有清单时为全部文章
+function getPopularCandidates() {
+    return AppState.featuredPosts.length > 0 ? AppState.featuredPosts : AppState.blogPosts;
+}
+
 // 渲染热门文章列表
 function renderPopularPosts(container) {
     container.innerHTML = '';
     
     // 按访问量排序
-    const sortedPosts = [...AppState.blogPosts]
+    const sortedPosts = [...getPopularCandidates()]
         .map(post => {
             const key = getPostHref(post); // starts with /
             return {
@@ -1585,7 +1755,7 @@ function renderPopularPosts(container) {
 function renderPopularPostsFallback(container) {
     container.innerHTML = '';
     
-    const posts = AppState.blogPosts.slice(0, CONFIG.MAX_POPULAR_POSTS);
+    const posts = getPopularCandidates().slice(0, CONFIG.MAX_POPULAR_POSTS);
     
     if (posts.length === 0) {
         container.innerHTML = '<p class="no-posts">暂无文章</p>';
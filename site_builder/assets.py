@@ -0,0 +1,100 @@
+"""Content-hashed static assets and the service worker's precache manifest.
+
+The assets in :data:`config.FINGERPRINT_ASSETS` are copied to
+``dist/assets/<name>.<hash>.<ext>``, and references to them in the page
+template (and in the assets themselves) are rewritten to those URLs, so they
+can be served with ``Cache-Control: immutable``; a changed asset gets a new
+URL instead of a bumped ``?v=``. ``dist/precache-manifest.js`` lists what the
+service worker precaches with a revision per URL; ``sw.js`` imports it, so a
+build that changes any listed file also updates the worker, which then
+downloads only the entries whose revision changed.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Pattern
+
+from . import config
+from .minify import minify_asset
+from .output import remove_stale, write_if_changed
+from .utils import content_hash
+
+logger = logging.getLogger(__name__)
+
+# Hex digits of the content hash in fingerprinted file names and revisions.
+HASH_LENGTH = 10
+_PRECACHE_PREFIX = "self.__PRECACHE_MANIFEST = "
+
+
+def _url(path: Path) -> str:
+    return "/" + path.relative_to(config.ROOT_DIR).as_posix()
+
+
+def _reference_re(urls: Mapping[str, str]) -> Optional[Pattern[str]]:
+    if not urls:
+        return None
+    alternatives = "|".join(re.escape(url) for url in sorted(urls, key=len, reverse=True))
+    # A quoted or url()-wrapped reference, with any cache-busting query dropped.
+    return re.compile(rf"""(?<=["'(])({alternatives})(?:\?[^"')\s]*)?(?=["')])""")
+
+
+def rewrite_asset_urls(text: str, urls: Mapping[str, str]) -> str:
+    """Replace references to the keys of ``urls`` (site-absolute URLs) by their values."""
+    pattern = _reference_re(urls)
+    if pattern is None:
+        return text
+    return pattern.sub(lambda m: urls[m.group(1)], text)
+
+
+def fingerprint_assets() -> Dict[str, str]:
+    """Write the fingerprinted copies; return ``{original URL: fingerprinted URL}``.
+
+    Assets are processed in :data:`config.FINGERPRINT_ASSETS` order and
+    references to the ones already processed are rewritten first, so an asset
+    listed after the ones it imports changes its hash when they change.
+    Missing assets are skipped; copies no longer referenced are deleted.
+    """
+    urls: Dict[str, str] = {}
+    live = set()
+    for rel in config.FINGERPRINT_ASSETS:
+        source = config.ROOT_DIR / rel
+        if not source.is_file():
+            continue
+        text = minify_asset(rel, rewrite_asset_urls(source.read_text(encoding="utf-8"), urls))
+        target = config.ASSETS_OUT_DIR / f"{source.stem}.{content_hash(text)[:HASH_LENGTH]}{source.suffix}"
+        if write_if_changed(target, text):
+            logger.info("📦 资源指纹: %s -> %s", rel, _url(target))
+        urls[_url(source)] = _url(target)
+        live.add(target)
+    remove_stale((p for p in config.ASSETS_OUT_DIR.glob("*.*") if p.suffix != ".gz"), live)
+    return urls
+
+
+def write_precache_manifest(asset_urls: Mapping[str, str]) -> Dict[str, object]:
+    """Write ``dist/precache-manifest.js`` for ``sw.js`` and return the manifest.
+
+    Fingerprinted assets have no revision: their URL changes with their
+    content. The other files in :data:`config.PRECACHE_FILES` carry a
+    truncated hash of their content; the root page is listed as ``/`` too.
+    """
+    entries: List[Dict[str, Optional[str]]] = []
+    for rel in config.PRECACHE_FILES:
+        path = config.ROOT_DIR / rel
+        if not path.is_file():
+            continue
+        revision = content_hash(path.read_bytes())[:HASH_LENGTH]
+        if rel == "index.html":
+            entries.append({"url": "/", "revision": revision})
+        entries.append({"url": _url(path), "revision": revision})
+    entries.extend({"url": url, "revision": None} for url in sorted(asset_urls.values()))
+    manifest = {
+        "version": content_hash(json.dumps(entries, sort_keys=True))[:HASH_LENGTH],
+        "entries": entries,
+    }
+    text = _PRECACHE_PREFIX + json.dumps(manifest, ensure_ascii=False, indent=1) + ";\n"
+    if write_if_changed(config.PRECACHE_MANIFEST_FILE, text):
+        logger.info("✅ 预缓存清单已更新: %s（%s 项，版本 %s）", config.PRECACHE_MANIFEST_FILE, len(entries), manifest["version"])
+    return manifest
@@ -0,0 +1,161 @@
+"""Precompressed ``.gz`` siblings of the generated text files.
+
+Servers with ``gzip_static`` (nginx) or an equivalent serve ``foo.html.gz``
+in place of ``foo.html`` without compressing on every request, so the files
+can be compressed once at build time at maximum effort: zlib level 9, or
+zopfli when ``build.precompress.zopfli`` is set and the ``zopfli`` package is
+installed. Files are compressed on a thread pool (zlib releases the GIL), and
+``.build_cache/gzip.json`` remembers the size, mtime and hash each ``.gz``
+was made from, so unchanged files are not compressed again.
+"""
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from . import config
+from .jobs import run_jobs
+from .output import remove_stale, write_if_changed
+from .utils import content_hash
+
+logger = logging.getLogger(__name__)
+
+GZIP_CACHE_VERSION = 1
+TEXT_SUFFIXES = {".html", ".css", ".js", ".json", ".xml", ".txt", ".svg"}
+
+
+def _zopfli():
+    try:
+        import zopfli.gzip
+    except ImportError:
+        logger.warning("未安装 zopfli，改用 zlib 9 级压缩（pip install zopfli）")
+        return None
+    return zopfli.gzip
+
+
+def _compressor() -> Tuple[str, Callable[[bytes], bytes]]:
+    if config.PRECOMPRESS_ZOPFLI:
+        module = _zopfli()
+        if module is not None:
+            return "zopfli", module.compress
+    # mtime=0 keeps the output identical across builds.
+    return "zlib-9", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def precompress_targets() -> List[Path]:
+    """Text files that are deployed: the top-level pages, scripts and feeds, ``assets/`` and ``dist/``."""
+    files = [
+        config.ROOT_DIR / name
+        for name in ("index.html", "search.html", "script.js", "style.css", "sw.js", "manifest.json")
+    ]
+    files += [config.OUTPUT_FILE, config.SITEMAP_FILE, config.RSS_FILE]
+    files += sorted(config.ROOT_DIR.glob("sitemap-*.xml"))
+    for directory in (config.ROOT_DIR / "assets", config.DIST_DIR):
+        files += sorted(p for p in directory.rglob("*") if p.suffix in TEXT_SUFFIXES and p.is_file())
+    return [p for p in files if p.is_file()]
+
+
+@dataclass
+class CompressStats:
+    """Per file type totals of one :func:`precompress` run."""
+
+    files: int = 0
+    compressed: int = 0
+    original_bytes: int = 0
+    gzip_bytes: int = 0
+
+    def add(self, original: int, gz: int, compressed: bool) -> None:
+        self.files += 1
+        self.compressed += compressed
+        self.original_bytes += original
+        # Files that do not shrink are served as they are.
+        self.gzip_bytes += gz or original
+
+    @property
+    def saved(self) -> float:
+        return 1 - self.gzip_bytes / self.original_bytes if self.original_bytes else 0.0
+
+
+def _gz_path(path: Path) -> Path:
+    return path.with_name(path.name + ".gz")
+
+
+def precompress(paths: Optional[Iterable[Path]] = None, jobs: int = 1, force: bool = False) -> Dict[str, CompressStats]:
+    """Write ``.gz`` siblings of ``paths`` (default: :func:`precompress_targets`).
+
+    A ``.gz`` is only kept when it is smaller than its source. Returns the
+    statistics per file suffix; the totals are logged.
+    """
+    paths = list(precompress_targets() if paths is None else paths)
+    method, compress = _compressor()
+    cache_file = config.PRECOMPRESS_CACHE_FILE
+    # relative path -> [size, mtime_ns, content hash, .gz size or 0 when not worth keeping]
+    entries: Dict[str, list] = {}
+    try:
+        data = json.loads(cache_file.read_text(encoding="utf-8"))
+        if data.get("version") == GZIP_CACHE_VERSION and data.get("method") == method and not force:
+            entries = data.get("files", {})
+    except (OSError, ValueError):
+        pass
+
+    def compress_one(path: Path) -> list:
+        rel = path.relative_to(config.ROOT_DIR).as_posix()
+        stat = path.stat()
+        entry = entries.get(rel)
+        gz = _gz_path(path)
+        fresh = entry is not None and (entry[3] == 0 or gz.exists())
+        if fresh and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry
+        raw = path.read_bytes()
+        digest = content_hash(raw)
+        if fresh and entry[2] == digest:
+            return [stat.st_size, stat.st_mtime_ns, digest, entry[3]]
+        packed = compress(raw)
+        if len(packed) < len(raw):
+            write_if_changed(gz, packed)
+            return [stat.st_size, stat.st_mtime_ns, digest, len(packed)]
+        gz.unlink(missing_ok=True)
+        return [stat.st_size, stat.st_mtime_ns, digest, 0]
+
+    results = run_jobs(compress_one, paths, jobs)
+    files: Dict[str, list] = {}
+    stats: Dict[str, CompressStats] = {}
+    total = CompressStats()
+    for result in results:
+        path = result.item
+        if result.error is not None:
+            logger.warning("压缩失败 %s: %s", path, result.error)
+            continue
+        rel = path.relative_to(config.ROOT_DIR).as_posix()
+        entry = files[rel] = result.value
+        compressed = entry[2] != (entries.get(rel) or [None] * 3)[2]
+        for bucket in (stats.setdefault(path.suffix, CompressStats()), total):
+            bucket.add(entry[0], entry[3], compressed)
+
+    # .gz files whose source is gone or no longer worth compressing.
+    live = {_gz_path(config.ROOT_DIR / rel) for rel, entry in files.items() if entry[3]}
+    stale = list(config.ROOT_DIR.glob("*.gz"))
+    for directory in (config.ROOT_DIR / "assets", config.DIST_DIR):
+        stale += directory.rglob("*.gz")
+    remove_stale(stale, live)
+
+    write_if_changed(
+        cache_file,
+        json.dumps({"version": GZIP_CACHE_VERSION, "method": method, "files": files}, separators=(",", ":")),
+    )
+    logger.info(
+        "✅ 预压缩（%s）: %s 个文件，重新压缩 %s 个，%.1f KB → %.1f KB（节省 %.0f%%）",
+        method, total.files, total.compressed, total.original_bytes / 1024, total.gzip_bytes / 1024, total.saved * 100,
+    )
+    for suffix, suffix_stats in sorted(stats.items(), key=lambda item: -item[1].original_bytes):
+        logger.info(
+            "    %-6s %5s 个  %9.1f KB → %9.1f KB  节省 %3.0f%%",
+            suffix, suffix_stats.files, suffix_stats.original_bytes / 1024, suffix_stats.gzip_bytes / 1024,
+            suffix_stats.saved * 100,
+        )
+    stats["total"] = total
+    return stats
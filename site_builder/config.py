@@ -4,7 +4,7 @@ from __future__ import annotations
 import json
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, Set
+from typing import Any, Dict, List, Set, Tuple
 
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
@@ -27,7 +27,7 @@ _DEFAULTS: Dict[str, Any] = {
 }
 
 
-CORE_TOPICS: Set[str] = {
+CORE_TOPICS: Tuple[str, ...] = (
     "RAG",
     "检索增强生成",
     "LLM",
@@ -56,7 +56,7 @@ CORE_TOPICS: Set[str] = {
     "Prompt",
     "Fine-tuning",
     "提示工程",
-}
+)
 
 MODIFIER_WORDS: Set[str] = {
     "全面",
@@ -148,8 +148,14 @@ def features() -> Dict[str, Any]:
     return data
 
 
+def build() -> Dict[str, Any]:
+    data = config_data().get("build", {}).copy()
+    return data
+
+
 SITE = site()
 FEATURES = features()
+BUILD = build()
 
 SITE_URL = SITE["url"]
 SITE_NAME = SITE["name"]
@@ -157,6 +163,30 @@ SITE_DESCRIPTION = SITE["description"]
 
 MAX_KEYWORDS_PER_POST = FEATURES.get("keywords", {}).get("maxPerPost", 5)
 MIN_KEYWORD_LENGTH = FEATURES.get("keywords", {}).get("minLength", 2)
+# "title": heuristics on the title only; "tfidf": blended with corpus TF-IDF terms from post bodies.
+KEYWORD_MODE = FEATURES.get("keywords", {}).get("mode", "title")
+
+# Related posts listed on each post page ({{related}}) and in nav_data.json; 0 disables.
+RELATED_POSTS = FEATURES.get("related", {}).get("count", 5)
+
+SEARCH_ENABLED = FEATURES.get("search", {}).get("enabled", True)
+SEARCH_MAX_RESULTS = FEATURES.get("search", {}).get("maxResults", 50)
+# Number of term shard files under dist/search/; terms are bucketed by their first character.
+SEARCH_SHARDS = FEATURES.get("search", {}).get("shards", 64)
+
+
+def extra_topics() -> List[str]:
+    """Additional topics from ``features.keywords.topics``: a list of terms or the
+    path (relative to the repo root) of a file with one term per line."""
+    topics = FEATURES.get("keywords", {}).get("topics") or []
+    if isinstance(topics, str):
+        topics = (ROOT_DIR / topics).read_text(encoding="utf-8").splitlines()
+    return [t.strip() for t in topics if t.strip() and not t.strip().startswith("#")]
+
+
+# A tuple, so topics are matched in a fixed order; configured extra topics
+# go after the built-in ones.
+CORE_TOPICS = tuple(dict.fromkeys([*CORE_TOPICS, *extra_topics()]))
 
 NOTES_DIR = ROOT_DIR / "notes"
 TEMPLATE_FILE = ROOT_DIR / "template.html"
@@ -167,3 +197,36 @@ RSS_FILE = ROOT_DIR / "rss.xml"
 DIST_DIR = ROOT_DIR / "dist"
 POSTS_OUT_DIR = DIST_DIR / "p"
 CATEGORIES_OUT_DIR = DIST_DIR / "c"
+SEARCH_DIR = DIST_DIR / "search"
+NAV_DIR = DIST_DIR / "nav"
+
+# Bump when the rendering pipeline changes in a way that invalidates cached outputs.
+BUILDER_VERSION = "3"
+CACHE_DIR = ROOT_DIR / ".build_cache"
+MANIFEST_FILE = CACHE_DIR / "manifest.json"
+PROFILE_DIR = CACHE_DIR / "profile"
+TERMS_CACHE_FILE = CACHE_DIR / "terms.json"
+LINK_GRAPH_FILE = CACHE_DIR / "links.json"
+SCAN_CACHE_FILE = CACHE_DIR / "scan.json"
+
+# Rendered body fragments keyed by renderer and source; see render_cache.py.
+RENDER_CACHE_DIR = CACHE_DIR / "render"
+RENDER_CACHE_ENABLED = BUILD.get("renderCache", {}).get("enabled", True)
+RENDER_CACHE_MAX_BYTES = int(BUILD.get("renderCache", {}).get("maxMB", 256) * 2**20)
+
+# .gz siblings of the deployed text files for gzip_static servers; see compress.py.
+PRECOMPRESS_ENABLED = BUILD.get("precompress", {}).get("enabled", False)
+PRECOMPRESS_ZOPFLI = BUILD.get("precompress", {}).get("zopfli", False)
+PRECOMPRESS_CACHE_FILE = CACHE_DIR / "gzip.json"
+
+# Static assets copied to content-hashed names under dist/assets/, in dependency
+# order (an asset after the ones it references); see assets.py.
+FINGERPRINT_ENABLED = BUILD.get("fingerprint", {}).get("enabled", True)
+FINGERPRINT_ASSETS = ("assets/js/starfield.js", "style.css", "script.js")
+ASSETS_OUT_DIR = DIST_DIR / "assets"
+# Files precached by sw.js besides the fingerprinted assets, with content revisions.
+PRECACHE_FILES = ("index.html", "search.html", "style.css", "script.js", "nav_data.json")
+PRECACHE_MANIFEST_FILE = DIST_DIR / "precache-manifest.js"
+
+# Whitespace/comment minification of written pages and fingerprinted assets; see minify.py.
+MINIFY_ENABLED = BUILD.get("minify", {}).get("enabled", False)
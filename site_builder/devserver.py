@@ -0,0 +1,259 @@
+"""Local preview server: ``generate_nav.py serve``.
+
+Post and directory pages are rendered on first request from the scan result
+instead of running a full build, and kept in a small LRU keyed by the mtimes
+of their inputs. A background watcher re-scans the notes on change and
+pushes a reload event to open pages over Server-Sent Events.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+from urllib.parse import unquote, urlsplit
+
+from . import config
+from .link_graph import LinkGraph
+from .nav_shards import build_nav_files
+from .renderers import Renderer, render_directory_page, render_post_page
+from .scanner import ScanResult, scan_notes_structure, scan_notes_tree
+from .sources import SourceDocument, SourceStore
+from .template import get_template
+from .utils import extract_keywords
+from .watch import watch
+
+logger = logging.getLogger(__name__)
+
+LIVERELOAD_PATH = "/__livereload"
+_LIVERELOAD_SNIPPET = (
+    f'<script>new EventSource("{LIVERELOAD_PATH}").onmessage = () => location.reload();</script>\n'
+)
+# The production service worker caches aggressively; during preview it is
+# replaced by one that removes itself.
+_NOOP_SERVICE_WORKER = (
+    "self.addEventListener('install', () => self.skipWaiting());\n"
+    "self.addEventListener('activate', () => self.registration.unregister());\n"
+)
+
+
+def inject_livereload(page: str) -> str:
+    index = page.rfind("</body>")
+    if index < 0:
+        return page + _LIVERELOAD_SNIPPET
+    return page[:index] + _LIVERELOAD_SNIPPET + page[index:]
+
+
+class SitePreview:
+    """Routes page URLs to their sources and renders them on demand."""
+
+    def __init__(self, renderer: Optional[Renderer], cache_size: int = 128):
+        self.renderer = renderer
+        self.cache_size = cache_size
+        self.sources = SourceStore()
+        self.generation = 0
+        self._links_version = 0
+        self._lock = threading.RLock()
+        self._changed = threading.Condition()
+        self._pages: "OrderedDict[str, Tuple[Tuple, str]]" = OrderedDict()
+        self._post_routes: Dict[str, Path] = {}
+        self._dir_routes: Dict[str, Dict] = {}
+        self.scan: Optional[ScanResult] = None
+        self.nav_json = b""
+        self.nav_files: Dict[str, bytes] = {}
+        self.rescan()
+
+    def rescan(self) -> None:
+        tree = scan_notes_tree()
+        scan = scan_notes_structure(tree.md_files, sources=self.sources, tree=tree)
+        post_routes = {post["url"]: scan.root_dir / rel_md for rel_md, post in scan.md_to_post.items()}
+        # Pages are not rewritten as a whole during preview; backlinks come from the last build.
+        graph = LinkGraph.load()
+        backlinks = graph.backlinks_by_url() if graph else {}
+        for url, md_path in post_routes.items():
+            self.sources.get(md_path).backlinks = backlinks.get(url, [])
+        dir_routes = {directory["url"]: directory for directory in scan.flat_directories}
+        nav_data = {
+            "nav_menu": scan.nav_menu,
+            "blog_posts": scan.blog_posts,
+            "directory_structure": scan.directory_structure,
+            "generated_at": datetime.now().timestamp(),
+        }
+        post_mtimes = {post["url"]: self.sources.get(scan.root_dir / rel_md).mtime for rel_md, post in scan.md_to_post.items()}
+        nav_prefix = "/" + config.NAV_DIR.relative_to(config.ROOT_DIR).as_posix()
+        nav_files = {
+            f"{nav_prefix}/{name}": text.encode("utf-8")
+            for name, text in build_nav_files(scan.nav_menu, scan.blog_posts, scan.directory_structure, post_mtimes).items()
+        }
+        with self._lock:
+            # Pages embed rewritten links, so only a changed link table invalidates all of them.
+            if self.scan is None or scan.legacy_to_new != self.scan.legacy_to_new:
+                self._links_version += 1
+            self.scan = scan
+            self._post_routes = post_routes
+            self._dir_routes = dir_routes
+            self.nav_json = json.dumps(nav_data, ensure_ascii=False).encode("utf-8")
+            self.nav_files = nav_files
+        logger.info("已索引 %s 篇文章、%s 个目录", len(scan.md_to_post), len(scan.flat_directories))
+
+    def on_change(self, changed: Set[Path]) -> None:
+        for path in changed:
+            self.sources.discard(path)
+        self.rescan()
+        with self._changed:
+            self.generation += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, generation: int, timeout: float) -> int:
+        with self._changed:
+            self._changed.wait_for(lambda: self.generation != generation, timeout=timeout)
+            return self.generation
+
+    def _load(self, path: Path) -> Tuple[Optional[SourceDocument], Optional[int]]:
+        """Return the source for ``path``, re-reading it if the file changed on disk."""
+        try:
+            mtime_ns = path.stat().st_mtime_ns
+        except OSError:
+            return None, None
+        doc = self.sources.get(path)
+        if doc.mtime_ns != mtime_ns:
+            previous = doc
+            self.sources.discard(path)
+            doc = self.sources.get(path)
+            doc.keywords = extract_keywords(doc.title, doc.body)
+            # Kept until the watcher's rescan recomputes them against the corpus.
+            doc.related = previous.related
+            doc.backlinks = previous.backlinks
+        return doc, mtime_ns
+
+    def page(self, url: str) -> Optional[str]:
+        """Rendered HTML for a page URL such as ``dist/p/<slug>.html``, or ``None``."""
+        with self._lock:
+            md_path = self._post_routes.get(url)
+            dir_node = self._dir_routes.get(url)
+            scan = self.scan
+            links_version = self._links_version
+        if scan is None:
+            return None
+
+        if md_path is not None:
+            doc, mtime_ns = self._load(md_path)
+            if doc is None:
+                return None
+            stamp: Tuple = (mtime_ns, tuple(doc.keywords), tuple(doc.related), tuple(doc.backlinks), get_template().fingerprint, links_version)
+        elif dir_node is not None:
+            dir_abs = config.ROOT_DIR / dir_node["path"]
+            doc, mtime_ns = self._load(dir_abs / "index.md")
+            legacy = dir_abs / "index.html"
+            legacy_mtime = legacy.stat().st_mtime_ns if legacy.exists() else None
+            stamp = (mtime_ns, legacy_mtime, dir_node["name"], get_template().fingerprint, links_version)
+        else:
+            return None
+
+        with self._lock:
+            cached = self._pages.get(url)
+            if cached and cached[0] == stamp:
+                self._pages.move_to_end(url)
+                return cached[1]
+
+        if md_path is not None:
+            html = render_post_page(md_path, config.ROOT_DIR / url, scan.legacy_to_new, renderer=self.renderer, source=doc)
+        else:
+            html = render_directory_page(dir_node, scan.legacy_to_new, renderer=self.renderer, source=doc)
+        if html is None:
+            return None
+
+        with self._lock:
+            self._pages[url] = (stamp, html)
+            self._pages.move_to_end(url)
+            while len(self._pages) > self.cache_size:
+                self._pages.popitem(last=False)
+        return html
+
+
+class PreviewHandler(SimpleHTTPRequestHandler):
+    preview: SitePreview
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=str(config.ROOT_DIR), **kwargs)
+
+    def log_message(self, format: str, *args) -> None:
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, body: bytes, content_type: str) -> None:
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_events(self) -> None:
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        generation = self.preview.generation
+        try:
+            while True:
+                current = self.preview.wait_for_change(generation, timeout=15)
+                # Comments keep the connection alive and detect closed tabs.
+                self.wfile.write(b"data: reload\n\n" if current != generation else b": ping\n\n")
+                self.wfile.flush()
+                generation = current
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
+    def do_GET(self) -> None:
+        path = unquote(urlsplit(self.path).path)
+        if path == LIVERELOAD_PATH:
+            self._send_events()
+            return
+        if path == "/nav_data.json":
+            self._send(self.preview.nav_json, "application/json; charset=utf-8")
+            return
+        nav_file = self.preview.nav_files.get(path)
+        if nav_file is not None:
+            self._send(nav_file, "application/json; charset=utf-8")
+            return
+        if path == "/sw.js":
+            self._send(_NOOP_SERVICE_WORKER.encode("utf-8"), "application/javascript; charset=utf-8")
+            return
+
+        rel = path.lstrip("/")
+        if rel == "" or rel.endswith("/"):
+            rel += "index.html"
+        try:
+            page = self.preview.page(rel)
+        except Exception:
+            logger.exception("渲染失败: %s", rel)
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "render failed")
+            return
+        if page is None and rel.endswith(".html"):
+            static = config.ROOT_DIR / rel
+            if static.is_file() and ".." not in Path(rel).parts:
+                page = static.read_text(encoding="utf-8")
+        if page is not None:
+            self._send(inject_livereload(page).encode("utf-8"), "text/html; charset=utf-8")
+            return
+        super().do_GET()
+
+
+def serve(renderer: Optional[Renderer], host: str = "127.0.0.1", port: int = 8000, poll_interval: float = 1.0) -> None:
+    preview = SitePreview(renderer)
+    handler = type("Handler", (PreviewHandler,), {"preview": preview})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=watch, args=(preview.on_change, poll_interval), daemon=True).start()
+    logger.info("🌐 预览服务已启动: http://%s:%s/（Ctrl+C 退出）", host, server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("预览服务已停止")
+    finally:
+        server.server_close()
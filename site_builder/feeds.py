@@ -1,91 +1,184 @@
-"""Sitemap and RSS feed generation helpers."""
+"""Sitemap and RSS feed generation helpers.
+
+Both files are streamed element by element into a temporary file that then
+atomically replaces the previous version, so memory stays flat regardless of
+the number of posts and readers never see a half-written feed. A feed whose
+content did not change is left untouched; the RSS build date does not count
+as a change.
+"""
 from __future__ import annotations
 
 import logging
+import re
+from contextlib import contextmanager
 from datetime import datetime
-import xml.etree.ElementTree as ET
-from typing import Dict, List
-from xml.dom import minidom
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, TextIO, Tuple
 
 from . import config
+from .output import atomic_writer
 
 logger = logging.getLogger(__name__)
 
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+# Sitemap protocol limit per file; larger sites get a sitemap index.
+SITEMAP_MAX_URLS = 50_000
+RSS_MAX_ITEMS = 20
 
-def generate_sitemap(blog_posts: List[Dict]) -> None:
-    logger.info("开始生成sitemap.xml...")
+_RSS_VOLATILE_RE = re.compile(r"<lastBuildDate>[^<]*</lastBuildDate>")
+
+_XML_ESCAPES = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
+
+
+def _escape(value: object) -> str:
+    return str(value).translate(_XML_ESCAPES)
+
+
+class XmlWriter:
+    """Minimal indented XML writer that emits elements as they are produced."""
+
+    def __init__(self, out: TextIO, indent: str = "  "):
+        self._out = out
+        self._indent = indent
+        self._stack: List[str] = []
+        out.write('<?xml version="1.0" ?>\n')
+
+    def _attrs(self, attrs: Optional[Mapping[str, str]]) -> str:
+        return "".join(f' {k}="{_escape(v)}"' for k, v in (attrs or {}).items())
+
+    def start(self, tag: str, attrs: Optional[Mapping[str, str]] = None) -> None:
+        self._out.write(f"{self._indent * len(self._stack)}<{tag}{self._attrs(attrs)}>\n")
+        self._stack.append(tag)
+
+    def end(self) -> None:
+        tag = self._stack.pop()
+        self._out.write(f"{self._indent * len(self._stack)}</{tag}>")
+        if self._stack:
+            self._out.write("\n")
+
+    def element(self, tag: str, text: Optional[object] = None, attrs: Optional[Mapping[str, str]] = None) -> None:
+        pad = self._indent * len(self._stack)
+        if text is None:
+            self._out.write(f"{pad}<{tag}{self._attrs(attrs)}/>\n")
+        else:
+            self._out.write(f"{pad}<{tag}{self._attrs(attrs)}>{_escape(text)}</{tag}>\n")
 
-    urlset = ET.Element("urlset")
-    urlset.set("xmlns", "http://www.sitemaps.org/schemas/sitemap/0.9")
 
-    url = ET.SubElement(urlset, "url")
-    ET.SubElement(url, "loc").text = f"{config.SITE_URL}/"
-    ET.SubElement(url, "changefreq").text = "daily"
-    ET.SubElement(url, "priority").text = "1.0"
-    ET.SubElement(url, "lastmod").text = datetime.now().strftime("%Y-%m-%d")
+@contextmanager
+def _atomic_xml(path: Path, volatile: Optional[re.Pattern] = None) -> Iterator[XmlWriter]:
+    with atomic_writer(path, volatile) as f:
+        yield XmlWriter(f)
 
+
+def _post_rel(post: Dict) -> str:
+    return post.get("url") or post.get("path")
+
+
+def _post_mtime(post: Dict, mtimes: Optional[Mapping[str, float]]) -> Optional[float]:
+    """Modification time from the build's stat data, falling back to the output file."""
+    rel = _post_rel(post)
+    if mtimes is not None and rel in mtimes:
+        return mtimes[rel]
+    file_path = config.ROOT_DIR / rel
+    try:
+        return file_path.stat().st_mtime
+    except OSError:
+        return None
+
+
+def _sitemap_part_path(index: int) -> Path:
+    return config.SITEMAP_FILE.with_name(f"{config.SITEMAP_FILE.stem}-{index}.xml")
+
+
+def _write_urlset(path: Path, urls: List[Tuple[str, str, str, Optional[str]]]) -> None:
+    with _atomic_xml(path) as xml:
+        xml.start("urlset", {"xmlns": SITEMAP_NS})
+        for loc, changefreq, priority, lastmod in urls:
+            xml.start("url")
+            xml.element("loc", loc)
+            xml.element("changefreq", changefreq)
+            xml.element("priority", priority)
+            if lastmod:
+                xml.element("lastmod", lastmod)
+            xml.end()
+        xml.end()
+
+
+def generate_sitemap(blog_posts: List[Dict], mtimes: Optional[Mapping[str, float]] = None) -> None:
+    """Write sitemap.xml; ``mtimes`` maps post URLs to their source modification time.
+
+    Past :data:`SITEMAP_MAX_URLS` entries the URLs are split into
+    ``sitemap-N.xml`` files and ``sitemap.xml`` becomes a sitemap index.
+    """
+    logger.info("开始生成sitemap.xml...")
+    post_urls: List[Tuple[str, str, str, Optional[str]]] = []
     for post in blog_posts:
-        url = ET.SubElement(urlset, "url")
-        rel = post.get("url") or post.get("path")
-        post_url = f"{config.SITE_URL}/{rel}"
-        ET.SubElement(url, "loc").text = post_url
-        ET.SubElement(url, "changefreq").text = "weekly"
-        ET.SubElement(url, "priority").text = "0.8"
-        file_path = config.ROOT_DIR / rel
-        if file_path.exists():
-            mod_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-            ET.SubElement(url, "lastmod").text = mod_time.strftime("%Y-%m-%d")
-
-    xml_str = minidom.parseString(ET.tostring(urlset)).toprettyxml(indent="  ")
-    xml_str = "\n".join([line for line in xml_str.split("\n") if line.strip()])
-    config.SITEMAP_FILE.write_text(xml_str, encoding="utf-8")
+        mtime = _post_mtime(post, mtimes)
+        lastmod = datetime.fromtimestamp(mtime).strftime("%Y-%m-%d") if mtime is not None else None
+        post_urls.append((f"{config.SITE_URL}/{_post_rel(post)}", "weekly", "0.8", lastmod))
+    # The home page changes when a post does, so it takes the newest post date
+    # rather than the build date, which would rewrite the sitemap every day.
+    latest = max((lastmod for *_, lastmod in post_urls if lastmod), default=datetime.now().strftime("%Y-%m-%d"))
+    urls = [(f"{config.SITE_URL}/", "daily", "1.0", latest), *post_urls]
+
+    parts: List[Path] = []
+    if len(urls) <= SITEMAP_MAX_URLS:
+        _write_urlset(config.SITEMAP_FILE, urls)
+    else:
+        for start in range(0, len(urls), SITEMAP_MAX_URLS):
+            part = _sitemap_part_path(len(parts) + 1)
+            _write_urlset(part, urls[start:start + SITEMAP_MAX_URLS])
+            parts.append(part)
+        with _atomic_xml(config.SITEMAP_FILE) as xml:
+            xml.start("sitemapindex", {"xmlns": SITEMAP_NS})
+            for part in parts:
+                xml.start("sitemap")
+                xml.element("loc", f"{config.SITE_URL}/{part.name}")
+                xml.element("lastmod", latest)
+                xml.end()
+            xml.end()
+        logger.info("URL 数量超过 %s，已拆分为 %s 个子 sitemap", SITEMAP_MAX_URLS, len(parts))
+
+    live = {p.name for p in parts}
+    for stale in config.SITEMAP_FILE.parent.glob(f"{config.SITEMAP_FILE.stem}-*.xml"):
+        if stale.name not in live:
+            stale.unlink()
     logger.info("✅ Sitemap生成完成: %s", config.SITEMAP_FILE)
 
 
-def generate_rss_feed(blog_posts: List[Dict]) -> None:
+def generate_rss_feed(blog_posts: List[Dict], mtimes: Optional[Mapping[str, float]] = None) -> None:
+    """Write rss.xml with the most recently modified posts."""
     logger.info("开始生成RSS feed...")
 
-    rss = ET.Element("rss")
-    rss.set("version", "2.0")
-    rss.set("xmlns:atom", "http://www.w3.org/2005/Atom")
-
-    channel = ET.SubElement(rss, "channel")
-    ET.SubElement(channel, "title").text = config.SITE_NAME
-    ET.SubElement(channel, "link").text = config.SITE_URL
-    ET.SubElement(channel, "description").text = config.SITE_DESCRIPTION
-    ET.SubElement(channel, "language").text = "zh-CN"
-    ET.SubElement(channel, "lastBuildDate").text = datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0000")
-
-    atom_link = ET.SubElement(channel, "atom:link")
-    atom_link.set("href", f"{config.SITE_URL}/rss.xml")
-    atom_link.set("rel", "self")
-    atom_link.set("type", "application/rss+xml")
-
-    def post_mtime(post: Dict) -> float:
-        rel = post.get("url") or post.get("path")
-        file_path = config.ROOT_DIR / rel
-        return file_path.stat().st_mtime if file_path.exists() else 0
-
-    sorted_posts = sorted(blog_posts, key=post_mtime, reverse=True)
-
-    for post in sorted_posts[:20]:
-        item = ET.SubElement(channel, "item")
-        ET.SubElement(item, "title").text = post["title"]
-        rel = post.get("url") or post.get("path")
-        post_url = f"{config.SITE_URL}/{rel}"
-        ET.SubElement(item, "link").text = post_url
-        ET.SubElement(item, "guid").text = post_url
-        if post.get("keywords"):
-            description = f"关键词: {', '.join(post['keywords'])}"
-            ET.SubElement(item, "description").text = description
-        for keyword in post.get("keywords", []):
-            ET.SubElement(item, "category").text = keyword
-        file_path = config.ROOT_DIR / rel
-        if file_path.exists():
-            pub_date = datetime.fromtimestamp(file_path.stat().st_mtime)
-            ET.SubElement(item, "pubDate").text = pub_date.strftime("%a, %d %b %Y %H:%M:%S +0000")
-
-    xml_str = minidom.parseString(ET.tostring(rss)).toprettyxml(indent="  ")
-    xml_str = "\n".join([line for line in xml_str.split("\n") if line.strip()])
-    config.RSS_FILE.write_text(xml_str, encoding="utf-8")
+    dated = [(post, _post_mtime(post, mtimes)) for post in blog_posts]
+    dated.sort(key=lambda pair: pair[1] or 0, reverse=True)
+
+    with _atomic_xml(config.RSS_FILE, _RSS_VOLATILE_RE) as xml:
+        xml.start("rss", {"xmlns:atom": "http://www.w3.org/2005/Atom", "version": "2.0"})
+        xml.start("channel")
+        xml.element("title", config.SITE_NAME)
+        xml.element("link", config.SITE_URL)
+        xml.element("description", config.SITE_DESCRIPTION)
+        xml.element("language", "zh-CN")
+        xml.element("lastBuildDate", datetime.now().strftime("%a, %d %b %Y %H:%M:%S +0000"))
+        xml.element(
+            "atom:link",
+            attrs={"href": f"{config.SITE_URL}/rss.xml", "rel": "self", "type": "application/rss+xml"},
+        )
+        for post, mtime in dated[:RSS_MAX_ITEMS]:
+            post_url = f"{config.SITE_URL}/{_post_rel(post)}"
+            xml.start("item")
+            xml.element("title", post["title"])
+            xml.element("link", post_url)
+            xml.element("guid", post_url)
+            if post.get("keywords"):
+                xml.element("description", f"关键词: {', '.join(post['keywords'])}")
+            for keyword in post.get("keywords", []):
+                xml.element("category", keyword)
+            if mtime is not None:
+                pub_date = datetime.fromtimestamp(mtime)
+                xml.element("pubDate", pub_date.strftime("%a, %d %b %Y %H:%M:%S +0000"))
+            xml.end()
+        xml.end()
+        xml.end()
     logger.info("✅ RSS Feed生成完成: %s", config.RSS_FILE)
@@ -0,0 +1,105 @@
+"""Worker pool helpers for rendering pages concurrently."""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+@dataclass
+class JobResult:
+    item: Any
+    value: Any = None
+    error: Optional[BaseException] = None
+    records: List[logging.LogRecord] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.value is not None and self.value is not False
+
+    def messages(self, min_level: int = logging.WARNING) -> List[str]:
+        out = [r.getMessage() for r in self.records if r.levelno >= min_level]
+        if self.error is not None:
+            out.append(f"{type(self.error).__name__}: {self.error}")
+        return out
+
+
+class _BufferingFilter(logging.Filter):
+    """Divert records emitted inside a job into that job's buffer."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        buffer = getattr(_local, "records", None)
+        if buffer is None:
+            return True
+        buffer.append(record)
+        return False
+
+
+_FILTER = _BufferingFilter()
+
+
+def default_jobs() -> int:
+    return os.cpu_count() or 1
+
+
+def _run_one(func: Callable[[Any], Any], item: Any) -> JobResult:
+    result = JobResult(item=item)
+    _local.records = result.records
+    try:
+        result.value = func(item)
+    except Exception as exc:
+        result.error = exc
+    finally:
+        _local.records = None
+    return result
+
+
+def run_jobs(func: Callable[[Any], Any], items: Iterable[Any], jobs: int) -> List[JobResult]:
+    """Run ``func`` over ``items`` on up to ``jobs`` threads.
+
+    Results come back in input order. Log records emitted while a job runs are
+    held on its ``JobResult`` instead of being written immediately, so output
+    stays deterministic; call :func:`replay` to emit them.
+
+    Threads suit the work done here: pandoc runs in subprocesses, and
+    markdown bodies for the in-process engine are rendered beforehand in a
+    process pool (:meth:`MarkdownRenderer.render_many`). What is left per
+    page (link rewriting, templates, writing) holds the GIL, so that part
+    does not scale with ``jobs``.
+    """
+    items = list(items)
+    handlers = logging.getLogger().handlers
+    for handler in handlers:
+        handler.addFilter(_FILTER)
+    try:
+        if jobs <= 1 or len(items) <= 1:
+            return [_run_one(func, item) for item in items]
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            return list(pool.map(lambda item: _run_one(func, item), items))
+    finally:
+        for handler in handlers:
+            handler.removeFilter(_FILTER)
+
+
+def replay(result: JobResult, min_level: int = logging.NOTSET) -> None:
+    for record in result.records:
+        if record.levelno >= min_level:
+            logging.getLogger(record.name).handle(record)
+
+
+def log_failure_summary(kind: str, failures: List[JobResult], label: Callable[[Any], str]) -> None:
+    if not failures:
+        return
+    logger.error("%s生成失败 %s 个:", kind, len(failures))
+    for result in failures:
+        messages = result.messages() or ["未知错误"]
+        logger.error("  ✗ %s", label(result.item))
+        for message in messages:
+            logger.error("      %s", message)
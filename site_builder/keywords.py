@@ -0,0 +1,205 @@
+"""Compiled title keyword extractor.
+
+All dictionaries and patterns are compiled once from :mod:`config`. Topic
+lookup goes through an Aho–Corasick automaton over the lower-cased title, so
+the cost per title does not grow with the size of the topic dictionary.
+"""
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from . import config
+
+_EMOJI_RE = re.compile(r"[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]")
+_WORD_RE = re.compile(r"\b\w+\b")
+_ENGLISH_TERM_RE = re.compile(r"\b[A-Z][A-Za-z]+\b|\b[a-z]{4,}\b")
+_TITLE_PATTERNS = [
+    (re.compile(r"([^，。！？\s]{2,})(?:技术|框架|工具|平台|系统)"), 1),
+    (re.compile(r"(?:使用|运行|配置|安装)\s*([^，。！？\s]{2,})"), 1),
+    (re.compile(r"([A-Z][a-z]+(?:[A-Z][a-z]+)*)"), 0),
+]
+_CHINESE_SPLIT_RE = re.compile(r"[，。！？、\s]+")
+_CHINESE_WORD_RE = re.compile(r"[\u4e00-\u9fff]{2,}")
+_FALLBACK_WORD_RE = re.compile(r"[\u4e00-\u9fff]{2,}|[A-Za-z]{3,}")
+_PLAIN_WORD_RE = re.compile(r"\w+")
+
+
+class TopicAutomaton:
+    """Aho–Corasick automaton reporting every (possibly overlapping) dictionary term in a text."""
+
+    def __init__(self, terms: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[str, ...]] = [()]
+        for term in terms:
+            if not term:
+                continue
+            state = 0
+            for ch in term:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            if term not in self._out[state]:
+                self._out[state] += (term,)
+
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Set[str]:
+        found: Set[str] = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class KeywordExtractor:
+    """Title keyword heuristics (topics, English terms, title patterns, CJK words).
+
+    Matched topics are visited in ``config.CORE_TOPICS`` order, and keywords
+    with equal scores keep the order they appear in the title, so the result
+    does not depend on set iteration order (``PYTHONHASHSEED``).
+    """
+
+    def __init__(self) -> None:
+        self.stop_words = config.STOP_WORDS
+        self.modifier_words = config.MODIFIER_WORDS
+        self.min_length = config.MIN_KEYWORD_LENGTH
+        self.max_keywords = config.MAX_KEYWORDS_PER_POST
+
+        # lower-cased topic -> topics with that spelling, in dictionary order
+        self._topics_by_lower: Dict[str, List[Tuple[int, str]]] = {}
+        for rank, topic in enumerate(config.CORE_TOPICS):
+            self._topics_by_lower.setdefault(topic.lower(), []).append((rank, topic))
+        self._automaton = TopicAutomaton(self._topics_by_lower)
+
+        modifiers = sorted(self.modifier_words, key=len, reverse=True)
+        if all(_PLAIN_WORD_RE.fullmatch(m) for m in modifiers):
+            # Whole-word removals of plain words do not interact, so one pass is equivalent.
+            self._modifier_res = [re.compile(rf"\b(?:{'|'.join(modifiers)})\b")] if modifiers else []
+        else:
+            self._modifier_res = [re.compile(rf"\b{m}\b") for m in modifiers]
+
+    def _matched_topics(self, title_lower: str) -> List[str]:
+        hits: List[Tuple[int, str]] = []
+        for term in self._automaton.find(title_lower):
+            hits.extend(self._topics_by_lower[term])
+        hits.sort()
+        return [topic for _, topic in hits]
+
+    def extract(self, title: str, content: str = "") -> List[str]:
+        if not title:
+            return []
+
+        seen: Set[str] = set()
+        keyword_scores: Dict[str, int] = {}
+
+        clean_title = _EMOJI_RE.sub("", title).strip()
+        if not clean_title:
+            return []
+
+        topics = self._matched_topics(clean_title.lower())
+        if topics:
+            first_word: Dict[str, str] = {}
+            for word in _WORD_RE.findall(clean_title):
+                first_word.setdefault(word.lower(), word)
+            for topic in topics:
+                word = first_word.get(topic.lower())
+                if word is not None:
+                    if word not in seen:
+                        keyword_scores[word] = keyword_scores.get(word, 0) + 10
+                        seen.add(word)
+                elif topic not in seen:
+                    keyword_scores[topic] = keyword_scores.get(topic, 0) + 10
+                    seen.add(topic)
+
+        stop_words = self.stop_words
+        for term in _ENGLISH_TERM_RE.findall(clean_title):
+            if term in stop_words or term.lower() in stop_words:
+                continue
+            if term not in seen and len(term) >= self.min_length:
+                if term[0].isupper() or len(term) > 4:
+                    keyword_scores[term] = keyword_scores.get(term, 0) + 5
+                    seen.add(term)
+
+        processed_title = clean_title
+        for modifier_re in self._modifier_res:
+            processed_title = modifier_re.sub("", processed_title)
+        processed_title = processed_title.strip()
+
+        for pattern, group in _TITLE_PATTERNS:
+            for match in pattern.findall(clean_title):
+                keyword = match if isinstance(match, str) else match[group]
+                keyword = keyword.strip()
+                if (
+                    keyword
+                    and keyword not in stop_words
+                    and keyword not in self.modifier_words
+                    and len(keyword) >= self.min_length
+                    and keyword not in seen
+                ):
+                    keyword_scores[keyword] = keyword_scores.get(keyword, 0) + 3
+                    seen.add(keyword)
+
+        for part in _CHINESE_SPLIT_RE.split(processed_title):
+            for word in _CHINESE_WORD_RE.findall(part):
+                if (
+                    word not in stop_words
+                    and word not in self.modifier_words
+                    and len(word) >= self.min_length
+                    and word not in seen
+                ):
+                    keyword_scores[word] = keyword_scores.get(word, 0) + 2
+                    seen.add(word)
+
+        # Equal scores keep the order the keywords appear in the title.
+        title_lower = clean_title.lower()
+
+        def rank(item: Tuple[str, int]) -> Tuple[int, int]:
+            position = title_lower.find(item[0].lower())
+            return -item[1], position if position >= 0 else len(title_lower)
+
+        sorted_keywords = sorted(keyword_scores.items(), key=rank)
+        keywords = [kw for kw, _ in sorted_keywords[: self.max_keywords]]
+
+        if len(keywords) < 2:
+            for word in _FALLBACK_WORD_RE.findall(clean_title):
+                if word not in stop_words and word not in seen and len(keywords) < self.max_keywords:
+                    keywords.append(word)
+                    seen.add(word)
+
+        return keywords[: self.max_keywords]
+
+    def extract_many(self, items: Iterable[Tuple[str, str]]) -> List[List[str]]:
+        """Extract keywords for many ``(title, content)`` pairs."""
+        extract = self.extract
+        return [extract(title, content) for title, content in items]
+
+
+@lru_cache(maxsize=None)
+def get_extractor() -> KeywordExtractor:
+    return KeywordExtractor()
+
+
+def extract_keywords_many(items: Iterable[Tuple[str, str]], extractor: Optional[KeywordExtractor] = None) -> List[List[str]]:
+    return (extractor or get_extractor()).extract_many(items)
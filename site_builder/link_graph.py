@@ -0,0 +1,128 @@
+"""Site-wide link graph recorded from the link rewriter.
+
+Every ``legacy_to_new`` probe of :func:`~.renderers.rewrite_internal_links`
+is kept per page in the build manifest, so the graph of the whole site can be
+assembled after a build without re-rendering anything, including pages that
+were skipped as unchanged. It is saved to ``.build_cache/links.json`` as
+adjacency lists over page indices; ``--check-links`` reports from that file.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from . import config
+from .output import write_if_changed
+
+GRAPH_FORMAT_VERSION = 1
+
+# (title, url) of a page.
+Page = Tuple[str, str]
+
+
+@dataclass
+class LinkGraph:
+    """Pages and the internal links between them.
+
+    ``links[i]`` holds the indices of the pages page ``i`` links to and
+    ``broken[i]`` the link index keys of its ``.md``/``.html`` links that
+    resolve to neither a page nor an existing file.
+    """
+
+    pages: List[Page]
+    links: List[List[int]]
+    broken: Dict[int, List[str]]
+
+    def backlinks(self) -> List[List[int]]:
+        """Indices of the pages linking to each page, in page order."""
+        inbound: List[List[int]] = [[] for _ in self.pages]
+        for i, targets in enumerate(self.links):
+            for j in targets:
+                inbound[j].append(i)
+        return inbound
+
+    def backlinks_by_url(self) -> Dict[str, List[Page]]:
+        return {
+            self.pages[j][1]: [self.pages[i] for i in sources]
+            for j, sources in enumerate(self.backlinks())
+            if sources
+        }
+
+    def orphans(self) -> List[int]:
+        """Posts no other page links to."""
+        posts_prefix = config.POSTS_OUT_DIR.relative_to(config.ROOT_DIR).as_posix() + "/"
+        return [
+            j for j, sources in enumerate(self.backlinks())
+            if not sources and self.pages[j][1].startswith(posts_prefix)
+        ]
+
+    def report(self) -> str:
+        """Broken links, orphan posts and backlinks per post, as printed by ``--check-links``."""
+        lines = [f"🔗 链接检查：{len(self.pages)} 个页面，{sum(map(len, self.links))} 条站内链接"]
+        lines.append(f"\n❌ 失效链接（{sum(map(len, self.broken.values()))}）")
+        for i in sorted(self.broken):
+            title, url = self.pages[i]
+            lines.extend(f"  {title} ({url}) -> {key}" for key in self.broken[i])
+        orphans = self.orphans()
+        lines.append(f"\n🏝️  孤立文章（{len(orphans)}）")
+        lines.extend(f"  {self.pages[j][0]} ({self.pages[j][1]})" for j in orphans)
+        inbound = self.backlinks()
+        linked = [j for j in range(len(self.pages)) if inbound[j]]
+        lines.append(f"\n↩️  反向链接（{len(linked)} 个页面被引用）")
+        for j in linked:
+            lines.append(f"  {self.pages[j][0]} ({self.pages[j][1]})")
+            lines.extend(f"    <- {self.pages[i][0]} ({self.pages[i][1]})" for i in inbound[j])
+        return "\n".join(lines)
+
+    def save(self, path: Optional[Path] = None) -> None:
+        path = path or config.LINK_GRAPH_FILE
+        data = {
+            "version": GRAPH_FORMAT_VERSION,
+            "pages": self.pages,
+            "links": self.links,
+            "broken": {str(i): keys for i, keys in self.broken.items()},
+        }
+        write_if_changed(path, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> Optional["LinkGraph"]:
+        """The graph saved by the last build, or ``None`` when missing or unreadable."""
+        path = path or config.LINK_GRAPH_FILE
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != GRAPH_FORMAT_VERSION:
+            return None
+        return cls(
+            pages=[tuple(page) for page in data["pages"]],
+            links=data["links"],
+            broken={int(i): keys for i, keys in data["broken"].items()},
+        )
+
+
+def build_link_graph(pages: Sequence[Page], page_links: Mapping[str, Mapping[str, Optional[str]]]) -> LinkGraph:
+    """Assemble the graph from the recorded link lookups of each page URL.
+
+    ``page_links`` maps a page URL to its ``{link key: target URL or None}``
+    lookups (the manifest's ``links``); pages without an entry have no links.
+    """
+    index = {url: i for i, (_, url) in enumerate(pages)}
+    links: List[List[int]] = []
+    broken: Dict[int, List[str]] = {}
+    for i, (_, url) in enumerate(pages):
+        targets = set()
+        missing = []
+        for key, target in (page_links.get(url) or {}).items():
+            if target is not None:
+                j = index.get(target)
+                if j is not None and j != i:
+                    targets.add(j)
+            elif key.endswith(".html") and not (config.ROOT_DIR / key).exists():
+                missing.append(key)
+        links.append(sorted(targets))
+        if missing:
+            broken[i] = sorted(missing)
+    return LinkGraph(pages=list(pages), links=links, broken=broken)
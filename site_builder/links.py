@@ -0,0 +1,44 @@
+"""Normalized link index keys and href resolution for the link rewriter.
+
+Every link target (a post's legacy ``.html`` path or a directory's legacy
+``index.html``) has exactly one key: a root-relative POSIX path without a
+leading slash, with ``.`` / ``..`` segments collapsed and ``.md`` mapped to
+``.html``. Hrefs are normalized to the same form once per (page directory,
+href) pair, so the rewriter needs a single dictionary probe per link.
+"""
+from __future__ import annotations
+
+import posixpath
+import re
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import unquote
+
+_SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+
+def link_key(path: str) -> str:
+    """Canonical link index key of a root-relative path."""
+    path = posixpath.normpath(path.replace("\\", "/").lstrip("/"))
+    if path.endswith(".md"):
+        path = path[:-3] + ".html"
+    return path
+
+
+@lru_cache(maxsize=1 << 16)
+def resolve_link(base_dir: str, href: str) -> Optional[str]:
+    """Link index key an href points to, or ``None`` for external and in-page links.
+
+    ``base_dir`` is the root-relative directory of the page the href appears in.
+    Query strings and fragments are ignored; links escaping the root are ``None``.
+    """
+    path = href.split("#", 1)[0].split("?", 1)[0]
+    if not path or path.startswith("//") or _SCHEME_RE.match(path):
+        return None
+    path = unquote(path)
+    if not path.startswith("/"):
+        path = posixpath.join(base_dir, path)
+    key = link_key(path)
+    if key == ".." or key.startswith("../"):
+        return None
+    return key
@@ -0,0 +1,130 @@
+"""Persistent build manifest used to skip pages whose inputs did not change."""
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from . import config
+from .minify import MINIFIER_VERSION
+from .output import write_if_changed
+from .sources import SourceDocument
+from .template import get_template
+from .utils import content_hash
+
+logger = logging.getLogger(__name__)
+
+LinkDeps = Dict[str, Optional[str]]
+
+
+@dataclass
+class BuildManifest:
+    """Maps each output (relative to ROOT_DIR) to the inputs it was rendered from.
+
+    An entry is reused only when the builder version, the template hash and the
+    renderer match the manifest header, the page key (source content hash) is
+    unchanged, the output still exists, and every ``legacy_to_new`` lookup the
+    link rewriter performed for the page resolves to the same value as before.
+    The last check is what makes a slug change in one note re-render exactly the
+    pages linking to it.
+    """
+
+    path: Path
+    template_hash: str
+    renderer: str
+    entries: Dict[str, Dict] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls, renderer: str, path: Optional[Path] = None) -> "BuildManifest":
+        path = path or config.MANIFEST_FILE
+        template_hash = template_fingerprint()
+        manifest = cls(path=path, template_hash=template_hash, renderer=renderer)
+        if not path.exists():
+            return manifest
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            logger.warning("构建缓存读取失败，将全量构建: %s", exc)
+            return manifest
+        if (
+            data.get("builder_version") == config.BUILDER_VERSION
+            and data.get("template") == template_hash
+            and data.get("renderer") == renderer
+        ):
+            manifest.entries = data.get("entries", {})
+        else:
+            logger.info("构建器/模板/渲染器已变更，缓存失效")
+        return manifest
+
+    def is_fresh(self, out_rel: str, key: str, legacy_to_new: Dict[str, str]) -> bool:
+        entry = self.entries.get(out_rel)
+        if not entry or entry.get("key") != key:
+            return False
+        if not (config.ROOT_DIR / out_rel).exists():
+            return False
+        return all(legacy_to_new.get(href) == target for href, target in entry.get("links", {}).items())
+
+    def record(self, out_rel: str, key: str, link_deps: LinkDeps) -> None:
+        self.entries[out_rel] = {"key": key, "links": link_deps}
+
+    def forget(self, out_rel: str) -> None:
+        self.entries.pop(out_rel, None)
+
+    def prune(self, live_outputs: Iterable[str]) -> None:
+        live = set(live_outputs)
+        for out_rel in [k for k in self.entries if k not in live]:
+            del self.entries[out_rel]
+
+    def save(self) -> None:
+        data = {
+            "builder_version": config.BUILDER_VERSION,
+            "template": self.template_hash,
+            "renderer": self.renderer,
+            "entries": self.entries,
+        }
+        write_if_changed(self.path, json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+
+def template_fingerprint() -> str:
+    if not config.TEMPLATE_FILE.exists():
+        return ""
+    fingerprint = get_template().fingerprint
+    # Minified and plain pages are not interchangeable.
+    if config.MINIFY_ENABLED:
+        fingerprint = content_hash(f"{fingerprint}\0minify-{MINIFIER_VERSION}")
+    return fingerprint
+
+
+def post_page_key(doc: SourceDocument) -> str:
+    # Keywords and related posts depend on the rest of the corpus. The source
+    # directory matters for posts with a fixed slug: it sets the nav category
+    # and the base of relative links and image paths. The page dates come from
+    # the source's ctime and mtime, which change without its content.
+    related = [f"{title}\t{url}" for title, url in doc.related]
+    backlinks = [f"{title}\t{url}" for title, url in doc.backlinks]
+    source_dir = doc.path.parent.relative_to(config.ROOT_DIR).as_posix()
+    parts = [doc.content_hash, source_dir, str(doc.ctime), str(doc.mtime), *doc.keywords, "", *related, "", *backlinks]
+    return content_hash("\0".join(parts))
+
+
+def directory_page_key(dir_node: Dict, index_doc: Optional[SourceDocument]) -> str:
+    legacy_index = config.ROOT_DIR / dir_node["path"] / "index.html"
+    # The file the page dates are taken from, as in render_directory_page.
+    if index_doc is not None:
+        times = (index_doc.ctime, index_doc.mtime)
+    else:
+        try:
+            stat = (legacy_index if legacy_index.exists() else config.ROOT_DIR / dir_node["path"]).stat()
+            times = (stat.st_ctime, stat.st_mtime)
+        except OSError:
+            times = ("-", "-")
+    parts = [
+        dir_node["id"],
+        dir_node.get("name") or "",
+        index_doc.content_hash if index_doc else "-",
+        content_hash(legacy_index.read_bytes()) if legacy_index.exists() else "-",
+        *map(str, times),
+    ]
+    return content_hash("\0".join(parts))
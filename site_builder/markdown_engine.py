@@ -0,0 +1,879 @@
+"""In-process Markdown to HTML engine.
+
+Covers CommonMark block and inline syntax plus the extensions the notes rely
+on: pipe tables, fenced code blocks, strikethrough and pandoc-style heading
+identifiers (including explicit ``{#id}`` attributes). Fenced code is emitted
+as ``<pre><code class="language-xxx">`` so highlight.js can pick it up as-is.
+
+Footnotes are not supported: ``[^1]`` references and ``[^1]: ...``
+definitions are left as text (pandoc renders them). Block quotes and lists
+nested deeper than :data:`MAX_NESTING` levels are rendered as paragraphs,
+and link, code span and emphasis scanning is bounded like CommonMark's, so
+hostile input cannot exhaust the stack or take quadratic time
+(``benchmarks/run.py`` checks a set of such inputs).
+"""
+from __future__ import annotations
+
+import html
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from html.entities import html5
+from typing import Dict, List, Optional, Set, Tuple
+
+ENGINE_VERSION = "3"
+
+# Container blocks (block quotes, lists) nested deeper than this are not parsed.
+MAX_NESTING = 32
+# CommonMark limits on link reference labels and on nested parentheses in
+# a link destination.
+_MAX_LABEL_LENGTH = 999
+_MAX_LINK_PARENS = 32
+
+_ATX_RE = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+|$)(.*?)(?:[ \t]+#+)?[ \t]*$")
+_HEADING_ATTR_RE = re.compile(r"\s*\{([^{}]*)\}\s*$")
+_SETEXT_RE = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+_HR_RE = re.compile(r"^ {0,3}(?:(?:\*[ \t]*){3,}|(?:-[ \t]*){3,}|(?:_[ \t]*){3,})$")
+_FENCE_RE = re.compile(r"^( {0,3})(`{3,}|~{3,})[ \t]*([^`]*?)[ \t]*$")
+_BULLET_RE = re.compile(r"^( {0,3})([-+*])([ \t]+|$)")
+_ORDERED_RE = re.compile(r"^( {0,3})(\d{1,9})([.)])([ \t]+|$)")
+_QUOTE_RE = re.compile(r"^ {0,3}> ?")
+_RAW_BLOCK_TAGS = {"script", "pre", "style", "textarea"}
+_BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "body", "caption", "center", "col", "colgroup", "dd",
+    "details", "dialog", "dir", "div", "dl", "dt", "fieldset", "figcaption", "figure", "footer", "form",
+    "h1", "h2", "h3", "h4", "h5", "h6", "head", "header", "hr", "html", "iframe", "legend", "li", "main",
+    "menu", "nav", "ol", "p", "section", "summary", "table", "tbody", "td", "tfoot", "th", "thead",
+    "tr", "ul", "video", "audio",
+}
+_TAG_NAME_RE = re.compile(r"</?([A-Za-z][A-Za-z0-9-]*)(?=[\s/>]|$)")
+_OPEN_TAG = r"<[A-Za-z][A-Za-z0-9-]*(?:\s+[A-Za-z_:][\w.:-]*(?:\s*=\s*(?:[^\s\"'=<>`]+|'[^']*'|\"[^\"]*\"))?)*\s*/?>"
+_CLOSE_TAG = r"</[A-Za-z][A-Za-z0-9-]*\s*>"
+_LONE_TAG_RE = re.compile(rf"(?:{_OPEN_TAG}|{_CLOSE_TAG})[ \t]*")
+_REF_DEF_RE = re.compile(
+    r"^ {0,3}\[((?:[^\[\]\\]|\\.)+)\]:[ \t]*(<[^>\n]*>|\S+)(?:[ \t]+(\"[^\"]*\"|'[^']*'|\([^)]*\)))?[ \t]*$"
+)
+_REF_LABEL_RE = re.compile(rf"\[((?:[^\[\]\\]|\\.){{0,{_MAX_LABEL_LENGTH}}})\]")
+_TABLE_DELIM_RE = re.compile(r"^ {0,3}\|?[ \t]*:?-+:?[ \t]*(?:\|[ \t]*:?-+:?[ \t]*)*\|?[ \t]*$")
+
+
+def _expand_tabs(line: str) -> str:
+    return line.expandtabs(4) if "\t" in line else line
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip(" "))
+
+
+def _is_blank(line: str) -> bool:
+    return not line.strip()
+
+
+def _html_block_start(line: str, interrupting: bool = False) -> bool:
+    if _indent(line) > 3:
+        return False
+    s = line.lstrip(" ")
+    if s.startswith(("<!--", "<?")) or re.match(r"<![A-Za-z]", s):
+        return True
+    m = _TAG_NAME_RE.match(s)
+    if m and m.group(1).lower() in _BLOCK_TAGS | _RAW_BLOCK_TAGS:
+        return True
+    # A line holding nothing but one complete tag starts a block, but cannot
+    # interrupt a paragraph.
+    return not interrupting and bool(_LONE_TAG_RE.fullmatch(s))
+
+
+def _normalize_label(label: str) -> str:
+    return " ".join(label.split()).casefold()
+
+
+@dataclass
+class _Block:
+    kind: str
+    text: str = ""
+    level: int = 0
+    info: str = ""
+    attrs: Dict[str, str] = field(default_factory=dict)
+    children: List["_Block"] = field(default_factory=list)
+    items: List[List["_Block"]] = field(default_factory=list)
+    tight: bool = True
+    start: int = 1
+    rows: List[List[str]] = field(default_factory=list)
+    aligns: List[str] = field(default_factory=list)
+
+
+class _BlockParser:
+    def __init__(self, refs: Dict[str, Tuple[str, str]]):
+        self.refs = refs
+        self.depth = 0
+
+    def starts_block(self, line: str) -> bool:
+        """Whether ``line`` interrupts a paragraph."""
+        return bool(
+            _ATX_RE.match(line)
+            or _HR_RE.match(line)
+            or _FENCE_RE.match(line)
+            or _QUOTE_RE.match(line)
+            or (_BULLET_RE.match(line) and not _is_blank(line[_BULLET_RE.match(line).end():]))
+            or (_ORDERED_RE.match(line) and _ORDERED_RE.match(line).group(2) == "1")
+            or _html_block_start(line, interrupting=True)
+        )
+
+    def parse(self, lines: List[str]) -> List[_Block]:
+        blocks: List[_Block] = []
+        i = 0
+        n = len(lines)
+        while i < n:
+            line = lines[i]
+            if _is_blank(line):
+                i += 1
+                continue
+
+            fence = _FENCE_RE.match(line)
+            if fence and not (fence.group(2)[0] == "`" and "`" in fence.group(3)):
+                i = self._fenced_code(lines, i, fence, blocks)
+                continue
+
+            atx = _ATX_RE.match(line)
+            if atx:
+                text, attrs = _split_heading_attrs(atx.group(2))
+                blocks.append(_Block("heading", text=text, level=len(atx.group(1)), attrs=attrs))
+                i += 1
+                continue
+
+            if _HR_RE.match(line):
+                blocks.append(_Block("hr"))
+                i += 1
+                continue
+
+            nested = self.depth < MAX_NESTING
+            if nested and _QUOTE_RE.match(line):
+                i = self._blockquote(lines, i, blocks)
+                continue
+
+            if nested and (_BULLET_RE.match(line) or _ORDERED_RE.match(line)):
+                i = self._list(lines, i, blocks)
+                continue
+
+            if _indent(line) >= 4:
+                i = self._indented_code(lines, i, blocks)
+                continue
+
+            if _html_block_start(line):
+                i = self._html_block(lines, i, blocks)
+                continue
+
+            if "|" in line and i + 1 < n and _TABLE_DELIM_RE.match(lines[i + 1]) and "-" in lines[i + 1]:
+                i = self._table(lines, i, blocks)
+                continue
+
+            i = self._paragraph(lines, i, blocks)
+        return blocks
+
+    def _parse_nested(self, lines: List[str]) -> List[_Block]:
+        self.depth += 1
+        try:
+            return self.parse(lines)
+        finally:
+            self.depth -= 1
+
+    def _fenced_code(self, lines: List[str], i: int, fence: re.Match, blocks: List[_Block]) -> int:
+        indent = len(fence.group(1))
+        marker = fence.group(2)
+        info = fence.group(3).strip()
+        body: List[str] = []
+        i += 1
+        close_re = re.compile(rf"^ {{0,3}}{re.escape(marker[0])}{{{len(marker)},}}[ \t]*$")
+        while i < len(lines):
+            if close_re.match(lines[i]):
+                i += 1
+                break
+            line = lines[i]
+            strip = min(indent, _indent(line))
+            body.append(line[strip:])
+            i += 1
+        info = info.strip("{}").strip()
+        language = info.split()[0].lstrip(".") if info else ""
+        blocks.append(_Block("code", text="\n".join(body) + ("\n" if body else ""), info=language))
+        return i
+
+    def _indented_code(self, lines: List[str], i: int, blocks: List[_Block]) -> int:
+        body: List[str] = []
+        while i < len(lines) and (_indent(lines[i]) >= 4 or _is_blank(lines[i])):
+            body.append(lines[i][4:] if _indent(lines[i]) >= 4 else "")
+            i += 1
+        while body and not body[-1].strip():
+            body.pop()
+        blocks.append(_Block("code", text="\n".join(body) + "\n"))
+        return i
+
+    def _blockquote(self, lines: List[str], i: int, blocks: List[_Block]) -> int:
+        inner: List[str] = []
+        while i < len(lines):
+            line = lines[i]
+            m = _QUOTE_RE.match(line)
+            if m:
+                inner.append(line[m.end():])
+            elif not _is_blank(line) and inner and not _is_blank(inner[-1]) and not self.starts_block(line):
+                inner.append(line)  # lazy continuation
+            else:
+                break
+            i += 1
+        blocks.append(_Block("blockquote", children=self._parse_nested(inner)))
+        return i
+
+    def _list(self, lines: List[str], i: int, blocks: List[_Block]) -> int:
+        first = _BULLET_RE.match(lines[i]) or _ORDERED_RE.match(lines[i])
+        ordered = first.re is _ORDERED_RE
+        delimiter = first.group(3) if ordered else first.group(2)
+        block = _Block("ol" if ordered else "ul", start=int(first.group(2)) if ordered else 1)
+        saw_blank_between = False
+
+        while i < len(lines):
+            m = (_ORDERED_RE if ordered else _BULLET_RE).match(lines[i])
+            if not m or (m.group(3) if ordered else m.group(2)) != delimiter:
+                break
+            line = lines[i]
+            rest = line[m.end():]
+            content_indent = m.end()
+            if _is_blank(rest):
+                content_indent = m.end() - len(m.group(m.lastindex)) + 1
+            elif len(m.group(m.lastindex)) > 4:
+                content_indent = m.end() - len(m.group(m.lastindex)) + 1
+                rest = line[content_indent:]
+            item_lines = [rest]
+            i += 1
+            while i < len(lines):
+                line = lines[i]
+                if _is_blank(line):
+                    item_lines.append("")
+                    i += 1
+                    continue
+                if _indent(line) >= content_indent:
+                    item_lines.append(line[content_indent:])
+                    i += 1
+                    continue
+                if _BULLET_RE.match(line) or _ORDERED_RE.match(line):
+                    break
+                if not _is_blank(item_lines[-1]) and not self.starts_block(line) and not _HR_RE.match(line):
+                    item_lines.append(line)  # lazy continuation
+                    i += 1
+                    continue
+                break
+            trailing_blank = False
+            while item_lines and _is_blank(item_lines[-1]):
+                item_lines.pop()
+                trailing_blank = True
+            children = self._parse_nested(item_lines)
+            if any(_is_blank(l) for l in item_lines) and len(children) > 1:
+                block.tight = False
+            block.items.append(children)
+            if trailing_blank:
+                nxt = (_ORDERED_RE if ordered else _BULLET_RE).match(lines[i]) if i < len(lines) else None
+                if nxt and (nxt.group(3) if ordered else nxt.group(2)) == delimiter:
+                    saw_blank_between = True
+                else:
+                    break
+        if saw_blank_between:
+            block.tight = False
+        blocks.append(block)
+        return i
+
+    def _html_block(self, lines: List[str], i: int, blocks: List[_Block]) -> int:
+        body: List[str] = []
+        first = lines[i].lstrip()
+        tag = re.match(r"<([A-Za-z][A-Za-z0-9-]*)", first)
+        if first.startswith("<!--"):
+            end_marker: Optional[str] = "-->"
+        elif tag and tag.group(1).lower() in _RAW_BLOCK_TAGS:
+            end_marker = f"</{tag.group(1).lower()}>"
+        else:
+            end_marker = None
+        while i < len(lines):
+            line = lines[i]
+            if end_marker is None and _is_blank(line):
+                break
+            body.append(line)
+            i += 1
+            if end_marker is not None and end_marker in line.lower():
+                break
+        blocks.append(_Block("html", text="\n".join(body)))
+        return i
+
+    def _table(self, lines: List[str], i: int, blocks: List[_Block]) -> int:
+        header = _split_row(lines[i])
+        aligns = []
+        for cell in _split_row(lines[i + 1]):
+            cell = cell.strip()
+            if cell.startswith(":") and cell.endswith(":"):
+                aligns.append("center")
+            elif cell.endswith(":"):
+                aligns.append("right")
+            elif cell.startswith(":"):
+                aligns.append("left")
+            else:
+                aligns.append("")
+        if len(aligns) != len(header):
+            return self._paragraph(lines, i, blocks)
+        rows = [header]
+        i += 2
+        while i < len(lines) and not _is_blank(lines[i]) and "|" in lines[i] and not self.starts_block(lines[i]):
+            row = _split_row(lines[i])
+            row = (row + [""] * len(aligns))[: len(aligns)]
+            rows.append(row)
+            i += 1
+        blocks.append(_Block("table", rows=rows, aligns=aligns))
+        return i
+
+    def _paragraph(self, lines: List[str], i: int, blocks: List[_Block]) -> int:
+        para: List[str] = [lines[i]]
+        i += 1
+        while i < len(lines):
+            line = lines[i]
+            if _is_blank(line):
+                break
+            setext = _SETEXT_RE.match(line)
+            if setext:
+                text = "\n".join(l.strip() for l in para)
+                text, attrs = _split_heading_attrs(text)
+                level = 1 if setext.group(1)[0] == "=" else 2
+                blocks.append(_Block("heading", text=text, level=level, attrs=attrs))
+                return i + 1
+            if self.starts_block(line):
+                break
+            if "|" in line and i + 1 < len(lines) and _TABLE_DELIM_RE.match(lines[i + 1]) and "-" in lines[i + 1]:
+                break
+            para.append(line)
+            i += 1
+
+        # Leading link reference definitions are not rendered.
+        while para:
+            ref = _REF_DEF_RE.match(para[0])
+            if not ref or ref.group(1).startswith("^"):
+                break
+            label = _normalize_label(ref.group(1))
+            dest = ref.group(2)
+            if dest.startswith("<") and dest.endswith(">"):
+                dest = dest[1:-1]
+            title = ref.group(3)[1:-1] if ref.group(3) else ""
+            self.refs.setdefault(label, (dest, title))
+            para.pop(0)
+        if para:
+            text = "\n".join(l.lstrip() for l in para).rstrip()
+            blocks.append(_Block("paragraph", text=text))
+        return i
+
+
+def _split_heading_attrs(text: str) -> Tuple[str, Dict[str, str]]:
+    attrs: Dict[str, str] = {}
+    m = _HEADING_ATTR_RE.search(text)
+    if m and re.fullmatch(r"(?:\s*(?:#[\w:.-]+|\.[\w-]+|[\w-]+=\S+))*\s*", m.group(1)):
+        for part in m.group(1).split():
+            if part.startswith("#"):
+                attrs["id"] = part[1:]
+            elif part.startswith("."):
+                attrs["class"] = (attrs.get("class", "") + " " + part[1:]).strip()
+        text = text[: m.start()]
+    return text.strip(), attrs
+
+
+def _split_row(line: str) -> List[str]:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    cells: List[str] = []
+    current: List[str] = []
+    in_code = 0
+    j = 0
+    while j < len(line):
+        ch = line[j]
+        if ch == "\\" and j + 1 < len(line) and line[j + 1] == "|":
+            current.append("|")
+            j += 2
+            continue
+        if ch == "`":
+            run = len(line[j:]) - len(line[j:].lstrip("`"))
+            in_code = 0 if in_code == run else (run if not in_code else in_code)
+            current.append(line[j:j + run])
+            j += run
+            continue
+        if ch == "|" and not in_code:
+            cells.append("".join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+        j += 1
+    cells.append("".join(current).strip())
+    return cells
+
+
+# --------------------------------------------------------------------------
+# Inline parsing
+# --------------------------------------------------------------------------
+
+_ESCAPABLE = set("!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~")
+_ENTITY_RE = re.compile(r"&(?:#[xX][0-9a-fA-F]{1,6}|#[0-9]{1,7}|[A-Za-z][A-Za-z0-9]{1,31});")
+_AUTOLINK_RE = re.compile(r"<([A-Za-z][A-Za-z0-9+.-]{1,31}:[^\s<>]*)>")
+_EMAIL_RE = re.compile(r"<([A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+@[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?(?:\.[A-Za-z0-9-]+)*)>")
+_INLINE_HTML_RE = re.compile(rf"<!--[\s\S]*?-->|{_CLOSE_TAG}|{_OPEN_TAG}")
+_RUN_RES = {ch: re.compile(rf"{re.escape(ch)}+") for ch in "`*_~"}
+
+
+def _escape(text: str) -> str:
+    return html.escape(text, quote=False)
+
+
+def _escape_attr(text: str) -> str:
+    return html.escape(text, quote=True)
+
+
+def _escape_keep_entities(text: str) -> str:
+    """Escape ``text`` but keep numeric and known named character references."""
+    out: List[str] = []
+    last = 0
+    for m in _ENTITY_RE.finditer(text):
+        if m.group(0)[1] != "#" and m.group(0)[1:] not in html5:
+            continue
+        out.append(_escape(text[last:m.start()]))
+        out.append(m.group(0))
+        last = m.end()
+    out.append(_escape(text[last:]))
+    return "".join(out)
+
+
+def _encode_url(url: str) -> str:
+    return _escape_attr(url.replace(" ", "%20"))
+
+
+def _char_class(ch: str) -> str:
+    if not ch or ch.isspace():
+        return "space"
+    if ch in _ESCAPABLE or unicodedata.category(ch).startswith("P"):
+        return "punct"
+    return "other"
+
+
+class _Delim:
+    """A run of ``*``, ``_`` or ``~``; also a node of the delimiter stack.
+
+    Matched emphasis is recorded on the delimiters themselves: closing tags
+    go before the characters left in the run, opening tags after them.
+    """
+
+    __slots__ = ("char", "count", "length", "can_open", "can_close", "prev", "next", "open_tags", "close_tags")
+
+    def __init__(self, char: str, count: int, can_open: bool, can_close: bool):
+        self.char = char
+        self.count = count
+        self.length = count  # original run length, for the rule of 3
+        self.can_open = can_open
+        self.can_close = can_close
+        self.prev: Optional[_Delim] = None
+        self.next: Optional[_Delim] = None
+        self.open_tags: List[str] = []  # innermost first
+        self.close_tags: List[str] = []
+
+    def unlink(self) -> None:
+        if self.prev is not None:
+            self.prev.next = self.next
+        if self.next is not None:
+            self.next.prev = self.prev
+
+
+class _Bracket:
+    __slots__ = ("image", "active", "index", "start")
+
+    def __init__(self, image: bool, index: int, start: int):
+        self.image = image
+        self.active = True
+        self.index = index  # position in the node list
+        self.start = start  # text offset just after the bracket
+
+
+class InlineRenderer:
+    def __init__(self, refs: Dict[str, Tuple[str, str]]):
+        self.refs = refs
+
+    def render(self, text: str) -> str:
+        nodes = self._parse(text)
+        self._process_emphasis(nodes)
+        return self._flatten(nodes)
+
+    def plain(self, text: str) -> str:
+        """Text content of ``text`` without markup (used for ids and alt text)."""
+        return re.sub(r"<[^>]+>", "", html.unescape(self.render(text)))
+
+    # Nodes are ``str`` (already-escaped HTML), ``_Delim`` or ``_Bracket``.
+    def _parse(self, text: str) -> List[object]:
+        nodes: List[object] = []
+        brackets: List[_Bracket] = []
+        buf: List[str] = []
+        i = 0
+        n = len(text)
+        # Searches that already failed are not repeated further on: backtick
+        # run lengths with no closing run, and comments with no "-->" left.
+        unclosed_code: Set[int] = set()
+        last_comment_end = text.rfind("-->")
+
+        def flush() -> None:
+            if buf:
+                nodes.append(_escape_keep_entities("".join(buf)))
+                buf.clear()
+
+        while i < n:
+            ch = text[i]
+            if ch == "\\":
+                if i + 1 < n and text[i + 1] == "\n":
+                    flush()
+                    nodes.append("<br />\n")
+                    i += 2
+                    continue
+                if i + 1 < n and text[i + 1] in _ESCAPABLE:
+                    flush()
+                    nodes.append(_escape(text[i + 1]))
+                    i += 2
+                    continue
+                buf.append(ch)
+                i += 1
+                continue
+
+            if ch == "`":
+                run = _RUN_RES["`"].match(text, i).end() - i
+                close = None
+                if run not in unclosed_code:
+                    close = re.compile(rf"(?<!`)`{{{run}}}(?!`)").search(text, i + run)
+                    if close is None:
+                        unclosed_code.add(run)
+                if close:
+                    flush()
+                    code = text[i + run:close.start()].replace("\n", " ")
+                    if code.startswith(" ") and code.endswith(" ") and code.strip():
+                        code = code[1:-1]
+                    nodes.append(f"<code>{_escape(code)}</code>")
+                    i = close.end()
+                else:
+                    buf.append("`" * run)
+                    i += run
+                continue
+
+            if ch == "<":
+                m = _AUTOLINK_RE.match(text, i) or _EMAIL_RE.match(text, i)
+                if m:
+                    flush()
+                    target = m.group(1)
+                    href = target if m.re is _AUTOLINK_RE else f"mailto:{target}"
+                    nodes.append(f'<a href="{_encode_url(href)}">{_escape(target)}</a>')
+                    i = m.end()
+                    continue
+                m = None
+                if not text.startswith("<!--", i) or last_comment_end >= i + 4:
+                    m = _INLINE_HTML_RE.match(text, i)
+                if m:
+                    flush()
+                    nodes.append(m.group(0))
+                    i = m.end()
+                    continue
+
+            if ch in "*_~":
+                run = _RUN_RES[ch].match(text, i).end() - i
+                if ch == "~" and run != 2:
+                    buf.append(ch * run)
+                    i += run
+                    continue
+                flush()
+                before = _char_class(text[i - 1] if i > 0 else "")
+                after = _char_class(text[i + run] if i + run < n else "")
+                left = after != "space" and (after != "punct" or before in ("space", "punct"))
+                right = before != "space" and (before != "punct" or after in ("space", "punct"))
+                if ch == "_":
+                    can_open = left and (not right or before == "punct")
+                    can_close = right and (not left or after == "punct")
+                else:
+                    can_open, can_close = left, right
+                nodes.append(_Delim(ch, run, can_open, can_close))
+                i += run
+                continue
+
+            if ch == "[" or (ch == "!" and i + 1 < n and text[i + 1] == "["):
+                flush()
+                image = ch == "!"
+                i += 2 if image else 1
+                brackets.append(_Bracket(image, len(nodes), i))
+                nodes.append(brackets[-1])
+                continue
+            if ch == "]":
+                flush()
+                consumed = self._close_bracket(nodes, brackets, text, i)
+                if consumed is None:
+                    nodes.append("]")
+                    i += 1
+                else:
+                    i = consumed
+                continue
+
+            if ch == "\n":
+                pending = "".join(buf)
+                hard = len(pending) - len(pending.rstrip(" ")) >= 2
+                buf[:] = [pending.rstrip(" ")]
+                flush()
+                nodes.append("<br />\n" if hard else "\n")
+                i += 1
+                while i < n and text[i] == " ":
+                    i += 1
+                continue
+
+            buf.append(ch)
+            i += 1
+        flush()
+        return nodes
+
+    def _close_bracket(self, nodes: List[object], brackets: List[_Bracket], text: str, pos: int) -> Optional[int]:
+        """Close the innermost open bracket at ``text[pos] == "]"``; return the end of the link or ``None``."""
+        if not brackets:
+            return None
+        opener = brackets.pop()
+        literal = "![" if opener.image else "["
+        if not opener.active:
+            nodes[opener.index] = literal
+            return None
+
+        link = self._link_target(text, pos + 1, text[opener.start:pos])
+        if link is None:
+            nodes[opener.index] = literal
+            return None
+        dest, title, end = link
+
+        inner = nodes[opener.index + 1:]
+        del nodes[opener.index:]
+        self._process_emphasis(inner)
+        content = self._flatten(inner)
+        title_attr = f' title="{_escape_attr(title)}"' if title else ""
+        if opener.image:
+            alt = re.sub(r"<[^>]+>", "", content)
+            nodes.append(f'<img src="{_encode_url(dest)}" alt="{alt}"{title_attr} />')
+        else:
+            nodes.append(f'<a href="{_encode_url(dest)}"{title_attr}>{content}</a>')
+            # Links cannot contain links. Brackets below an inactive one were
+            # open when it was deactivated, so they are inactive already.
+            for bracket in reversed(brackets):
+                if not bracket.image:
+                    if not bracket.active:
+                        break
+                    bracket.active = False
+        return end
+
+    def _link_target(self, text: str, pos: int, label: str) -> Optional[Tuple[str, str, int]]:
+        if pos < len(text) and text[pos] == "(":
+            depth = 0
+            j = pos
+            while j < len(text):
+                if text[j] == "\\":
+                    j += 2
+                    continue
+                if text[j] == "(":
+                    depth += 1
+                    if depth > _MAX_LINK_PARENS:
+                        j = len(text)
+                        break
+                elif text[j] == ")":
+                    depth -= 1
+                    if depth == 0:
+                        break
+                j += 1
+            if j < len(text):
+                inside = text[pos + 1:j].strip()
+                title = ""
+                m = re.match(r"^(.*?)\s+(\"([^\"]*)\"|'([^']*)'|\(([^)]*)\))$", inside, re.S)
+                if m:
+                    inside = m.group(1).strip()
+                    title = next(g for g in m.groups()[2:] if g is not None)
+                if inside.startswith("<") and inside.endswith(">"):
+                    inside = inside[1:-1]
+                dest = re.sub(r"\\([%s])" % re.escape("".join(_ESCAPABLE)), r"\1", inside)
+                return html.unescape(dest), html.unescape(title), j + 1
+
+        if not self.refs:
+            return None
+        ref_label = label
+        end = pos
+        m = _REF_LABEL_RE.match(text, pos)
+        if m:
+            end = m.end()
+            if m.group(1).strip():
+                ref_label = m.group(1)
+        if len(ref_label) > _MAX_LABEL_LENGTH:
+            return None
+        ref = self.refs.get(_normalize_label(ref_label))
+        if ref is None:
+            return None
+        return ref[0], ref[1], end
+
+    @staticmethod
+    def _odd_match(opener: _Delim, closer: _Delim) -> bool:
+        """CommonMark's rule of 3 for runs that can both open and close."""
+        return (
+            closer.char != "~"
+            and (opener.can_close or closer.can_open)
+            and closer.length % 3 != 0
+            and (opener.length + closer.length) % 3 == 0
+        )
+
+    def _process_emphasis(self, nodes: List[object]) -> None:
+        """Match the emphasis delimiters in ``nodes`` (CommonMark "process emphasis").
+
+        The delimiters form a linked stack; delimiters between a matched pair
+        are unlinked and stay literal text, so ``nodes`` is never modified.
+        ``openers_bottom`` records, per kind of closer, where a failed search
+        for an opener stopped, so no later closer of that kind searches below
+        it again and matching stays linear.
+        """
+        previous: Optional[_Delim] = None
+        first: Optional[_Delim] = None
+        for node in nodes:
+            if isinstance(node, _Delim):
+                node.prev = previous
+                if previous is None:
+                    first = node
+                else:
+                    previous.next = node
+                previous = node
+
+        openers_bottom: Dict[Tuple[str, bool, int], Optional[_Delim]] = {}
+        closer = first
+        while closer is not None:
+            if not closer.can_close:
+                closer = closer.next
+                continue
+            key = (closer.char, closer.can_open, closer.length % 3)
+            bottom = openers_bottom.get(key)
+            opener = closer.prev
+            while opener is not None and opener is not bottom:
+                if opener.char == closer.char and opener.can_open and not self._odd_match(opener, closer):
+                    break
+                opener = opener.prev
+            else:
+                openers_bottom[key] = closer.prev
+                following = closer.next
+                if not closer.can_open:
+                    closer.unlink()
+                closer = following
+                continue
+
+            if closer.char == "~":
+                use, tag = 2, "del"
+            else:
+                use = 2 if opener.count >= 2 and closer.count >= 2 else 1
+                tag = "strong" if use == 2 else "em"
+            opener.count -= use
+            closer.count -= use
+            opener.open_tags.append(f"<{tag}>")
+            closer.close_tags.append(f"</{tag}>")
+            opener.next, closer.prev = closer, opener
+            if opener.count == 0:
+                opener.unlink()
+            if closer.count == 0:
+                following = closer.next
+                closer.unlink()
+                closer = following
+
+    @staticmethod
+    def _flatten(nodes: List[object]) -> str:
+        out: List[str] = []
+        for node in nodes:
+            if isinstance(node, str):
+                out.append(node)
+            elif isinstance(node, _Delim):
+                out.extend(node.close_tags)
+                out.append(_escape(node.char * node.count))
+                out.extend(reversed(node.open_tags))
+            elif isinstance(node, _Bracket):
+                out.append("![" if node.image else "[")
+        return "".join(out)
+
+
+# --------------------------------------------------------------------------
+# Rendering
+# --------------------------------------------------------------------------
+
+
+def heading_identifier(text: str, used: Set[str]) -> str:
+    """Pandoc-style auto identifier, made unique against ``used``."""
+    ident = "".join(ch for ch in text.lower() if ch.isalnum() or ch in "_-." or ch.isspace())
+    ident = re.sub(r"\s+", "-", ident.strip())
+    while ident and not ident[0].isalpha():
+        ident = ident[1:]
+    ident = ident or "section"
+    base = ident
+    suffix = 0
+    while ident in used:
+        suffix += 1
+        ident = f"{base}-{suffix}"
+    used.add(ident)
+    return ident
+
+
+class MarkdownEngine:
+    """Render a markdown document to an HTML body fragment."""
+
+    def render(self, md_text: str) -> str:
+        lines = [_expand_tabs(l) for l in md_text.replace("\r\n", "\n").replace("\r", "\n").split("\n")]
+        if lines[-1] == "":
+            lines.pop()  # the final line ending does not start another line
+        refs: Dict[str, Tuple[str, str]] = {}
+        blocks = _BlockParser(refs).parse(lines)
+        inline = InlineRenderer(refs)
+        used_ids: Set[str] = set()
+        return "\n".join(self._render_block(b, inline, used_ids, tight=False) for b in blocks)
+
+    def _render_block(self, block: _Block, inline: InlineRenderer, used_ids: Set[str], tight: bool) -> str:
+        kind = block.kind
+        if kind == "paragraph":
+            content = inline.render(block.text)
+            return content if tight else f"<p>{content}</p>"
+        if kind == "heading":
+            ident = block.attrs.get("id") or heading_identifier(inline.plain(block.text), used_ids)
+            used_ids.add(ident)
+            cls = f' class="{_escape_attr(block.attrs["class"])}"' if block.attrs.get("class") else ""
+            return f'<h{block.level} id="{_escape_attr(ident)}"{cls}>{inline.render(block.text)}</h{block.level}>'
+        if kind == "code":
+            cls = f' class="language-{_escape_attr(block.info)}"' if block.info else ""
+            return f"<pre><code{cls}>{_escape(block.text)}</code></pre>"
+        if kind == "hr":
+            return "<hr />"
+        if kind == "html":
+            return block.text
+        if kind == "blockquote":
+            inner = "\n".join(self._render_block(b, inline, used_ids, tight=False) for b in block.children)
+            return f"<blockquote>\n{inner}\n</blockquote>"
+        if kind in ("ul", "ol"):
+            items = []
+            for children in block.items:
+                parts = [self._render_block(b, inline, used_ids, tight=block.tight) for b in children]
+                items.append(f"<li>{chr(10).join(parts)}</li>")
+            start = f' start="{block.start}"' if kind == "ol" and block.start != 1 else ""
+            return f"<{kind}{start}>\n" + "\n".join(items) + f"\n</{kind}>"
+        if kind == "table":
+            return self._render_table(block, inline)
+        return ""
+
+    @staticmethod
+    def _render_table(block: _Block, inline: InlineRenderer) -> str:
+        def cells(row: List[str], tag: str) -> str:
+            out = []
+            for align, cell in zip(block.aligns, row):
+                style = f' style="text-align: {align};"' if align else ""
+                out.append(f"<{tag}{style}>{inline.render(cell)}</{tag}>")
+            return "<tr>\n" + "\n".join(out) + "\n</tr>"
+
+        head = cells(block.rows[0], "th")
+        body = "\n".join(cells(row, "td") for row in block.rows[1:])
+        out = f"<table>\n<thead>\n{head}\n</thead>\n"
+        if body:
+            out += f"<tbody>\n{body}\n</tbody>\n"
+        return out + "</table>"
+
+
+def markdown_to_html(md_text: str) -> str:
+    return MarkdownEngine().render(md_text)
@@ -0,0 +1,493 @@
+"""Whitespace and comment minification of the generated HTML, CSS and JS.
+
+:class:`HtmlMinifier` is a streaming tokenizer: text is fed in chunks and
+written out as soon as a token is complete, keeping only an unfinished tag or
+raw-text element buffered. It drops comments (except conditional and ``<!--!``
+ones), collapses whitespace runs, removes whitespace between block-level tags
+and tidies the spacing inside tags. ``<pre>``, ``<textarea>`` and ``<code>``
+content is copied byte for byte; inline ``<style>`` and ``<script>`` go
+through :func:`minify_css` and :func:`minify_js`, and JSON scripts are
+re-serialized compactly.
+
+The CSS and JS minifiers are deliberately conservative (no renaming or
+restructuring): they drop comments and redundant whitespace only, and the
+JS one keeps line breaks so automatic semicolon insertion is unaffected.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional, Pattern, Tuple
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Bump when the output changes, so incremental builds re-minify every page.
+MINIFIER_VERSION = "1"
+
+_PRESERVE_TAGS = frozenset({"pre", "textarea", "code"})
+_RAW_TAGS = frozenset({"script", "style"})
+# Whitespace next to these tags does not render and is dropped.
+_BLOCK_TAGS = frozenset(
+    """html head body title meta link base script style noscript template
+    address article aside blockquote details dialog dd div dl dt fieldset figcaption figure
+    footer form h1 h2 h3 h4 h5 h6 header hgroup hr li main nav ol p pre section summary
+    table caption colgroup col thead tbody tfoot tr td th ul option optgroup canvas svg""".split()
+)
+
+_TAG_RE = re.compile(
+    r"""<(/?)([a-zA-Z][\w:-]*)((?:\s+[^\s"'>/=]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s"'>]+))?|\s*/(?!>))*)\s*(/?)>"""
+)
+_ATTR_RE = re.compile(r"""([^\s"'>/=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s"'>]+))?""")
+_EQ_RE = re.compile(r"\s*=\s*")
+_TYPE_RE = re.compile(r"""\stype\s*=\s*["']?([^"'\s>]+)""", re.IGNORECASE)
+_WS_RE = re.compile(r"\s+")
+_JS_TYPES = frozenset({"", "text/javascript", "application/javascript", "module"})
+
+
+@lru_cache(maxsize=None)
+def _element_res(name: str) -> Tuple[Pattern[str], Pattern[str]]:
+    return re.compile(rf"<{name}\b", re.IGNORECASE), re.compile(rf"</{name}\s*>", re.IGNORECASE)
+
+
+def _collapse(ws: str) -> str:
+    # One character per run; a newline is kept so outputs stay diffable.
+    return "\n" if "\n" in ws else " "
+
+
+class HtmlMinifier:
+    """Incremental HTML minifier: ``feed`` chunks, then ``close``."""
+
+    def __init__(self) -> None:
+        self._buf = ""
+        self._out: List[str] = []
+        self._pending_ws = ""
+        self._after_block = True
+
+    def feed(self, chunk: str) -> str:
+        self._buf += chunk
+        self._run(final=False)
+        return self._flush()
+
+    def close(self) -> str:
+        self._run(final=True)
+        self._buf = ""
+        return self._flush()
+
+    def _flush(self) -> str:
+        out = "".join(self._out)
+        self._out.clear()
+        return out
+
+    def _emit_tag(self, text: str, block: bool) -> None:
+        if self._pending_ws and not (block or self._after_block):
+            self._out.append(_collapse(self._pending_ws))
+        self._pending_ws = ""
+        self._out.append(text)
+        self._after_block = block
+
+    def _emit_text(self, text: str) -> None:
+        stripped = text.strip()
+        if not stripped:
+            self._pending_ws += text
+            return
+        lead = text[: len(text) - len(text.lstrip())]
+        trail = text[len(text.rstrip()):]
+        ws = self._pending_ws + lead
+        if ws and not self._after_block:
+            self._out.append(_collapse(ws))
+        self._out.append(_WS_RE.sub(lambda m: _collapse(m.group()), stripped))
+        self._pending_ws = trail
+        self._after_block = False
+
+    def _run(self, final: bool) -> None:
+        buf = self._buf
+        pos = 0
+        n = len(buf)
+        while pos < n:
+            lt = buf.find("<", pos)
+            if lt < 0:
+                if not final:
+                    # Keep a trailing text run: its whitespace may continue.
+                    break
+                self._emit_text(buf[pos:])
+                pos = n
+                break
+            if lt > pos:
+                self._emit_text(buf[pos:lt])
+                pos = lt
+            consumed = self._tag_at(buf, pos, final)
+            if consumed is None:
+                break
+            pos = consumed
+        self._buf = buf[pos:]
+
+    def _tag_at(self, buf: str, pos: int, final: bool) -> Optional[int]:
+        """Consume the markup at ``buf[pos] == "<"``; ``None`` when more input is needed."""
+        if buf[pos + 1:pos + 2] in ("!", "?"):
+            if buf.startswith("<!--", pos):
+                end = buf.find("-->", pos + 4)
+                if end < 0:
+                    return self._incomplete(buf, pos, final)
+                comment = buf[pos:end + 3]
+                if comment.startswith(("<!--[if", "<!--!", "<!--<![endif]")):
+                    self._emit_tag(comment, self._after_block)
+                return end + 3
+            end = buf.find(">", pos)
+            if end < 0:
+                return self._incomplete(buf, pos, final)
+            self._emit_tag(buf[pos:end + 1], True)
+            return end + 1
+        m = _TAG_RE.match(buf, pos)
+        if m is None:
+            if not final and ">" not in buf[pos:]:
+                return None
+            # A lone "<" in text.
+            self._emit_text("<")
+            return pos + 1
+        closing, name, attrs, self_closing = m.groups()
+        name_lower = name.lower()
+        tag = self._format_tag(closing, name, attrs, self_closing)
+        block = name_lower in _BLOCK_TAGS
+        if closing or self_closing:
+            self._emit_tag(tag, block)
+            return m.end()
+        if name_lower in _RAW_TAGS or name_lower in _PRESERVE_TAGS:
+            close = self._find_close(buf, m.end(), name_lower)
+            if close is None:
+                return self._incomplete(buf, pos, final)
+            start, end = close
+            content = buf[m.end():start]
+            if name_lower == "style":
+                content = minify_css(content)
+            elif name_lower == "script":
+                content = _minify_script(content, attrs)
+            self._emit_tag(tag + content + buf[start:end], block)
+            return end
+        self._emit_tag(tag, block)
+        return m.end()
+
+    def _incomplete(self, buf: str, pos: int, final: bool) -> Optional[int]:
+        if not final:
+            return None
+        # Unterminated at end of input: pass through unchanged.
+        self._emit_tag(buf[pos:], False)
+        return len(buf)
+
+    @staticmethod
+    def _find_close(buf: str, start: int, name: str) -> Optional[Tuple[int, int]]:
+        """Span of the matching ``</name>``, counting nested ones for preserved tags."""
+        open_re, close_re = _element_res(name)
+        depth = 1
+        pos = start
+        while True:
+            close = close_re.search(buf, pos)
+            if close is None:
+                return None
+            if name in _PRESERVE_TAGS:
+                depth += len(open_re.findall(buf, pos, close.start()))
+            depth -= 1
+            if depth == 0:
+                return close.start(), close.end()
+            pos = close.end()
+
+    @staticmethod
+    def _format_tag(closing: str, name: str, attrs: str, self_closing: str) -> str:
+        if not attrs:
+            return f"<{closing}{name}{'/' if self_closing else ''}>"
+        parts = [_EQ_RE.sub("=", m.group(0), count=1) for m in _ATTR_RE.finditer(attrs)]
+        inner = " ".join([name, *parts])
+        if self_closing:
+            # An unquoted value would swallow the slash: <img src=a.png/> is src="a.png/".
+            unquoted = parts and "=" in parts[-1] and parts[-1][-1] not in "\"'"
+            inner += " /" if unquoted else "/"
+        return f"<{closing}{inner}>"
+
+
+def minify_html(text: str) -> str:
+    minifier = HtmlMinifier()
+    return minifier.feed(text) + minifier.close()
+
+
+def _minify_script(content: str, attrs: str) -> str:
+    m = _TYPE_RE.search(attrs)
+    kind = m.group(1).lower() if m else ""
+    if kind in _JS_TYPES:
+        return minify_js(content)
+    if kind.endswith("json"):
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return content
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+    return content
+
+
+# ---------------------------------------------------------------- CSS
+
+_CSS_TOKEN_RE = re.compile(
+    r"""(?P<comment>/\*[\s\S]*?(?:\*/|$))"""
+    r"""|(?P<string>"(?:[^"\\\n]|\\[\s\S])*"|'(?:[^'\\\n]|\\[\s\S])*')"""
+    r"""|(?P<url>url\(\s*[^"')\s]*\s*\))"""
+    r"""|(?P<ws>\s+)"""
+    r"""|(?P<other>[^\s"'/u]+|[/u])""",
+    re.IGNORECASE,
+)
+# No whitespace is needed on either side of these (":" only after it: "a :hover" differs from "a:hover").
+_CSS_TIGHT = frozenset("{};,>")
+
+
+def minify_css(text: str) -> str:
+    """Drop comments (except ``/*! ... */``) and redundant whitespace."""
+    out: List[str] = []
+    pending_space = False
+    for m in _CSS_TOKEN_RE.finditer(text):
+        kind = m.lastgroup
+        token = m.group()
+        if kind == "comment":
+            if token.startswith("/*!"):
+                out.append(token)
+            else:
+                pending_space = True
+            continue
+        if kind == "ws":
+            pending_space = True
+            continue
+        if pending_space and out:
+            prev = out[-1][-1]
+            if prev not in _CSS_TIGHT and prev != ":" and token[0] not in _CSS_TIGHT:
+                out.append(" ")
+        pending_space = False
+        if kind == "other":
+            token = token.replace(";}", "}")
+            if token.startswith("}") and out and out[-1].endswith(";") and out[-1][-2:-1] not in "\"'":
+                out[-1] = out[-1][:-1]
+        out.append(token)
+    return "".join(out).strip()
+
+
+# ---------------------------------------------------------------- JS
+
+_JS_KEYWORDS_BEFORE_REGEX = frozenset(
+    "return typeof instanceof in of new delete void throw case do else yield await".split()
+)
+_JS_IDENT_RE = re.compile(r"[\w$\u0080-\uffff]+")
+# Whitespace next to these never separates tokens ("+" and "-" are excluded:
+# "a + +b" must not become "a++b"; "!" and "<" so "<!--" is never formed).
+_JS_TIGHT = frozenset("{}()[];,:=?&|*%^~>")
+
+
+def _skip_string(text: str, i: int) -> int:
+    quote = text[i]
+    i += 1
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == quote or c == "\n":
+            return i + 1
+        i += 1
+    return n
+
+
+def _skip_regex(text: str, i: int) -> int:
+    i += 1
+    n = len(text)
+    in_class = False
+    while i < n:
+        c = text[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == "\n":
+            return i
+        if in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+        elif c == "/":
+            i += 1
+            while i < n and (text[i].isalnum() or text[i] == "_"):
+                i += 1
+            return i
+        i += 1
+    return n
+
+
+def minify_js(text: str) -> str:
+    """Drop comments (except ``/*! ... */``), indentation and redundant spaces; keep line breaks."""
+    out: List[str] = []
+    # Braces opened inside template literal substitutions, to know where "${...}" ends.
+    template_depth: List[int] = []
+    depth = 0
+    pending = ""  # "", " " or "\n"
+    last = ""  # last significant token, for the regex-or-division decision
+    i = 0
+    n = len(text)
+
+    def emit(token: str) -> None:
+        nonlocal pending
+        if pending and out:
+            prev = out[-1][-1]
+            if pending == "\n":
+                out.append("\n")
+            elif prev not in _JS_TIGHT and token[0] not in _JS_TIGHT:
+                out.append(" ")
+        pending = ""
+        out.append(token)
+
+    def scan_template(start: int) -> int:
+        """Emit a template literal chunk from its opening "`" or "}" at ``start`` up to "`" or "${"."""
+        i = start + 1
+        while i < n:
+            c = text[i]
+            if c == "\\":
+                i += 2
+                continue
+            if c == "`":
+                out.append(text[start:i + 1])
+                return i + 1
+            if c == "$" and i + 1 < n and text[i + 1] == "{":
+                out.append(text[start:i + 2])
+                template_depth.append(depth)
+                return i + 2
+            i += 1
+        out.append(text[start:])
+        return n
+
+    while i < n:
+        c = text[i]
+        if c in " \t\r\n\f\v":
+            j = i
+            while j < n and text[j] in " \t\r\n\f\v":
+                j += 1
+            if "\n" in text[i:j]:
+                pending = "\n"
+            elif not pending:
+                pending = " "
+            i = j
+            continue
+        if c == "/" and i + 1 < n and text[i + 1] == "/":
+            j = text.find("\n", i)
+            i = n if j < 0 else j
+            continue
+        if c == "/" and i + 1 < n and text[i + 1] == "*":
+            j = text.find("*/", i + 2)
+            j = n if j < 0 else j + 2
+            comment = text[i:j]
+            if comment.startswith("/*!"):
+                emit(comment)
+                last = ")"
+            elif "\n" in comment:
+                pending = "\n"
+            elif not pending:
+                pending = " "
+            i = j
+            continue
+        if c in "'\"":
+            j = _skip_string(text, i)
+            emit(text[i:j])
+            last = "a"
+            i = j
+            continue
+        if c == "`":
+            emit("`")
+            out.pop()  # only the spacing before it was wanted
+            i = scan_template(i)
+            last = "a"
+            continue
+        if c == "/" and (not last or last in "(,=:[!&|?{};+-*%<>~^" or last in _JS_KEYWORDS_BEFORE_REGEX):
+            j = _skip_regex(text, i)
+            emit(text[i:j])
+            last = "a"
+            i = j
+            continue
+        if c == "}" and template_depth and template_depth[-1] == depth:
+            template_depth.pop()
+            pending = ""
+            i = scan_template(i)
+            last = "a"
+            continue
+        m = _JS_IDENT_RE.match(text, i)
+        if m:
+            token = m.group()
+            emit(token)
+            last = token
+            i = m.end()
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+        emit(c)
+        last = c
+        i += 1
+    return "".join(out).strip()
+
+
+# ---------------------------------------------------------------- report
+
+
+@dataclass
+class MinifyReport:
+    """Bytes before and after minification per file, collected across worker threads."""
+
+    # name -> (bytes before, bytes after); a page written twice in a build counts once.
+    files: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, name: str, before: str, after: str) -> None:
+        sizes = (len(before.encode("utf-8")), len(after.encode("utf-8")))
+        with self._lock:
+            self.files[name] = sizes
+
+    def log_summary(self, top: Optional[int] = 5) -> None:
+        """Log the totals and the ``top`` files that shrank most (every file when ``None``)."""
+        if not self.files:
+            return
+        before = sum(b for b, _ in self.files.values())
+        after = sum(a for _, a in self.files.values())
+        logger.info(
+            "✅ 代码压缩: %s 个文件，%.1f KB → %.1f KB（节省 %.1f KB，%.0f%%）",
+            len(self.files), before / 1024, after / 1024, (before - after) / 1024, 100 * (1 - after / before) if before else 0,
+        )
+        for name, (b, a) in sorted(self.files.items(), key=lambda item: item[1][1] - item[1][0])[:top]:
+            logger.info("    %s: %.1f KB → %.1f KB（-%.1f KB）", name, b / 1024, a / 1024, (b - a) / 1024)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.files.clear()
+
+
+report = MinifyReport()
+
+
+def minify_page(name: str, html_text: str) -> str:
+    """Minify a page when ``build.minify.enabled`` is set, recording the savings."""
+    if not config.MINIFY_ENABLED:
+        return html_text
+    minified = minify_html(html_text)
+    report.record(name, html_text, minified)
+    return minified
+
+
+def minify_asset(name: str, text: str) -> str:
+    """Minify a standalone ``.css``/``.js`` file when minification is enabled."""
+    if not config.MINIFY_ENABLED:
+        return text
+    if name.endswith(".css"):
+        minified = minify_css(text)
+    elif name.endswith(".js"):
+        minified = minify_js(text)
+    else:
+        return text
+    report.record(name, text, minified)
+    return minified
+
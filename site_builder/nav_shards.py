@@ -0,0 +1,115 @@
+"""Sharded navigation data under ``dist/nav/``.
+
+``index.json`` is a small manifest: the top-level menu (each entry pointing at
+its shard), the most frequent keywords and the most recently updated posts.
+Every top-level category gets a shard ``<category_id>.<hash>.json`` holding
+its directory subtree and all posts below it. Shard names carry a content
+hash so they can be cached forever; pages name their category in a
+``nav-category`` meta tag and fetch only that shard. The shards of the
+previous ``index.json`` are kept for one more build, so clients still
+holding it do not get 404s.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from . import config
+from .output import remove_stale, write_if_changed
+from .utils import content_hash, stable_id
+
+logger = logging.getLogger(__name__)
+
+NAV_FORMAT_VERSION = 1
+# Category of posts placed directly in the notes directory.
+ROOT_CATEGORY = "root"
+INDEX_KEYWORDS = 50
+FEATURED_POSTS = 50
+
+
+def nav_category(directory: Path) -> str:
+    """Category id of a notes directory: the id of its top-level directory."""
+    parts = directory.relative_to(config.NOTES_DIR).parts
+    if not parts:
+        return ROOT_CATEGORY
+    return stable_id(str((config.NOTES_DIR / parts[0]).relative_to(config.ROOT_DIR)))
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def _shard_name(category: str, text: str) -> str:
+    return f"{category}.{content_hash(text)[:12]}.json"
+
+
+def build_nav_files(
+    nav_menu: List[Dict],
+    blog_posts: List[Dict],
+    directory_structure: List[Dict],
+    post_mtimes: Dict[str, float],
+) -> Dict[str, str]:
+    """File name (relative to ``config.NAV_DIR``) -> minified JSON text."""
+    nav_url = config.NAV_DIR.relative_to(config.ROOT_DIR).as_posix()
+    posts_by_category: Dict[str, List[Dict]] = {}
+    for post in blog_posts:
+        category = nav_category((config.ROOT_DIR / post["original_path"]).parent)
+        posts_by_category.setdefault(category, []).append(post)
+
+    files: Dict[str, str] = {}
+    shard_urls: Dict[str, str] = {}
+    for directory in directory_structure:
+        text = _dumps({"version": NAV_FORMAT_VERSION, "directory": directory, "posts": posts_by_category.get(directory["id"], [])})
+        name = _shard_name(directory["id"], text)
+        files[name] = text
+        shard_urls[directory["id"]] = f"{nav_url}/{name}"
+    root_shard: Optional[str] = None
+    if ROOT_CATEGORY in posts_by_category:
+        text = _dumps({"version": NAV_FORMAT_VERSION, "directory": None, "posts": posts_by_category[ROOT_CATEGORY]})
+        name = _shard_name(ROOT_CATEGORY, text)
+        files[name] = text
+        root_shard = f"{nav_url}/{name}"
+
+    keyword_counts: Counter = Counter(k for post in blog_posts for k in post.get("keywords") or [])
+    latest = sorted(blog_posts, key=lambda post: post_mtimes.get(post["url"], 0), reverse=True)
+    files["index.json"] = _dumps(
+        {
+            "version": NAV_FORMAT_VERSION,
+            "nav_menu": [{**item, "shard": shard_urls.get(item["id"])} for item in nav_menu],
+            "root_shard": root_shard,
+            "keywords": [k for k, _ in keyword_counts.most_common(INDEX_KEYWORDS)],
+            "featured": [{"title": p["title"], "url": p["url"]} for p in latest[:FEATURED_POSTS]],
+            "posts": len(blog_posts),
+        }
+    )
+    return files
+
+
+def _index_shards(index_file: Path) -> Set[str]:
+    """File names of the shards an ``index.json`` points at."""
+    try:
+        index = json.loads(index_file.read_text(encoding="utf-8"))
+        urls = [item.get("shard") for item in index["nav_menu"]] + [index.get("root_shard")]
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return set()
+    return {url.rsplit("/", 1)[-1] for url in urls if isinstance(url, str)}
+
+
+def write_nav_files(files: Dict[str, str], out_dir: Optional[Path] = None) -> int:
+    """Write changed files and remove shards older than the previous build; return how many were written."""
+    out_dir = out_dir or config.NAV_DIR
+    out_dir.mkdir(parents=True, exist_ok=True)
+    previous = _index_shards(out_dir / "index.json")
+    written = 0
+    for name, text in files.items():
+        path = out_dir / name
+        # Shard names are content hashed, so an existing shard is already up to date.
+        if name != "index.json" and path.exists():
+            continue
+        written += write_if_changed(path, text)
+    remove_stale(out_dir.glob("*.json"), {out_dir / name for name in (*files, *previous)})
+    logger.info("✅ 导航分片已生成: %s 个分片（写入 %s 个文件）", len(files) - 1, written)
+    return written
@@ -0,0 +1,89 @@
+"""Atomic, write-if-changed output files.
+
+Every generated file goes through :func:`write_if_changed` (or
+:func:`atomic_writer` when it is streamed): content is written to a temporary
+sibling that replaces the target with ``os.replace``, and not at all when the
+target already holds the same content. Volatile parts such as build
+timestamps can be excluded from the comparison, so rebuilding an unchanged
+site leaves every output untouched, which keeps deploy diffs and CDN
+invalidations down to the files that really changed.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Pattern, Set, TextIO, Union
+
+logger = logging.getLogger(__name__)
+
+
+def _tmp_path(path: Path) -> Path:
+    # Unique per thread: pages are written from worker threads.
+    return path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+
+
+def _unchanged(path: Path, data: bytes, volatile: Optional[Pattern[str]]) -> bool:
+    try:
+        if volatile is None:
+            if path.stat().st_size != len(data):
+                return False
+            return path.read_bytes() == data
+        old = path.read_text(encoding="utf-8")
+    except (OSError, UnicodeDecodeError):
+        return False
+    return volatile.sub("", old) == volatile.sub("", data.decode("utf-8"))
+
+
+def write_if_changed(path: Path, text: Union[str, bytes], volatile: Optional[Pattern[str]] = None) -> bool:
+    """Atomically write ``text`` to ``path`` unless the file already has this content.
+
+    ``text`` may also be bytes (``volatile`` then does not apply). Matches of
+    ``volatile`` are ignored when comparing. Returns whether the file was
+    written.
+    """
+    data = text.encode("utf-8") if isinstance(text, str) else text
+    if _unchanged(path, data, volatile):
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(path)
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return True
+
+
+@contextmanager
+def atomic_writer(path: Path, volatile: Optional[Pattern[str]] = None) -> Iterator[TextIO]:
+    """Stream text into a temporary file that replaces ``path`` if the content changed."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_path(path)
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            yield f
+        if not _unchanged(path, tmp.read_bytes(), volatile):
+            os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def remove_stale(outputs: Iterable[Path], live: Set[Path]) -> int:
+    """Delete the ``outputs`` not in ``live`` and their directory if left empty; return the count."""
+    removed = 0
+    for path in outputs:
+        if path in live:
+            continue
+        path.unlink()
+        removed += 1
+        logger.info("🗑️  删除过期文件: %s", path)
+        try:
+            path.parent.rmdir()
+        except OSError:
+            pass
+    return removed
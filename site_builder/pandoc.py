@@ -0,0 +1,155 @@
+"""Pandoc conversion engine that talks to pandoc over stdin/stdout.
+
+Markdown sources are converted in batches: one pandoc process renders many
+documents through ``pandoc_batch.lua`` instead of spawning ``pandoc -s`` per
+file with temporary files in the notes tree.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import secrets
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .utils import pandoc_version
+
+logger = logging.getLogger(__name__)
+
+BATCH_FILTER = Path(__file__).with_name("pandoc_batch.lua")
+
+# pandoc.write() is only available to Lua filters since pandoc 2.17; older
+# versions convert one process per document.
+BATCH_MIN_VERSION = (2, 17)
+_BATCH_SUPPORTED: Optional[bool] = None
+
+_BACKTICKS_RE = re.compile(r"`+")
+
+
+def _wrap_fragment(html: str) -> str:
+    # Match the "<body>\n...\n</body>" framing of the standalone output used before.
+    return f"\n{html.strip(chr(10))}\n"
+
+
+def convert_one(md_text: str, timeout: float = 30) -> Optional[str]:
+    """Convert a single markdown document to an HTML body fragment."""
+    result = subprocess.run(
+        ["pandoc", "-f", "markdown", "-t", "html"],
+        input=md_text,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        timeout=timeout,
+    )
+    if result.returncode != 0:
+        logger.error("Pandoc转换失败: %s", result.stderr.strip())
+        return None
+    return _wrap_fragment(result.stdout)
+
+
+def _batch_input(sources: Sequence[str], token: str) -> str:
+    parts: List[str] = []
+    for index, text in enumerate(sources):
+        fence = "`" * max(3, max((len(run) for run in _BACKTICKS_RE.findall(text)), default=0) + 1)
+        parts.append(f"{fence}{{#{token}-{index} .sb-doc}}\n{text}\n{fence}\n")
+    return "\n".join(parts)
+
+
+def _convert_batch(sources: Sequence[str], timeout: float) -> Optional[List[Optional[str]]]:
+    """Run one pandoc process over ``sources``; ``None`` means the batch itself failed."""
+    token = f"sb{secrets.token_hex(6)}"
+    try:
+        result = subprocess.run(
+            ["pandoc", "-f", "markdown", "-t", "html", "--lua-filter", str(BATCH_FILTER)],
+            input=_batch_input(sources, token),
+            capture_output=True,
+            text=True,
+            encoding="utf-8",
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        logger.warning("Pandoc批量转换超时（%s 篇）", len(sources))
+        return None
+    if result.returncode != 0:
+        logger.warning("Pandoc批量转换失败（%s 篇）: %s", len(sources), result.stderr.strip())
+        return None
+
+    # The filter reports a document it could not convert as "<token>-<index>: <error>";
+    # anything else on stderr is an ordinary pandoc warning.
+    errors: Dict[int, List[str]] = {}
+    warnings: List[str] = []
+    current: Optional[List[str]] = None
+    for line in result.stderr.splitlines():
+        match = re.match(rf"{token}-(\d+): ", line)
+        if match:
+            current = errors.setdefault(int(match.group(1)), [])
+            line = line[match.end():]
+        (warnings if current is None else current).append(line)
+    if any(line.strip() for line in warnings):
+        logger.warning("Pandoc警告: %s", "\n".join(warnings).strip())
+
+    fragments: List[Optional[str]] = [None] * len(sources)
+    pattern = re.compile(rf"<!--{token}-(\d+):begin-->\n([\s\S]*?)\n<!--{token}-\1:end-->")
+    for match in pattern.finditer(result.stdout):
+        fragments[int(match.group(1))] = _wrap_fragment(match.group(2))
+    for index, fragment in enumerate(fragments):
+        if fragment is None:
+            logger.warning(
+                "Pandoc批量转换中第 %s 篇失败: %s", index + 1, "\n".join(errors.get(index, [])).strip() or "无输出"
+            )
+    return fragments
+
+
+def batch_supported() -> bool:
+    """Whether the installed pandoc is recent enough for ``pandoc_batch.lua``."""
+    global _BATCH_SUPPORTED
+    if _BATCH_SUPPORTED is None:
+        version = pandoc_version()
+        _BATCH_SUPPORTED = tuple(int(part) for part in re.findall(r"\d+", version)[:2]) >= BATCH_MIN_VERSION
+        if not _BATCH_SUPPORTED:
+            logger.warning("当前 pandoc（%s）不支持批量转换，回退为逐个转换", version or "版本未知")
+    return _BATCH_SUPPORTED
+
+
+def _convert_each(sources: Sequence[str], jobs: int, timeout: float) -> List[Optional[str]]:
+    def run_one(text: str) -> Optional[str]:
+        try:
+            return convert_one(text, timeout)
+        except subprocess.TimeoutExpired:
+            logger.error("转换超时")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        return list(pool.map(run_one, sources))
+
+
+def convert_many(sources: Sequence[str], jobs: int = 1, timeout: float = 30) -> List[Optional[str]]:
+    """Convert markdown documents to HTML body fragments, in input order.
+
+    Sources are split into at most ``jobs`` batches, each handled by a single
+    pandoc process. A batch that fails as a whole (a timeout, a document that
+    crashes pandoc) is converted again one document at a time. A ``None``
+    entry marks a document that failed to convert.
+    """
+    if not sources:
+        return []
+    if not batch_supported():
+        return _convert_each(sources, jobs, timeout)
+
+    size = -(-len(sources) // max(1, jobs))
+    chunks = [sources[i:i + size] for i in range(0, len(sources), size)]
+
+    def run(chunk: Sequence[str]) -> Optional[List[Optional[str]]]:
+        # Scale the timeout with the batch so large batches are not cut short.
+        return _convert_batch(chunk, timeout + len(chunk))
+
+    with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+        results = list(pool.map(run, chunks))
+    failed = [chunk for chunk, result in zip(chunks, results) if result is None]
+    if failed:
+        logger.warning("%s 个批次转换失败，改为逐个转换这些文档", len(failed))
+        retried = iter(_convert_each([text for chunk in failed for text in chunk], jobs, timeout))
+        results = [result if result is not None else [next(retried) for _ in chunk] for chunk, result in zip(chunks, results)]
+    return [fragment for chunk in results for fragment in chunk]
@@ -0,0 +1,22 @@
+-- Batch conversion filter used by site_builder.pandoc.
+--
+-- The input document is a list of fenced code blocks with class "sb-doc",
+-- each holding the markdown source of one page. Every block is read and
+-- written as an independent document (so heading ids and footnotes never
+-- leak between pages) and replaced by its HTML framed by sentinel comments.
+
+function CodeBlock(block)
+  if not block.classes:includes('sb-doc') then
+    return nil
+  end
+  local id = block.identifier
+  local ok, html = pcall(function()
+    local doc = pandoc.read(block.text, 'markdown', PANDOC_READER_OPTIONS)
+    return pandoc.write(doc, 'html', PANDOC_WRITER_OPTIONS)
+  end)
+  if not ok then
+    io.stderr:write(id .. ': ' .. tostring(html) .. '\n')
+    return pandoc.RawBlock('html', '<!--' .. id .. ':failed-->')
+  end
+  return pandoc.RawBlock('html', '<!--' .. id .. ':begin-->\n' .. html .. '\n<!--' .. id .. ':end-->')
+end
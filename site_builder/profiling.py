@@ -0,0 +1,149 @@
+"""Optional build profiler: phase/file timing spans, Chrome trace output and cProfile dumps.
+
+Instrumented code calls :func:`span`; while no profiler is active it returns a
+shared no-op context manager, so the hooks cost next to nothing in normal builds.
+"""
+from __future__ import annotations
+
+import cProfile
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, ContextManager, Dict, Iterator, List, Optional
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+_NOOP = nullcontext()
+_SAFE_NAME_RE = re.compile(r"[^\w.-]+")
+
+
+@dataclass
+class Span:
+    name: str
+    cat: str
+    start: float
+    wall: float
+    cpu: float
+    tid: int
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+class Profiler:
+    """Collects timing spans from all threads of a build.
+
+    ``cat="phase"`` spans are the pipeline stages (nested inside one
+    ``cat="total"`` span for the whole build); with ``cprofile``
+    enabled each of them also runs under :mod:`cProfile` and is dumped to
+    ``<out_dir>/<phase>.prof``. cProfile only sees the calling thread, so run
+    with ``--jobs 1`` to profile the page rendering phases in full.
+    """
+
+    def __init__(self, out_dir: Optional[Path] = None, cprofile: bool = False):
+        self.out_dir = out_dir or config.PROFILE_DIR
+        self.cprofile = cprofile
+        self.spans: List[Span] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, cat: str = "phase", **args: Any) -> Iterator[None]:
+        profile = cProfile.Profile() if self.cprofile and cat == "phase" else None
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+            cpu = time.thread_time() - cpu_start
+            wall = time.perf_counter() - start
+            record = Span(name, cat, start - self._origin, wall, cpu, threading.get_ident(), args)
+            with self._lock:
+                self.spans.append(record)
+            if profile is not None:
+                self.out_dir.mkdir(parents=True, exist_ok=True)
+                profile.dump_stats(str(self.out_dir / f"{_SAFE_NAME_RE.sub('_', name)}.prof"))
+
+    def trace_events(self) -> Dict[str, Any]:
+        """Spans in Chrome trace-event format (load in chrome://tracing or Perfetto)."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": s.name,
+                "cat": s.cat,
+                "ph": "X",
+                "ts": round(s.start * 1e6, 1),
+                "dur": round(s.wall * 1e6, 1),
+                "pid": pid,
+                "tid": s.tid,
+                "args": {**s.args, "cpu_ms": round(s.cpu * 1e3, 3)},
+            }
+            for s in sorted(self.spans, key=lambda s: s.start)
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_trace(self) -> Path:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / "trace.json"
+        path.write_text(json.dumps(self.trace_events(), ensure_ascii=False), encoding="utf-8")
+        return path
+
+    def report(self, top: int = 15) -> str:
+        """Per-phase totals followed by the ``top`` slowest files."""
+        lines = ["", "=== 构建耗时分析 ===", f"{'阶段':<24}{'wall(ms)':>12}{'cpu(ms)':>12}"]
+        for s in sorted((s for s in self.spans if s.cat == "phase"), key=lambda s: s.start):
+            lines.append(f"{s.name:<24}{s.wall * 1e3:>12.1f}{s.cpu * 1e3:>12.1f}")
+        for s in self.spans:
+            if s.cat == "total":
+                lines.append(f"{'总计':<24}{s.wall * 1e3:>12.1f}{s.cpu * 1e3:>12.1f}")
+
+        steps: Dict[str, float] = {}
+        for s in self.spans:
+            if s.cat == "step":
+                steps[s.name] = steps.get(s.name, 0.0) + s.wall
+        if steps:
+            lines.append("")
+            lines.append(f"{'页面步骤（累计）':<24}{'wall(ms)':>12}")
+            for name, wall in sorted(steps.items(), key=lambda kv: -kv[1]):
+                lines.append(f"{name:<24}{wall * 1e3:>12.1f}")
+
+        files = sorted((s for s in self.spans if s.cat == "file"), key=lambda s: -s.wall)[:top]
+        if files:
+            lines.append("")
+            lines.append(f"最慢的 {len(files)} 个文件:")
+            lines.append(f"{'wall(ms)':>10}{'cpu(ms)':>10}  {'类型':<10}文件")
+            for s in files:
+                lines.append(f"{s.wall * 1e3:>10.1f}{s.cpu * 1e3:>10.1f}  {s.name:<10}{s.args.get('file', '')}")
+        return "\n".join(lines)
+
+
+_active: Optional[Profiler] = None
+
+
+def start(out_dir: Optional[Path] = None, cprofile: bool = False) -> Profiler:
+    global _active
+    _active = Profiler(out_dir, cprofile)
+    return _active
+
+
+def stop() -> Optional[Profiler]:
+    global _active
+    profiler, _active = _active, None
+    return profiler
+
+
+def span(name: str, cat: str = "phase", **args: Any) -> ContextManager[None]:
+    """Time a block under the active profiler; a no-op when profiling is off."""
+    if _active is None:
+        return _NOOP
+    return _active.span(name, cat, **args)
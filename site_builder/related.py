@@ -0,0 +1,119 @@
+"""Related posts computed at build time.
+
+Each post gets a TF-IDF vector over its body terms, truncated to its strongest
+terms and L2-normalized. Term counts come from the :class:`~.tfidf.TermCountCache`,
+so unchanged posts are not re-tokenized. Candidate pairs are only generated
+inside blocks: posts sharing a keyword, one of their top terms or their
+directory. Blocks larger than ``MAX_BLOCK`` are skipped, which keeps the work
+linear in the number of posts instead of comparing every pair.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .sources import SourceDocument
+from .tfidf import TermCountCache, TermMatrix
+
+# Terms kept per post vector, and how many of them are used for blocking.
+VECTOR_TERMS = 32
+SIGNATURE_TERMS = 6
+MAX_BLOCK = 64
+# Posts sharing the most blocks with a post get an exact score.
+CANDIDATES = 24
+
+BODY_WEIGHT = 0.6
+KEYWORD_WEIGHT = 0.25
+ANCESTRY_WEIGHT = 0.15
+
+Vector = Dict[int, float]
+
+
+def _vectors(matrix: TermMatrix) -> List[Vector]:
+    idf = matrix.idf()
+    vectors: List[Vector] = []
+    for i in range(len(matrix)):
+        start, end = matrix.indptr[i], matrix.indptr[i + 1]
+        weights = [((1 + math.log(matrix.data[j])) * idf[matrix.indices[j]], matrix.indices[j]) for j in range(start, end)]
+        top = heapq.nlargest(VECTOR_TERMS, weights)
+        norm = math.sqrt(sum(w * w for w, _ in top)) or 1.0
+        vectors.append({term_id: w / norm for w, term_id in top})
+    return vectors
+
+
+def _cosine(a: Vector, b: Vector) -> float:
+    return sum(a[term_id] * b[term_id] for term_id in a.keys() & b.keys())
+
+
+def _ancestry(a: Tuple[str, ...], b: Tuple[str, ...]) -> float:
+    depth = max(len(a), len(b))
+    if not depth:
+        return 0.0
+    shared = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        shared += 1
+    return shared / depth
+
+
+def related_posts(
+    docs: Sequence[SourceDocument],
+    dirs: Sequence[Tuple[str, ...]],
+    count: int,
+    cache: Optional[TermCountCache] = None,
+) -> List[List[int]]:
+    """Indices of the ``count`` most related posts of each document.
+
+    ``dirs`` holds each post's directory parts below the notes directory.
+    Scores blend body cosine similarity, keyword overlap and shared directory
+    ancestry; ties go to the earlier post.
+    """
+    n = len(docs)
+    if n < 2 or count <= 0:
+        return [[] for _ in docs]
+
+    cache = cache or TermCountCache()
+    vectors = _vectors(TermMatrix([cache.counts_for(doc) for doc in docs]))
+    cache.save(doc.content_hash for doc in docs)
+    keyword_sets = [frozenset(k.lower() for k in doc.keywords) for doc in docs]
+
+    blocks: Dict[Tuple[str, object], List[int]] = {}
+    for i, vector in enumerate(vectors):
+        for term_id in list(vector)[:SIGNATURE_TERMS]:
+            blocks.setdefault(("term", term_id), []).append(i)
+        for keyword in sorted(keyword_sets[i]):
+            blocks.setdefault(("keyword", keyword), []).append(i)
+        blocks.setdefault(("dir", dirs[i]), []).append(i)
+    member_of: List[List[List[int]]] = [[] for _ in range(n)]
+    for members in blocks.values():
+        if 1 < len(members) <= MAX_BLOCK:
+            for i in members:
+                member_of[i].append(members)
+
+    results: List[List[int]] = []
+    for i in range(n):
+        shared: Counter = Counter()
+        for members in member_of[i]:
+            shared.update(members)
+        del shared[i]
+        candidates = heapq.nsmallest(CANDIDATES, shared.items(), key=lambda item: (-item[1], item[0]))
+
+        scored = []
+        for j, _ in candidates:
+            keyword_overlap = 0.0
+            if keyword_sets[i] and keyword_sets[j]:
+                keyword_overlap = len(keyword_sets[i] & keyword_sets[j]) / math.sqrt(
+                    len(keyword_sets[i]) * len(keyword_sets[j])
+                )
+            score = (
+                BODY_WEIGHT * _cosine(vectors[i], vectors[j])
+                + KEYWORD_WEIGHT * keyword_overlap
+                + ANCESTRY_WEIGHT * _ancestry(dirs[i], dirs[j])
+            )
+            if score > 0:
+                scored.append((score, -j))
+        results.append([-neg_j for _, neg_j in heapq.nlargest(count, scored)])
+    return results
@@ -0,0 +1,197 @@
+"""Content-addressed, size-bounded cache of rendered body fragments.
+
+A fragment is the renderer output before link rewriting and template fill,
+so it only depends on the renderer (name and version, which for pandoc is
+the pandoc version) and the markdown body. Fragments are stored under
+``.build_cache/render/objects/`` by the hash of both; an index keeps their
+sizes and last use so the least recently used ones are evicted once the
+cache outgrows ``build.renderCache.maxMB``. The whole cache can be exported
+to and imported from a single archive, so CI runners and fresh clones start
+warm.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+import tarfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from . import config
+from .output import write_if_changed
+from .renderers import Renderer
+from .utils import content_hash
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+_OBJECT_NAME_RE = re.compile(r"^objects/[0-9a-f]{2}/[0-9a-f]{64}\.html$")
+
+
+class RenderCache:
+    """Fragments keyed by renderer and body hash, evicted least recently used first."""
+
+    def __init__(self, root: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self.root = root or config.RENDER_CACHE_DIR
+        self.max_bytes = config.RENDER_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        # key -> [size in bytes, last use as a Unix time]
+        self.entries: Dict[str, List[float]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._load()
+
+    @property
+    def index_path(self) -> Path:
+        return self.root / "index.json"
+
+    def _object_path(self, key: str) -> Path:
+        return self.root / "objects" / key[:2] / f"{key}.html"
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CACHE_FORMAT_VERSION:
+            self.entries = data.get("entries", {})
+
+    @staticmethod
+    def key(renderer_id: str, body: str) -> str:
+        return content_hash(f"{renderer_id}\0{content_hash(body)}")
+
+    @property
+    def size(self) -> int:
+        return int(sum(size for size, _ in self.entries.values()))
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+        try:
+            fragment = self._object_path(key).read_text(encoding="utf-8")
+        except OSError:
+            with self._lock:
+                self.entries.pop(key, None)
+                self.misses += 1
+                self._dirty = True
+            return None
+        with self._lock:
+            entry[1] = time.time()
+            self.hits += 1
+            self._dirty = True
+        return fragment
+
+    def put(self, key: str, fragment: str) -> None:
+        write_if_changed(self._object_path(key), fragment)
+        with self._lock:
+            self.entries[key] = [len(fragment.encode("utf-8")), time.time()]
+            self._dirty = True
+
+    def evict(self) -> int:
+        """Drop least recently used fragments until the cache fits ``max_bytes``."""
+        total = self.size
+        if total <= self.max_bytes:
+            return 0
+        evicted = 0
+        for key, (size, _) in sorted(self.entries.items(), key=lambda item: item[1][1]):
+            if total <= self.max_bytes:
+                break
+            self._object_path(key).unlink(missing_ok=True)
+            del self.entries[key]
+            total -= size
+            evicted += 1
+        self.evictions += evicted
+        self._dirty = True
+        return evicted
+
+    def save(self) -> None:
+        self.evict()
+        if self._dirty:
+            write_if_changed(
+                self.index_path,
+                json.dumps({"version": CACHE_FORMAT_VERSION, "entries": self.entries}, separators=(",", ":")),
+            )
+            self._dirty = False
+        if self.hits or self.misses or self.evictions:
+            logger.info(
+                "渲染缓存: 命中 %s，未命中 %s，淘汰 %s（%.1f/%.0f MB，%s 个片段）",
+                self.hits, self.misses, self.evictions,
+                self.size / 2**20, self.max_bytes / 2**20, len(self.entries),
+            )
+
+    def export_archive(self, path: Path) -> int:
+        """Write every cached fragment to a ``.tar.gz`` archive; return the number exported."""
+        with tarfile.open(path, "w:gz") as tar:
+            exported = 0
+            for key in sorted(self.entries, key=lambda k: self.entries[k][1]):
+                object_path = self._object_path(key)
+                if object_path.exists():
+                    tar.add(object_path, arcname=object_path.relative_to(self.root).as_posix())
+                    exported += 1
+        logger.info("✅ 渲染缓存已导出: %s（%s 个片段）", path, exported)
+        return exported
+
+    def import_archive(self, path: Path) -> int:
+        """Add the fragments of an exported archive; return the number imported."""
+        imported = 0
+        now = time.time()
+        with tarfile.open(path, "r:*") as tar:
+            for member in tar:
+                if not member.isfile() or not _OBJECT_NAME_RE.match(member.name):
+                    continue
+                key = member.name.rsplit("/", 1)[1][:-5]
+                data = tar.extractfile(member).read()
+                write_if_changed(self._object_path(key), data.decode("utf-8"))
+                # Archive order is oldest first; keep it for eviction.
+                self.entries[key] = [len(data), now + imported * 1e-6]
+                imported += 1
+        self._dirty = True
+        self.save()
+        logger.info("✅ 渲染缓存已导入: %s（%s 个片段）", path, imported)
+        return imported
+
+
+class CachedRenderer(Renderer):
+    """Wraps a renderer so that only documents missing from the cache are converted."""
+
+    def __init__(self, inner: Renderer, cache: RenderCache):
+        self.inner = inner
+        self.cache = cache
+        self.name = inner.name
+
+    @property
+    def version(self) -> str:
+        return self.inner.version
+
+    @property
+    def cache_id(self) -> str:
+        return self.inner.cache_id
+
+    def render(self, md_text: str) -> Optional[str]:
+        key = RenderCache.key(self.cache_id, md_text)
+        fragment = self.cache.get(key)
+        if fragment is None:
+            fragment = self.inner.render(md_text)
+            if fragment is not None:
+                self.cache.put(key, fragment)
+        return fragment
+
+    def render_many(self, sources: Sequence[str], jobs: int = 1) -> List[Optional[str]]:
+        keys = [RenderCache.key(self.cache_id, text) for text in sources]
+        fragments = [self.cache.get(key) for key in keys]
+        missing = [i for i, fragment in enumerate(fragments) if fragment is None]
+        if missing:
+            rendered = self.inner.render_many([sources[i] for i in missing], jobs=jobs)
+            for i, fragment in zip(missing, rendered):
+                if fragment is not None:
+                    self.cache.put(keys[i], fragment)
+                fragments[i] = fragment
+        return fragments
@@ -1,19 +1,30 @@
 """Rendering utilities for markdown posts and directory pages."""
 from __future__ import annotations
 
+import html
 import logging
 import re
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict
-
-from . import config
+from typing import Dict, List, Optional, Sequence, Tuple
+from urllib.parse import quote as urlquote
+
+from . import config, pandoc, profiling
+from .links import resolve_link
+from .markdown_engine import ENGINE_VERSION, MarkdownEngine
+from .nav_shards import nav_category
+from .output import write_if_changed
+from .sources import SourceDocument
+from .minify import minify_page
+from .template import get_template
 from .utils import (
     extract_keywords,
     extract_markdown_content_from_legacy_html,
     generate_metadata_for_template,
     pandoc_available,
-    parse_front_matter,
+    pandoc_version,
 )
 
 logger = logging.getLogger(__name__)
@@ -32,114 +43,261 @@ def convert_code_blocks_for_highlightjs(html_content: str) -> str:
     return re.sub(pattern, replace_code_block, html_content)
 
 
-def rewrite_internal_links(html_fragment: str, current_md: Path, legacy_to_new: Dict[str, str]) -> str:
-    """Rewrite links that point to legacy markdown/html files into ASCII-only URLs."""
-    current_rel_dir = Path(current_md.relative_to(config.ROOT_DIR)).parent
+class Renderer:
+    """Markdown backend producing the HTML body fragment of a page.
 
-    def resolve_candidate(href: str) -> str | None:
-        base = href.split("#", 1)[0].split("?", 1)[0]
-        if not base:
-            return None
-        if base.startswith(("http://", "https://", "mailto:", "tel:")):
-            return None
-        if base.startswith("/"):
-            return base.lstrip("/")
+    Fragments returned by a renderer are final apart from link rewriting and
+    template fill; ``None`` marks a document that could not be converted.
+    """
+
+    name = ""
+
+    @property
+    def version(self) -> str:
+        return ""
+
+    @property
+    def cache_id(self) -> str:
+        return f"{self.name}-{self.version}"
+
+    def render(self, md_text: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def render_many(self, sources: Sequence[str], jobs: int = 1) -> List[Optional[str]]:
+        return [self.render(text) for text in sources]
+
+
+class PandocRenderer(Renderer):
+    name = "pandoc"
+
+    @property
+    def version(self) -> str:
+        return pandoc_version()
+
+    def render(self, md_text: str) -> Optional[str]:
+        fragment = pandoc.convert_one(md_text)
+        return convert_code_blocks_for_highlightjs(fragment) if fragment is not None else None
+
+    def render_many(self, sources: Sequence[str], jobs: int = 1) -> List[Optional[str]]:
+        fragments = pandoc.convert_many(sources, jobs=jobs)
+        return [convert_code_blocks_for_highlightjs(f) if f is not None else None for f in fragments]
+
+
+class MarkdownRenderer(Renderer):
+    """In-process engine; needs no external tools and emits highlight.js classes directly.
+
+    The engine is pure Python and holds the GIL, so :meth:`render_many`
+    spreads documents over worker processes rather than threads.
+    """
+
+    name = "markdown"
+
+    def __init__(self) -> None:
+        self._engine = MarkdownEngine()
+
+    @property
+    def version(self) -> str:
+        return ENGINE_VERSION
+
+    def render(self, md_text: str) -> Optional[str]:
         try:
-            resolved = (current_rel_dir / base).as_posix()
-            resolved = str(Path(resolved))
-            return resolved
-        except Exception:
+            return self._engine.render(md_text)
+        except Exception as exc:  # one malformed note must not abort the build
+            logger.error("Markdown 渲染失败: %s: %s", type(exc).__name__, exc)
             return None
 
-    href_re = re.compile(r'''href=(['"])([^"']+)\1''', re.IGNORECASE)
+    def render_many(self, sources: Sequence[str], jobs: int = 1) -> List[Optional[str]]:
+        if jobs <= 1 or len(sources) <= 1:
+            return super().render_many(sources)
+        workers = min(jobs, len(sources))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_render_markdown, sources, chunksize=max(1, len(sources) // (workers * 4))))
+
+
+def _render_markdown(md_text: str) -> Optional[str]:
+    return MarkdownRenderer().render(md_text)
+
+
+RENDERERS = {
+    "pandoc": PandocRenderer,
+    "markdown": MarkdownRenderer,
+}
+
+
+@lru_cache(maxsize=None)
+def get_renderer(name: Optional[str] = None) -> Optional[Renderer]:
+    """Resolve the renderer selected by ``build.renderer`` in config.json.
+
+    ``auto`` prefers pandoc and falls back to the in-process engine. An
+    explicit ``pandoc`` without pandoc installed returns ``None``, which keeps
+    the legacy HTML / plain-text fallback.
+    """
+    name = name or config.BUILD.get("renderer", "auto")
+    if name == "auto":
+        return PandocRenderer() if pandoc_available() else MarkdownRenderer()
+    if name not in RENDERERS:
+        raise ValueError(f"unknown renderer: {name}")
+    if name == "pandoc" and not pandoc_available():
+        logger.warning("未找到 pandoc，使用旧版 HTML 回退渲染")
+        return None
+    return RENDERERS[name]()
+
+
+# Matches from the ``=`` of an ``href``/``src`` attribute: a pattern starting with
+# a literal lets the regex engine skip ahead with a fast scan, unlike a leading
+# ``(href|src)`` alternation.
+_LINK_ATTR_RE = re.compile(r"""=(?:(?<=[^\w-]href=)|(?<=[^\w-]src=))(['"])([^"']+)\1""", re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
+def _page_dir(page_dir: Path, root_dir: Path) -> str:
+    return page_dir.relative_to(root_dir).as_posix()
+
+
+def rewrite_internal_links(
+    html_fragment: str,
+    current_md: Path,
+    legacy_to_new: Dict[str, str],
+    link_deps: Optional[Dict[str, Optional[str]]] = None,
+) -> str:
+    """Rewrite links that point to legacy markdown/html files into ASCII-only URLs.
+
+    ``href`` values resolving to a key of ``legacy_to_new`` (see
+    :func:`~.links.link_key`) point to the new page, keeping their fragment.
+    Relative ``src`` values (images) become root-absolute, since pages are no
+    longer emitted next to their sources. When ``link_deps`` is given, every
+    key probed is recorded with the value it resolved to (``None`` for misses),
+    so incremental builds can tell whether the rewritten links of this page are
+    still valid.
+    """
+    base_dir = _page_dir(current_md.parent, config.ROOT_DIR)
 
     def repl(match: re.Match[str]) -> str:
-        quote = match.group(1)
-        href = match.group(2)
-        candidate = resolve_candidate(href)
-        if not candidate:
+        quote, url = match.groups()
+        key = resolve_link(base_dir, url)
+        if key is None:
             return match.group(0)
-        candidates = [candidate]
-        if candidate.endswith(".md"):
-            candidates.append(candidate[:-3] + ".html")
-        if candidate.endswith(".html"):
-            candidates.append(candidate[:-5] + ".md")
-        for option in candidates:
-            if option in legacy_to_new:
-                return f"href={quote}/{legacy_to_new[option]}{quote}"
-            prefixed = f"/{option}"
-            if prefixed in legacy_to_new:
-                return f"href={quote}/{legacy_to_new[prefixed]}{quote}"
-        return match.group(0)
-
-    return href_re.sub(repl, html_fragment)
-
-
-def convert_markdown_to_html(md_file_path: Path, out_html_path: Path, legacy_to_new: Dict[str, str]) -> bool:
-    """Convert markdown into final HTML using template + internal link rewriting."""
-    temp_html_path = md_file_path.with_suffix(".temp.html")
-    try:
-        out_html_path.parent.mkdir(parents=True, exist_ok=True)
-
-        md_content = md_file_path.read_text(encoding="utf-8")
-        meta, md_content_wo_fm = parse_front_matter(md_content)
-
-        title = meta.get("title")
-        if not title:
-            title_match = re.search(r"^#\s+(.+)", md_content_wo_fm, re.MULTILINE)
-            title = title_match.group(1).strip() if title_match else md_file_path.stem
-
-        body_content = ""
-        if pandoc_available():
-            temp_md_path = md_file_path.with_suffix(".nofm.temp.md")
-            try:
-                temp_md_path.write_text(md_content_wo_fm, encoding="utf-8")
-            except Exception:
-                temp_md_path = md_file_path
-
-            result = subprocess.run(
-                ["pandoc", "-s", str(temp_md_path), "-o", str(temp_html_path)],
-                capture_output=True,
-                text=True,
-                timeout=30,
-            )
-
-            if result.returncode != 0:
-                logger.error("Pandoc转换失败: %s", result.stderr)
-                body_content = ""
-            else:
-                temp_html_content = temp_html_path.read_text(encoding="utf-8")
-                body_match = re.search(r"<body[^>]*>([\s\S]*?)</body>", temp_html_content, re.IGNORECASE)
-                body_content = body_match.group(1) if body_match else temp_html_content
-
-                # Convert code blocks to highlight.js compatible format
-                body_content = convert_code_blocks_for_highlightjs(body_content)
+        if match.string[match.start() - 3 : match.start()].lower() == "src":
+            if url.startswith("/"):
+                return match.group(0)
+            return f"={quote}/{urlquote(key)}{quote}"
+        target = legacy_to_new.get(key)
+        if link_deps is not None:
+            link_deps[key] = target
+        if not target:
+            return match.group(0)
+        fragment = url.partition("#")[2]
+        return f"={quote}/{target}{'#' + fragment if fragment else ''}{quote}"
+
+    return _LINK_ATTR_RE.sub(repl, html_fragment)
+
+
+def _link_list_html(heading: str, links: Sequence[Tuple[str, str]]) -> str:
+    if not links:
+        return ""
+    items = "".join(
+        f'<li><a href="/{html.escape(url)}">{html.escape(title)}</a></li>' for title, url in links
+    )
+    return f'<nav class="related-posts" aria-label="{heading}"><h2>{heading}</h2><ul>{items}</ul></nav>'
+
+
+def related_posts_html(related: Sequence[Tuple[str, str]]) -> str:
+    """The ``{{related}}`` block of a post page; empty when there are no related posts."""
+    return _link_list_html("相关文章", related)
+
+
+def backlinks_html(backlinks: Sequence[Tuple[str, str]]) -> str:
+    """The ``{{backlinks}}`` block of a post page: the pages linking to it."""
+    return _link_list_html("引用本文的页面", backlinks)
+
+
+def render_post_page(
+    md_file_path: Path,
+    out_html_path: Path,
+    legacy_to_new: Dict[str, str],
+    link_deps: Optional[Dict[str, Optional[str]]] = None,
+    body_html: Optional[str] = None,
+    renderer: Optional[Renderer] = None,
+    source: Optional[SourceDocument] = None,
+) -> Optional[str]:
+    """Render the final HTML of a post page without writing it.
+
+    ``body_html`` lets the caller pass a fragment already produced by
+    :meth:`Renderer.render_many`; otherwise ``renderer`` (default: the
+    configured one) converts the note. ``source`` is the document already
+    loaded by the scanner; without it the file is read here. Returns ``None``
+    when the template is missing.
+    """
+    if source is None:
+        source = SourceDocument.load(md_file_path)
+        source.keywords = extract_keywords(source.title, source.body)
+    md_content = source.text
+    md_content_wo_fm = source.body
+    title = source.title
 
+    body_content = ""
+    renderer = renderer or get_renderer()
+    if body_html is None and renderer is not None:
+        with profiling.span("render", "step"):
+            body_html = renderer.render(md_content_wo_fm) or ""
+    if body_html is not None:
+        body_content = body_html
+    else:
+        legacy_html_path = md_file_path.with_suffix(".html")
+        if legacy_html_path.exists():
+            body_content = extract_markdown_content_from_legacy_html(legacy_html_path)
         else:
-            legacy_html_path = md_file_path.with_suffix(".html")
-            if legacy_html_path.exists():
-                body_content = extract_markdown_content_from_legacy_html(legacy_html_path)
-            else:
-                safe = re.sub(r"&", "&amp;", md_content)
-                safe = re.sub(r"<", "&lt;", safe)
-                body_content = f"<h1>{title}</h1><pre>{safe}</pre>"
-
-        body_content = rewrite_internal_links(body_content, md_file_path, legacy_to_new)
-
-        if not config.TEMPLATE_FILE.exists():
-            logger.error("模板文件不存在: %s", config.TEMPLATE_FILE)
+            safe = re.sub(r"&", "&amp;", md_content)
+            safe = re.sub(r"<", "&lt;", safe)
+            body_content = f"<h1>{title}</h1><pre>{safe}</pre>"
+
+    with profiling.span("rewrite", "step"):
+        body_content = rewrite_internal_links(body_content, md_file_path, legacy_to_new, link_deps)
+
+    if not config.TEMPLATE_FILE.exists():
+        logger.error("模板文件不存在: %s", config.TEMPLATE_FILE)
+        return None
+
+    with profiling.span("template", "step"):
+        metadata = generate_metadata_for_template(
+            out_html_path, title, source.keywords, times=(source.ctime, source.mtime)
+        )
+        return get_template().render(
+            {
+                **metadata,
+                "content": body_content,
+                "related": related_posts_html(source.related),
+                "backlinks": backlinks_html(source.backlinks),
+                "nav_category": nav_category(md_file_path.parent),
+            }
+        )
+
+
+def convert_markdown_to_html(
+    md_file_path: Path,
+    out_html_path: Path,
+    legacy_to_new: Dict[str, str],
+    link_deps: Optional[Dict[str, Optional[str]]] = None,
+    body_html: Optional[str] = None,
+    renderer: Optional[Renderer] = None,
+    source: Optional[SourceDocument] = None,
+) -> bool:
+    """Convert markdown into final HTML using template + internal link rewriting.
+
+    See :func:`render_post_page` for the arguments; this writes the result to
+    ``out_html_path``.
+    """
+    try:
+        final_html_content = render_post_page(
+            md_file_path, out_html_path, legacy_to_new, link_deps, body_html, renderer, source
+        )
+        if final_html_content is None:
             return False
 
-        template_content = config.TEMPLATE_FILE.read_text(encoding="utf-8")
-        keywords = extract_keywords(title, md_content_wo_fm)
-        metadata = generate_metadata_for_template(out_html_path, title, keywords, source_file=md_file_path)
-
-        final_html_content = template_content
-        for key, value in metadata.items():
-            final_html_content = final_html_content.replace(f"{{{{{key}}}}}", str(value))
-        final_html_content = final_html_content.replace("{{content}}", body_content)
-
-        out_html_path.write_text(final_html_content, encoding="utf-8")
+        with profiling.span("minify", "step"):
+            final_html_content = minify_page(out_html_path.relative_to(config.ROOT_DIR).as_posix(), final_html_content)
+        with profiling.span("write", "step"):
+            write_if_changed(out_html_path, final_html_content)
         logger.info("✓ 生成: %s -> %s", md_file_path.relative_to(config.ROOT_DIR), out_html_path.relative_to(config.ROOT_DIR))
         return True
     except subprocess.TimeoutExpired:
@@ -148,77 +306,77 @@ def convert_markdown_to_html(md_file_path: Path, out_html_path: Path, legacy_to_
     except Exception as exc:
         logger.error("✗ 转换失败: %s - %s", md_file_path, exc)
         return False
-    finally:
-        if temp_html_path.exists():
-            try:
-                temp_html_path.unlink()
-            except Exception:
-                pass
-        temp_md = md_file_path.with_suffix(".nofm.temp.md")
-        if temp_md.exists():
-            try:
-                temp_md.unlink()
-            except Exception:
-                pass
-
-
-def generate_directory_page(dir_node: Dict, legacy_to_new: Dict[str, str]) -> bool:
-    """Generate a directory index page with optional legacy content fallback."""
+
+
+def render_directory_page(
+    dir_node: Dict,
+    legacy_to_new: Dict[str, str],
+    link_deps: Optional[Dict[str, Optional[str]]] = None,
+    body_html: Optional[str] = None,
+    renderer: Optional[Renderer] = None,
+    source: Optional[SourceDocument] = None,
+) -> str:
+    """Render a directory index page with optional legacy content fallback.
+
+    ``source`` is the directory's already-loaded ``index.md``, if any.
+    """
+    renderer = renderer or get_renderer()
     out_path = config.ROOT_DIR / dir_node["url"]
-    out_path.parent.mkdir(parents=True, exist_ok=True)
 
     dir_abs = config.ROOT_DIR / dir_node["path"]
     legacy_index_html = dir_abs / "index.html"
     index_md = dir_abs / "index.md"
+    if source is None and index_md.exists():
+        source = SourceDocument.load(index_md)
     title = dir_node.get("name") or dir_abs.name
     description = f"{title} - {config.SITE_NAME}"
 
     body_content = ""
     if legacy_index_html.exists():
         body_content = extract_markdown_content_from_legacy_html(legacy_index_html)
-        body_content = rewrite_internal_links(body_content, legacy_index_html, legacy_to_new)
+        body_content = rewrite_internal_links(body_content, legacy_index_html, legacy_to_new, link_deps)
 
-    if index_md.exists() and pandoc_available():
-        temp_html_path = index_md.with_suffix(".temp.html")
+    if source is not None and (body_html is not None or renderer is not None):
         try:
-            result = subprocess.run(
-                ["pandoc", "-s", str(index_md), "-o", str(temp_html_path)],
-                capture_output=True,
-                text=True,
-                timeout=30,
-            )
-
-            if result.returncode == 0 and temp_html_path.exists():
-                temp_html_content = temp_html_path.read_text(encoding="utf-8")
-                body_match = re.search(r"<body[^>]*>([\s\S]*?)</body>", temp_html_content, re.IGNORECASE)
-                body_content = body_match.group(1) if body_match else temp_html_content
-
-                # Convert code blocks to highlight.js compatible format
-                body_content = convert_code_blocks_for_highlightjs(body_content)
-
-                body_content = rewrite_internal_links(body_content, index_md, legacy_to_new)
+            if body_html is None:
+                with profiling.span("render", "step"):
+                    body_html = renderer.render(source.body)
+
+            if body_html is not None:
+                with profiling.span("rewrite", "step"):
+                    body_content = rewrite_internal_links(body_html, index_md, legacy_to_new, link_deps)
         except Exception:
             body_content = ""
-        finally:
-            if temp_html_path.exists():
-                try:
-                    temp_html_path.unlink()
-                except Exception:
-                    pass
 
     if not body_content:
         body_content = f"<h1>{title}</h1><p>{description}</p>"
 
     body_content = f'<div id="directory-page" data-dir-id="{dir_node["id"]}"></div>\n' + body_content
 
-    template_content = config.TEMPLATE_FILE.read_text(encoding="utf-8")
-    metadata_source = index_md if index_md.exists() else (legacy_index_html if legacy_index_html.exists() else out_path)
-    metadata = generate_metadata_for_template(out_path, title, [], source_file=metadata_source)
-
-    final_html_content = template_content
-    for key, value in metadata.items():
-        final_html_content = final_html_content.replace(f"{{{{{key}}}}}", str(value))
-    final_html_content = final_html_content.replace("{{content}}", body_content)
-
-    out_path.write_text(final_html_content, encoding="utf-8")
+    with profiling.span("template", "step"):
+        if source is not None:
+            metadata = generate_metadata_for_template(out_path, title, [], times=(source.ctime, source.mtime))
+        else:
+            # Not the output itself: its own mtime would change the page on every write.
+            metadata_source = legacy_index_html if legacy_index_html.exists() else dir_abs
+            metadata = generate_metadata_for_template(out_path, title, [], source_file=metadata_source)
+        return get_template().render(
+            {**metadata, "content": body_content, "related": "", "backlinks": "", "nav_category": nav_category(dir_abs)}
+        )
+
+
+def generate_directory_page(
+    dir_node: Dict,
+    legacy_to_new: Dict[str, str],
+    link_deps: Optional[Dict[str, Optional[str]]] = None,
+    body_html: Optional[str] = None,
+    renderer: Optional[Renderer] = None,
+    source: Optional[SourceDocument] = None,
+) -> bool:
+    """Generate a directory index page; see :func:`render_directory_page`."""
+    final_html_content = render_directory_page(dir_node, legacy_to_new, link_deps, body_html, renderer, source)
+    with profiling.span("minify", "step"):
+        final_html_content = minify_page(dir_node["url"], final_html_content)
+    with profiling.span("write", "step"):
+        write_if_changed(config.ROOT_DIR / dir_node["url"], final_html_content)
     return True
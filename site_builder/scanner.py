@@ -7,8 +7,13 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple
 
-from . import config
-from .utils import extract_keywords, parse_front_matter, stable_id, validate_slug
+from . import config, profiling
+from .keywords import extract_keywords_many
+from .links import link_key
+from .related import related_posts
+from .sources import SourceStore
+from .tfidf import TermCountCache, corpus_keywords
+from .utils import stable_id, validate_slug
 
 logger = logging.getLogger(__name__)
 
@@ -19,26 +24,79 @@ class ScanResult:
     blog_posts: List[Dict]
     directory_structure: List[Dict]
     flat_directories: List[Dict]
+    # Legacy page path -> new URL, keyed by :func:`~.links.link_key`.
     legacy_to_new: Dict[str, str]
     md_to_post: Dict[str, Dict]
     md_files: List[Path]
     root_dir: Path
     notes_dir: Path
+    sources: SourceStore
 
 
-def collect_markdown_posts(notes_dir: Optional[Path] = None) -> List[Path]:
+@dataclass
+class NotesTree:
+    """Result of a single ``os.scandir`` pass over the notes directory."""
+
+    children: Dict[Path, List[Path]]
+    order: List[Path]
+    index_dirs: Set[Path]
+    md_files: List[Path]
+
+    def markdown_paths(self) -> Set[Path]:
+        """Every markdown file found: the posts and the ``index.md`` files."""
+        return {*self.md_files, *(directory / "index.md" for directory in self.index_dirs)}
+
+
+def scan_notes_tree(notes_dir: Optional[Path] = None) -> NotesTree:
+    """Walk ``notes_dir`` once, recording subdirectories (sorted by name), the
+    directories holding an ``index.md``, and the post markdown files."""
     notes_dir = notes_dir or config.NOTES_DIR
+    children: Dict[Path, List[Path]] = {}
+    order: List[Path] = []
+    index_dirs: Set[Path] = set()
     md_files: List[Path] = []
-    for root, _, files in os.walk(notes_dir):
-        for file in files:
-            if file.endswith(".md") and file != "index.md":
-                md_files.append(Path(root) / file)
-    return sorted(md_files)
 
+    stack = [notes_dir]
+    while stack:
+        directory = stack.pop()
+        order.append(directory)
+        subdirs: List[str] = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    # Like os.walk, do not descend into symlinked directories.
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.name == "index.md":
+                        index_dirs.add(directory)
+                    elif entry.name.endswith(".md"):
+                        md_files.append(directory / entry.name)
+        except OSError as exc:
+            logger.warning("目录读取失败 %s: %s", directory, exc)
+            continue
+        subdirs.sort()
+        children[directory] = [directory / name for name in subdirs]
+        stack.extend(reversed(children[directory]))
+
+    md_files.sort()
+    return NotesTree(children=children, order=order, index_dirs=index_dirs, md_files=md_files)
 
-def slug_report(md_files: List[Path], root_dir: Optional[Path] = None, notes_dir: Optional[Path] = None) -> int:
+
+def collect_markdown_posts(notes_dir: Optional[Path] = None) -> List[Path]:
+    return scan_notes_tree(notes_dir).md_files
+
+
+def slug_report(
+    md_files: List[Path],
+    root_dir: Optional[Path] = None,
+    notes_dir: Optional[Path] = None,
+    sources: Optional[SourceStore] = None,
+    tree: Optional[NotesTree] = None,
+) -> int:
     root_dir = root_dir or config.ROOT_DIR
     notes_dir = notes_dir or config.NOTES_DIR
+    sources = sources if sources is not None else SourceStore()
+    tree = tree or scan_notes_tree(notes_dir)
     missing_posts: List[Tuple[str, str]] = []
     invalid_posts: List[Tuple[str, str]] = []
     dup_posts: Dict[str, List[str]] = {}
@@ -52,9 +110,7 @@ def slug_report(md_files: List[Path], root_dir: Optional[Path] = None, notes_dir
 
     for md in md_files:
         rel_md = str(md.relative_to(root_dir))
-        text = md.read_text(encoding="utf-8")
-        meta, _ = parse_front_matter(text)
-        slug = meta.get("slug")
+        slug = sources.get(md).meta.get("slug")
         if not slug:
             missing_posts.append((rel_md, f"post-{stable_id(rel_md)}"))
             continue
@@ -68,15 +124,12 @@ def slug_report(md_files: List[Path], root_dir: Optional[Path] = None, notes_dir
         if len(files) > 1:
             dup_posts[slug_value] = files
 
-    for root, _, files in os.walk(notes_dir):
-        if "index.md" not in files:
-            continue
-        idx = Path(root) / "index.md"
+    for root in sorted(tree.index_dirs):
+        idx = root / "index.md"
         rel_idx = str(idx.relative_to(root_dir))
-        meta, _ = parse_front_matter(idx.read_text(encoding="utf-8"))
-        slug = meta.get("slug")
+        slug = sources.get(idx).meta.get("slug")
         if not slug:
-            rel_dir = str(Path(root).relative_to(root_dir))
+            rel_dir = str(root.relative_to(root_dir))
             missing_dirs.append((rel_idx, f"cat-{stable_id(rel_dir)}"))
             continue
         try:
@@ -147,31 +200,29 @@ def build_directory_structure_from_md(
     md_files: List[Path],
     notes_dir: Optional[Path] = None,
     root_dir: Optional[Path] = None,
+    sources: Optional[SourceStore] = None,
+    tree: Optional[NotesTree] = None,
 ) -> List[Dict]:
+    """Build the nested directory nodes in O(files + dirs).
+
+    A directory is kept when it holds posts or an ``index.md`` itself, or when
+    any of its subdirectories is kept.
+    """
     notes_dir = notes_dir or config.NOTES_DIR
     root_dir = root_dir or config.ROOT_DIR
+    sources = sources if sources is not None else SourceStore()
+    tree = tree or scan_notes_tree(notes_dir)
 
-    dir_set: Set[Path] = set()
+    post_counts: Dict[Path, int] = {}
     for md in md_files:
-        dir_set.add(md.parent)
-        p = md.parent
-        while p != notes_dir and notes_dir in p.parents:
-            p = p.parent
-            dir_set.add(p)
-
-    for root, _, files in os.walk(notes_dir):
-        if "index.md" in files:
-            dir_set.add(Path(root))
+        post_counts[md.parent] = post_counts.get(md.parent, 0) + 1
 
     dir_slug_by_rel: Dict[str, str] = {}
     used_dir_slugs: Set[str] = set()
-    for directory in list(dir_set):
+    for directory in tree.index_dirs:
         index_md = directory / "index.md"
-        if not index_md.exists():
-            continue
         try:
-            text = index_md.read_text(encoding="utf-8")
-            meta, _ = parse_front_matter(text)
+            meta = sources.get(index_md).meta
             if meta.get("slug"):
                 slug = validate_slug(meta["slug"])
                 if slug in used_dir_slugs:
@@ -187,42 +238,27 @@ def build_directory_structure_from_md(
         dir_id = stable_id(rel_dir)
         slug = dir_slug_by_rel.get(rel_dir)
         url = f"dist/c/{slug}/index.html" if slug else f"dist/c/{dir_id}/index.html"
-        name = dir_path.name
-        has_posts = any((p.parent == dir_path) for p in md_files) or (dir_path / "index.md").exists()
         return {
-            "name": name,
+            "name": dir_path.name,
             "path": rel_dir,
             "id": dir_id,
             "slug": slug,
             "url": url,
-            "has_posts": has_posts,
+            "has_posts": post_counts.get(dir_path, 0) > 0 or dir_path in tree.index_dirs,
             "subdirs": [],
         }
 
-    def build_children(parent: Path) -> List[Dict]:
-        children: List[Dict] = []
-        for child in sorted(parent.iterdir()):
-            if not child.is_dir():
-                continue
-            if child not in dir_set and not any((d != child and child in d.parents) for d in dir_set):
-                continue
-            child_node = node_for_dir(child)
-            child_node["subdirs"] = build_children(child)
-            if child_node["has_posts"] or child_node["subdirs"]:
-                children.append(child_node)
-        return children
-
-    roots: List[Dict] = []
-    for top in sorted(notes_dir.iterdir()):
-        if not top.is_dir():
-            continue
-        if top not in dir_set and not any((d != top and top in d.parents) for d in dir_set):
+    # ``tree.order`` lists parents before children, so walking it backwards
+    # finishes every subtree before its parent needs it.
+    nodes: Dict[Path, Dict] = {}
+    for directory in reversed(tree.order):
+        if directory == notes_dir:
             continue
-        top_node = node_for_dir(top)
-        top_node["subdirs"] = build_children(top)
-        if top_node["has_posts"] or top_node["subdirs"]:
-            roots.append(top_node)
-    return roots
+        node = node_for_dir(directory)
+        node["subdirs"] = [nodes[child] for child in tree.children.get(directory, []) if child in nodes]
+        if node["has_posts"] or node["subdirs"]:
+            nodes[directory] = node
+    return [nodes[top] for top in tree.children.get(notes_dir, []) if top in nodes]
 
 
 def flatten_directories(dirs: List[Dict]) -> List[Dict]:
@@ -237,34 +273,20 @@ def flatten_directories(dirs: List[Dict]) -> List[Dict]:
     return out
 
 
-def _post_metadata_from_markdown(md_path: Path) -> Tuple[Dict[str, str], str, str, List[str]]:
-    md_text = md_path.read_text(encoding="utf-8")
-    meta, md_wo_fm = parse_front_matter(md_text)
-    title = meta.get("title")
-    if not title:
-        match = os.path.basename(md_path).split(".")[0]
-        heading_match = _first_heading(md_wo_fm)
-        title = heading_match or match
-    keywords = extract_keywords(title or md_path.stem, md_wo_fm)
-    return meta, md_wo_fm, title or md_path.stem, keywords
-
-
-def _first_heading(md_content: str) -> Optional[str]:
-    for line in md_content.splitlines():
-        if line.startswith("# "):
-            return line[2:].strip()
-    return None
-
-
 def scan_notes_structure(
     md_files: List[Path],
     *,
     root_dir: Optional[Path] = None,
     notes_dir: Optional[Path] = None,
+    sources: Optional[SourceStore] = None,
+    tree: Optional[NotesTree] = None,
 ) -> ScanResult:
     root_dir = root_dir or config.ROOT_DIR
     notes_dir = notes_dir or config.NOTES_DIR
-    directory_structure = build_directory_structure_from_md(md_files, notes_dir=notes_dir, root_dir=root_dir)
+    sources = sources if sources is not None else SourceStore()
+    directory_structure = build_directory_structure_from_md(
+        md_files, notes_dir=notes_dir, root_dir=root_dir, sources=sources, tree=tree
+    )
     flat_dirs = flatten_directories(directory_structure)
 
     nav_menu = [
@@ -277,15 +299,25 @@ def scan_notes_structure(
     used_post_slugs: Set[str] = set()
     md_to_post: Dict[str, Dict] = {}
 
-    for md in md_files:
+    docs = [sources.get(md) for md in md_files]
+    term_cache = TermCountCache() if config.KEYWORD_MODE == "tfidf" or config.RELATED_POSTS > 0 else None
+    with profiling.span("keywords", "step"):
+        # Title heuristics only: the bodies are not needed (or read) here.
+        keyword_lists = extract_keywords_many((d.title, "") for d in docs)
+        if config.KEYWORD_MODE == "tfidf":
+            keyword_lists = corpus_keywords(docs, keyword_lists, term_cache)
+        for doc, keywords in zip(docs, keyword_lists):
+            doc.keywords = keywords
+
+    for md, doc in zip(md_files, docs):
         rel_md = str(md.relative_to(root_dir))
         rel_html_legacy = str(md.with_suffix(".html").relative_to(root_dir))
         post_id = stable_id(rel_md)
 
-        meta, _, title, keywords = _post_metadata_from_markdown(md)
+        title, keywords = doc.title, doc.keywords
         manual_slug = None
-        if meta.get("slug"):
-            manual_slug = validate_slug(meta["slug"])
+        if doc.meta.get("slug"):
+            manual_slug = validate_slug(doc.meta["slug"])
             if manual_slug in used_post_slugs:
                 raise ValueError(f"duplicate post slug: {manual_slug}")
             used_post_slugs.add(manual_slug)
@@ -302,15 +334,17 @@ def scan_notes_structure(
         blog_posts.append(post_record)
         md_to_post[rel_md] = post_record
 
-        legacy_to_new[rel_html_legacy] = post_url
-        legacy_to_new[f"/{rel_html_legacy}"] = post_url
-        legacy_to_new[rel_md] = post_url
-        legacy_to_new[f"/{rel_md}"] = post_url
+        legacy_to_new[link_key(rel_html_legacy)] = post_url
+
+    if config.RELATED_POSTS > 0:
+        with profiling.span("related", "step"):
+            dirs = [md.parent.relative_to(notes_dir).parts for md in md_files]
+            for doc, post, related in zip(docs, blog_posts, related_posts(docs, dirs, config.RELATED_POSTS, term_cache)):
+                doc.related = [(blog_posts[j]["title"], blog_posts[j]["url"]) for j in related]
+                post["related"] = [blog_posts[j]["url"] for j in related]
 
     for directory in flat_dirs:
-        legacy_index = f"{directory['path']}/index.html"
-        legacy_to_new[legacy_index] = directory["url"]
-        legacy_to_new[f"/{legacy_index}"] = directory["url"]
+        legacy_to_new[link_key(f"{directory['path']}/index.html")] = directory["url"]
 
     return ScanResult(
         nav_menu=nav_menu,
@@ -322,4 +356,5 @@ def scan_notes_structure(
         md_files=md_files,
         root_dir=root_dir,
         notes_dir=notes_dir,
+        sources=sources,
     )
@@ -0,0 +1,173 @@
+"""Prebuilt inverted search index under ``dist/search/``.
+
+Titles, keywords, headings and body text are tokenized into lower-cased
+English words and CJK bigrams. Posting lists use integer doc ids, sorted and
+delta-encoded as flat ``[id, score, id_delta, score, ...]`` arrays. Terms are
+split into shard files by their first character, so the search page only
+fetches the shards its query touches plus the doc-table chunks of the hits:
+
+- ``meta.json``: format version, shard count, doc chunk size and a build hash
+- ``<shard>.json``: ``{term: postings}`` for every term in that shard
+- ``docs-<n>.json``: ``[url, title, keywords]`` rows for doc ids ``n*chunk ...``
+
+The tokenizer must stay in sync with ``SearchIndex.tokenize`` in script.js.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import config
+from .output import remove_stale, write_if_changed
+from .sources import SourceDocument
+from .utils import content_hash, strip_markup
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+DOCS_PER_CHUNK = 500
+
+# Per-occurrence weights; body matches are capped so long posts do not swamp titles.
+TITLE_WEIGHT = 10
+KEYWORD_WEIGHT = 6
+HEADING_WEIGHT = 4
+BODY_CAP = 10
+
+_WORD_RE = re.compile(r"[a-z0-9]{2,}")
+# Overlapping CJK bigrams, and CJK characters standing alone.
+_BIGRAM_RE = re.compile(r"(?=([\u4e00-\u9fff]{2}))")
+_SINGLE_CJK_RE = re.compile(r"(?<![\u4e00-\u9fff])[\u4e00-\u9fff](?![\u4e00-\u9fff])")
+_HEADING_RE = re.compile(r"^#{1,6}[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _terms(normalized: str) -> List[str]:
+    return _WORD_RE.findall(normalized) + _BIGRAM_RE.findall(normalized) + _SINGLE_CJK_RE.findall(normalized)
+
+
+def search_tokens(text: str) -> List[str]:
+    """Index terms of ``text``: English words/numbers (2+ chars) and CJK bigrams.
+
+    A CJK run of a single character is kept as a unigram.
+    """
+    return _terms(_normalize(text))
+
+
+def shard_name(term: str, shards: int) -> str:
+    return format(ord(term[0]) % shards, "02x")
+
+
+def document_scores(title: str, keywords: Iterable[str], body: str) -> Counter:
+    """Weighted term scores of one post."""
+    scores: Counter = Counter()
+    for term in search_tokens(title):
+        scores[term] += TITLE_WEIGHT
+    for term in search_tokens(" ".join(keywords)):
+        scores[term] += KEYWORD_WEIGHT
+    body = _normalize(body)
+    for term in _terms(" ".join(_HEADING_RE.findall(body))):
+        scores[term] += HEADING_WEIGHT
+    for term, count in Counter(_terms(strip_markup(body))).items():
+        scores[term] += count if count < BODY_CAP else BODY_CAP
+    return scores
+
+
+@dataclass
+class SearchIndex:
+    docs: List[Tuple[str, str, List[str]]] = field(default_factory=list)
+    postings: Dict[str, List[Tuple[int, int]]] = field(default_factory=dict)
+
+    def add(self, url: str, title: str, keywords: List[str], body: str) -> None:
+        doc_id = len(self.docs)
+        self.docs.append((url, title, keywords))
+        for term, score in document_scores(title, keywords, body).items():
+            self.postings.setdefault(term, []).append((doc_id, score))
+
+    def shard_files(self, shards: int) -> Dict[str, Dict[str, List[int]]]:
+        """Delta-encoded postings grouped by shard name."""
+        files: Dict[str, Dict[str, List[int]]] = {}
+        for term in sorted(self.postings):
+            encoded: List[int] = []
+            previous = 0
+            # Doc ids were appended in increasing order, so the lists are already sorted.
+            for doc_id, score in self.postings[term]:
+                encoded += (doc_id - previous, score)
+                previous = doc_id
+            files.setdefault(shard_name(term, shards), {})[term] = encoded
+        return files
+
+
+def build_search_index(posts: Sequence[Tuple[Dict, SourceDocument]]) -> SearchIndex:
+    """Index ``(blog_post, source)`` pairs; doc ids follow the order of ``posts``."""
+    index = SearchIndex()
+    for post, doc in posts:
+        index.add(post["url"], post["title"], post.get("keywords") or [], doc.body)
+    return index
+
+
+def _dumps(data) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def write_search_index(
+    index: SearchIndex, out_dir: Optional[Path] = None, shards: Optional[int] = None, source: str = ""
+) -> int:
+    """Write the index files, leaving unchanged ones untouched; return how many were written.
+
+    ``source`` is stored in meta.json so :func:`update_search_index` can tell
+    whether the inputs changed since.
+    """
+    out_dir = out_dir or config.SEARCH_DIR
+    shards = shards or config.SEARCH_SHARDS
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    shard_files = index.shard_files(shards)
+    files = {f"{name}.json": _dumps(terms) for name, terms in shard_files.items()}
+    for start in range(0, len(index.docs), DOCS_PER_CHUNK):
+        files[f"docs-{start // DOCS_PER_CHUNK}.json"] = _dumps(index.docs[start : start + DOCS_PER_CHUNK])
+    meta = {
+        "version": INDEX_VERSION,
+        "shards": shards,
+        "docChunk": DOCS_PER_CHUNK,
+        "docs": len(index.docs),
+        "maxResults": config.SEARCH_MAX_RESULTS,
+        # Clients append this to shard URLs so a new build never mixes with cached old shards.
+        "build": content_hash("".join(name + text for name, text in sorted(files.items())))[:12],
+        "source": source,
+    }
+    files["meta.json"] = _dumps(meta)
+
+    written = sum(write_if_changed(out_dir / name, text) for name, text in files.items())
+    remove_stale(out_dir.glob("*.json"), {out_dir / name for name in files})
+    logger.info("✅ 搜索索引已生成: %s 篇文章，%s 个词条，%s 个分片（写入 %s 个文件）",
+                len(index.docs), len(index.postings), len(shard_files), written)
+    return written
+
+
+def source_signature(posts: Sequence[Tuple[Dict, SourceDocument]], shards: int) -> str:
+    rows = [(post["url"], post["title"], post.get("keywords") or [], doc.content_hash) for post, doc in posts]
+    return content_hash(_dumps([INDEX_VERSION, shards, config.SEARCH_MAX_RESULTS, rows]))
+
+
+def update_search_index(posts: Sequence[Tuple[Dict, SourceDocument]], out_dir: Optional[Path] = None) -> bool:
+    """Rebuild the index unless meta.json says it was built from the same inputs."""
+    out_dir = out_dir or config.SEARCH_DIR
+    signature = source_signature(posts, config.SEARCH_SHARDS)
+    try:
+        meta = json.loads((out_dir / "meta.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        meta = {}
+    if meta.get("source") == signature:
+        logger.info("搜索索引未变更，跳过")
+        return False
+    write_search_index(build_search_index(posts), out_dir, config.SEARCH_SHARDS, signature)
+    return True
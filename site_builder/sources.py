@@ -0,0 +1,252 @@
+"""Per-build cache of markdown sources so each file is read and parsed once.
+
+Scanning only needs the front matter and the title, so documents are opened
+header first: :func:`read_header` stops after the front matter and the first
+``# `` heading, and the full text is read when something asks for the body or
+the content hash. A :class:`ScanCache` keeps the header fields (and the hash,
+once known) keyed by path, size and ``mtime_ns``, so unchanged files are not
+opened at all.
+"""
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import config
+from .output import write_if_changed
+from .utils import content_hash, match_front_matter, parse_front_matter
+
+SCAN_CACHE_VERSION = 1
+# First read of :func:`read_header`; doubled until the header is complete.
+HEADER_CHUNK = 4096
+
+
+def first_heading(md_content: str) -> Optional[str]:
+    for line in md_content.splitlines():
+        if line.startswith("# "):
+            return line[2:].strip()
+    return None
+
+
+def _parse_header(head: str, eof: bool) -> Optional[Tuple[Dict[str, str], Optional[str]]]:
+    """``(meta, first heading)`` of a file starting with ``head``; ``None`` if more text is needed.
+
+    Gives the same result as parsing the whole file: a front matter match is
+    only trusted when non-blank text follows it, and only complete lines are
+    searched for the heading.
+    """
+    match = match_front_matter(head)
+    if match is None:
+        stripped = head.lstrip()
+        if not eof and (stripped.startswith("---") or "---".startswith(stripped)):
+            return None
+        meta, body = {}, head
+    else:
+        if not eof and not head[match.end():].strip():
+            return None
+        meta, body = parse_front_matter(head)
+    if meta.get("title"):
+        return meta, None
+    lines = body.splitlines()
+    if not eof:
+        lines = lines[:-1]
+    heading = first_heading("\n".join(lines))
+    if heading is None and not eof:
+        return None
+    return meta, heading
+
+
+def read_header(path: Path) -> Tuple[Dict[str, str], Optional[str], Optional[str]]:
+    """Read ``path`` only as far as needed for its front matter and first heading.
+
+    Returns ``(meta, heading, text)``; ``text`` is the whole file when it
+    happened to be read completely, else ``None``.
+    """
+    head = ""
+    size = HEADER_CHUNK
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            piece = f.read(size)
+            head += piece
+            eof = len(piece) < size
+            parsed = _parse_header(head, eof)
+            if parsed is not None:
+                return parsed[0], parsed[1], head if eof else None
+            size *= 2
+
+
+class SourceDocument:
+    """A markdown file: front matter, title and stat info, with the text read on demand.
+
+    ``keywords`` and ``related`` (``(title, url)`` pairs) are filled in by the
+    scanner for posts, ``backlinks`` (also ``(title, url)`` pairs) from the link
+    graph; directory ``index.md`` documents leave them empty.
+    """
+
+    __slots__ = (
+        "path", "meta", "title", "keywords", "related", "backlinks",
+        "size", "mtime", "mtime_ns", "ctime", "_text", "_body_start", "_hash",
+    )
+
+    def __init__(
+        self,
+        path: Path,
+        stat: os.stat_result,
+        meta: Dict[str, str],
+        heading: Optional[str],
+        text: Optional[str] = None,
+        known_hash: Optional[str] = None,
+    ):
+        self.path = path
+        self.meta: Dict[str, str] = meta
+        self.title: str = meta.get("title") or heading or os.path.basename(path).split(".")[0] or path.stem
+        self.keywords: List[str] = []
+        self.related: List[Tuple[str, str]] = []
+        self.backlinks: List[Tuple[str, str]] = []
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        self.mtime_ns = stat.st_mtime_ns
+        self.ctime = stat.st_ctime
+        self._text: Optional[str] = None
+        self._body_start = 0
+        self._hash: Optional[str] = known_hash
+        if text is not None:
+            self._set_text(text)
+
+    @classmethod
+    def load(cls, path: Path) -> "SourceDocument":
+        """Read the whole file at once."""
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+            stat = os.fstat(f.fileno())
+        meta, body = parse_front_matter(text)
+        return cls(path, stat, meta, first_heading(body), text=text)
+
+    @classmethod
+    def load_header(cls, path: Path, stat: Optional[os.stat_result] = None) -> "SourceDocument":
+        """Read only the front matter and first heading; see :func:`read_header`."""
+        stat = stat or os.stat(path)
+        meta, heading, text = read_header(path)
+        return cls(path, stat, meta, heading, text=text)
+
+    def _set_text(self, text: str) -> None:
+        self._body_start = len(text) - len(parse_front_matter(text)[1])
+        self._text = text
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._set_text(f.read())
+        return self._text
+
+    @property
+    def body(self) -> str:
+        """Markdown content without front matter."""
+        text = self.text
+        return text[self._body_start:]
+
+    @property
+    def content_hash(self) -> str:
+        if self._hash is None:
+            self._hash = content_hash(self.text)
+        return self._hash
+
+    @property
+    def known_hash(self) -> Optional[str]:
+        """The content hash if it is known without reading the file."""
+        if self._hash is None and self._text is not None:
+            return self.content_hash
+        return self._hash
+
+    def rel_path(self, root_dir: Optional[Path] = None) -> str:
+        return str(self.path.relative_to(root_dir or config.ROOT_DIR))
+
+
+class ScanCache:
+    """Header fields of markdown files from earlier builds, valid while size and mtime_ns match."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or config.SCAN_CACHE_FILE
+        # path -> [size, mtime_ns, meta, title, content hash or None]
+        self.entries: Dict[str, list] = {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") == SCAN_CACHE_VERSION:
+            self.entries = data.get("files", {})
+
+    def lookup(self, path: Path, stat: os.stat_result) -> Optional[SourceDocument]:
+        entry = self.entries.get(str(path))
+        if entry is None or entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns:
+            return None
+        # The cached title stands in for the heading; it is what the heading resolved to.
+        return SourceDocument(path, stat, entry[2], entry[3], known_hash=entry[4])
+
+    def save(self, docs: Iterable[SourceDocument]) -> None:
+        files = {
+            str(doc.path): [doc.size, doc.mtime_ns, doc.meta, doc.title, doc.known_hash]
+            for doc in docs
+        }
+        if files != self.entries:
+            self.entries = files
+            write_if_changed(
+                self.path,
+                json.dumps({"version": SCAN_CACHE_VERSION, "files": files}, ensure_ascii=False, separators=(",", ":")),
+            )
+
+
+class SourceStore:
+    """Loads :class:`SourceDocument` objects on first access and keeps them for the build.
+
+    With a ``cache``, unchanged files come from the :class:`ScanCache` instead
+    of being opened; :meth:`save_cache` records the documents of this build.
+    """
+
+    def __init__(self, cache: Optional[ScanCache] = None) -> None:
+        self._docs: Dict[Path, SourceDocument] = {}
+        self.cache = cache
+
+    def get(self, path: Path) -> SourceDocument:
+        doc = self._docs.get(path)
+        if doc is None:
+            stat = os.stat(path)
+            doc = self.cache.lookup(path, stat) if self.cache is not None else None
+            if doc is None:
+                doc = SourceDocument.load_header(path, stat)
+            self._docs[path] = doc
+        return doc
+
+    def save_cache(self, live: Optional[Iterable[Path]] = None) -> None:
+        """Save the documents to the cache; with ``live`` (the files of the
+        current scan), documents of files that are gone are forgotten first."""
+        if live is not None:
+            live = set(live)
+            for path in [path for path in self._docs if path not in live]:
+                self.discard(path)
+        if self.cache is not None:
+            self.cache.save(self._docs.values())
+
+    def find(self, path: Path) -> Optional[SourceDocument]:
+        """Like :meth:`get` but returns ``None`` when the file does not exist."""
+        if path in self._docs:
+            return self._docs[path]
+        if not path.is_file():
+            return None
+        return self.get(path)
+
+    def discard(self, path: Path) -> None:
+        """Forget ``path`` so the next access re-reads it (used by watch mode)."""
+        self._docs.pop(path, None)
+
+    def __contains__(self, path: object) -> bool:
+        return path in self._docs
+
+    def __iter__(self) -> Iterator[SourceDocument]:
+        return iter(self._docs.values())
+
+    def __len__(self) -> int:
+        return len(self._docs)
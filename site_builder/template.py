@@ -0,0 +1,109 @@
+"""Precompiled page template (template.html) with cached parsing."""
+from __future__ import annotations
+
+import html
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from . import config
+from .assets import rewrite_asset_urls
+from .utils import content_hash
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER_RE = re.compile(r"\{\{(\w+)\}\}")
+_JSON_SCRIPT_RE = re.compile(
+    r"<script[^>]*type=[\"']application/(?:ld\+)?json[\"'][^>]*>[\s\S]*?</script>", re.IGNORECASE
+)
+
+# Values inserted as-is; every other placeholder is escaped for its context.
+RAW_FIELDS: FrozenSet[str] = frozenset({"content", "related", "backlinks"})
+
+
+def _escape_html(value: str) -> str:
+    return html.escape(value, quote=True)
+
+
+def _escape_json(value: str) -> str:
+    return json.dumps(value, ensure_ascii=False)[1:-1].replace("</", "<\\/")
+
+
+class PageTemplate:
+    """``template.html`` split once into literal and placeholder segments.
+
+    Placeholders inside ``application/ld+json`` scripts are JSON-string escaped,
+    the rest are HTML escaped, except the fields in :data:`RAW_FIELDS`.
+    """
+
+    def __init__(self, text: str, name: str = "template.html"):
+        self.name = name
+        self.fingerprint = content_hash(text)
+        json_spans = [m.span() for m in _JSON_SCRIPT_RE.finditer(text)]
+
+        self._literals: List[str] = []
+        self._slots: List[Tuple[str, Callable[[str], str]]] = []
+        last = 0
+        for m in _PLACEHOLDER_RE.finditer(text):
+            key = m.group(1)
+            in_json = any(start <= m.start() < end for start, end in json_spans)
+            escape: Callable[[str], str]
+            if key in RAW_FIELDS:
+                escape = str
+            elif in_json:
+                escape = _escape_json
+            else:
+                escape = _escape_html
+            self._literals.append(text[last:m.start()])
+            self._slots.append((key, escape))
+            last = m.end()
+        self._literals.append(text[last:])
+        self.placeholders: FrozenSet[str] = frozenset(key for key, _ in self._slots)
+        self._warned: set[str] = set()
+
+    def render(self, values: Mapping[str, object]) -> str:
+        parts: List[str] = [self._literals[0]]
+        for (key, escape), literal in zip(self._slots, self._literals[1:]):
+            value = values.get(key)
+            if value is None:
+                if key not in self._warned:
+                    self._warned.add(key)
+                    logger.warning("模板占位符未提供值: {{%s}} (%s)", key, self.name)
+                parts.append(f"{{{{{key}}}}}")
+            else:
+                parts.append(escape(str(value)))
+            parts.append(literal)
+        return "".join(parts)
+
+
+_cache: Dict[Path, Tuple[Tuple[int, int], PageTemplate]] = {}
+_lock = threading.Lock()
+# Fingerprinted asset URLs substituted into the template; see assets.py.
+_asset_urls: Dict[str, str] = {}
+
+
+def use_asset_urls(urls: Mapping[str, str]) -> None:
+    """Point the template's references to static assets at their fingerprinted copies."""
+    global _asset_urls
+    with _lock:
+        if dict(urls) != _asset_urls:
+            _asset_urls = dict(urls)
+            _cache.clear()
+
+
+def get_template(path: Optional[Path] = None) -> PageTemplate:
+    """Return the parsed template, re-parsing only when the file's mtime/size changed."""
+    path = path or config.TEMPLATE_FILE
+    stat = path.stat()
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        text = rewrite_asset_urls(path.read_text(encoding="utf-8"), _asset_urls)
+        template = PageTemplate(text, name=path.name)
+        _cache[path] = (key, template)
+        return template
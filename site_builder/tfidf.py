@@ -0,0 +1,178 @@
+"""Corpus-level TF-IDF keywords from post bodies.
+
+Bodies are tokenized once into CJK bigrams and English terms, and the counts
+are cached per document content hash, so an incremental build only tokenizes
+changed posts before recomputing IDF over the whole corpus. Counts live in a
+CSR-style sparse document-term matrix backed by :mod:`array`.
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import math
+import re
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import config
+from .output import write_if_changed
+from .sources import SourceDocument
+from .utils import strip_markup
+
+logger = logging.getLogger(__name__)
+
+# Bump when tokenization changes so cached term counts are discarded.
+TOKENIZER_VERSION = "1"
+
+_CJK_RUN_RE = re.compile(r"[\u4e00-\u9fff]{2,}")
+_ENGLISH_RE = re.compile(r"[A-Za-z][A-Za-z0-9]{2,}")
+
+TermCounts = List[Tuple[str, int]]
+
+
+def tokenize(text: str) -> TermCounts:
+    """Term counts of a markdown body: CJK bigrams plus English words (3+ chars).
+
+    Code, URLs and HTML tags are skipped, as are stop words and bigrams touching
+    a single-character stop word. English terms are counted case-insensitively
+    under the first spelling seen in the document.
+    """
+    text = strip_markup(text)
+
+    stop_words = config.STOP_WORDS
+    stop_lower = {w.lower() for w in stop_words}
+    counts: Counter = Counter()
+    for run in _CJK_RUN_RE.findall(text):
+        for i in range(len(run) - 1):
+            a, b = run[i], run[i + 1]
+            if a in stop_words or b in stop_words:
+                continue
+            counts[a + b] += 1
+
+    spelling: Dict[str, str] = {}
+    for word in _ENGLISH_RE.findall(text):
+        key = word.lower()
+        if key in stop_lower:
+            continue
+        counts[spelling.setdefault(key, word)] += 1
+    return list(counts.items())
+
+
+class TermCountCache:
+    """Per-document term counts keyed by source content hash (``.build_cache/terms.json``)."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path or config.TERMS_CACHE_FILE
+        self._entries: Dict[str, TermCounts] = {}
+        self._dirty = False
+        if self.path.exists():
+            try:
+                data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError) as exc:
+                logger.warning("词频缓存读取失败，将重新分词: %s", exc)
+                return
+            if data.get("version") == TOKENIZER_VERSION:
+                for key, (terms, counts) in data.get("docs", {}).items():
+                    self._entries[key] = list(zip(terms.split(" ") if terms else [], counts))
+
+    def counts_for(self, doc: SourceDocument) -> TermCounts:
+        counts = self._entries.get(doc.content_hash)
+        if counts is None:
+            counts = tokenize(doc.body)
+            self._entries[doc.content_hash] = counts
+            self._dirty = True
+        return counts
+
+    def save(self, live_keys: Iterable[str]) -> None:
+        live = set(live_keys)
+        if not self._dirty and live == self._entries.keys():
+            return
+        docs = {
+            key: [" ".join(t for t, _ in counts), [c for _, c in counts]]
+            for key, counts in self._entries.items()
+            if key in live
+        }
+        write_if_changed(
+            self.path,
+            json.dumps({"version": TOKENIZER_VERSION, "docs": docs}, ensure_ascii=False, separators=(",", ":")),
+        )
+
+
+class TermMatrix:
+    """Sparse document-term count matrix in CSR layout (``indptr``/``indices``/``data``)."""
+
+    def __init__(self, documents: Sequence[TermCounts]):
+        self.vocab: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.indptr = array("L", [0])
+        self.indices = array("L")
+        self.data = array("L")
+        for counts in documents:
+            for term, count in counts:
+                key = term.lower()
+                term_id = self.vocab.get(key)
+                if term_id is None:
+                    term_id = self.vocab[key] = len(self.terms)
+                    self.terms.append(term)
+                self.indices.append(term_id)
+                self.data.append(count)
+            self.indptr.append(len(self.indices))
+
+        self.df = array("L", [0]) * len(self.terms)
+        for term_id in self.indices:
+            self.df[term_id] += 1
+
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+
+    def idf(self) -> array:
+        n = len(self)
+        return array("d", (math.log((1 + n) / (1 + df)) + 1 for df in self.df))
+
+    def top_terms(self, doc_index: int, idf: array, k: int, min_tf: int = 2) -> List[str]:
+        """The ``k`` highest scoring terms of a document by sublinear TF x IDF."""
+        start, end = self.indptr[doc_index], self.indptr[doc_index + 1]
+        scored = []
+        for j in range(start, end):
+            tf = self.data[j]
+            if tf < min_tf:
+                continue
+            term_id = self.indices[j]
+            scored.append(((1 + math.log(tf)) * idf[term_id], -term_id))
+        return [self.terms[-neg_id] for _, neg_id in heapq.nlargest(k, scored)]
+
+
+def blend_keywords(title_keywords: List[str], corpus_terms: Iterable[str], limit: int) -> List[str]:
+    """Title keywords first, then corpus terms not overlapping any of them."""
+    keywords = list(title_keywords[:limit])
+    lowered = [k.lower() for k in keywords]
+    for term in corpus_terms:
+        if len(keywords) >= limit:
+            break
+        key = term.lower()
+        if any(key in k or k in key for k in lowered):
+            continue
+        keywords.append(term)
+        lowered.append(key)
+    return keywords
+
+
+def corpus_keywords(
+    docs: Sequence[SourceDocument],
+    title_keywords: Sequence[List[str]],
+    cache: Optional[TermCountCache] = None,
+) -> List[List[str]]:
+    """Blend each post's title keywords with its top TF-IDF body terms."""
+    cache = cache or TermCountCache()
+    matrix = TermMatrix([cache.counts_for(doc) for doc in docs])
+    cache.save(doc.content_hash for doc in docs)
+
+    idf = matrix.idf()
+    limit = config.MAX_KEYWORDS_PER_POST
+    return [
+        blend_keywords(title_keywords[i], matrix.top_terms(i, idf, limit * 2), limit)
+        for i in range(len(docs))
+    ]
@@ -6,10 +6,12 @@ import logging
 import re
 import subprocess
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 from . import config
+from .keywords import get_extractor
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +32,16 @@ def pandoc_available() -> bool:
     return _PANDOC_AVAILABLE
 
 
+@lru_cache(maxsize=1)
+def pandoc_version() -> str:
+    """Return the pandoc version string (e.g. ``"3.1.3"``), or ``""`` when unavailable."""
+    if not pandoc_available():
+        return ""
+    result = subprocess.run(["pandoc", "--version"], capture_output=True, text=True)
+    first_line = result.stdout.splitlines()[0] if result.stdout else ""
+    return first_line.split()[-1] if first_line else ""
+
+
 def extract_markdown_content_from_legacy_html(legacy_html_path: Path) -> str:
     """Extract the inner HTML fragment from a legacy HTML article."""
     try:
@@ -56,12 +68,24 @@ def stable_id(text: str, length: int = 12) -> str:
     return h[:length]
 
 
+def content_hash(data: bytes | str) -> str:
+    """Return a hex digest identifying the given content."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
 _FRONT_MATTER_RE = re.compile(r'^\s*---\s*\n([\s\S]*?)\n---\s*\n', re.MULTILINE)
 
 
+def match_front_matter(md_text: str) -> Optional[re.Match]:
+    """The front matter block at the start of ``md_text``, if any."""
+    return _FRONT_MATTER_RE.match(md_text)
+
+
 def parse_front_matter(md_text: str) -> Tuple[Dict[str, str], str]:
     """Parse simple YAML-style front matter and return (meta, content)."""
-    m = _FRONT_MATTER_RE.match(md_text)
+    m = match_front_matter(md_text)
     if not m:
         return {}, md_text
 
@@ -81,6 +105,22 @@ def parse_front_matter(md_text: str) -> Tuple[Dict[str, str], str]:
     return meta, md_text[m.end():]
 
 
+_FENCE_RE = re.compile(r"^(`{3,}|~{3,})[^\n]*\n[\s\S]*?^\1[ \t]*$", re.MULTILINE)
+_INLINE_CODE_RE = re.compile(r"`[^`\n]*`")
+_LINK_TARGET_RE = re.compile(r"\]\([^)]*\)")
+_HTML_TAG_RE = re.compile(r"<[^>\n]+>")
+_URL_RE = re.compile(r"https?://\S+")
+
+
+def strip_markup(md_text: str) -> str:
+    """Drop code, link targets, URLs and HTML tags from markdown, keeping the prose."""
+    text = _FENCE_RE.sub(" ", md_text)
+    text = _INLINE_CODE_RE.sub(" ", text)
+    text = _LINK_TARGET_RE.sub("]", text)
+    text = _URL_RE.sub(" ", text)
+    return _HTML_TAG_RE.sub(" ", text)
+
+
 def validate_slug(slug: str) -> str:
     slug = (slug or "").strip()
     if not slug:
@@ -92,96 +132,7 @@ def validate_slug(slug: str) -> str:
 
 def extract_keywords(title: str, content: str = "") -> List[str]:
     """Keyword extraction shared by article and directory generation."""
-    if not title:
-        return []
-
-    keywords: List[str] = []
-    seen: set[str] = set()
-    keyword_scores: Dict[str, int] = {}
-
-    clean_title = re.sub(
-        r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]',
-        "",
-        title,
-    ).strip()
-    if not clean_title:
-        return []
-
-    for topic in config.CORE_TOPICS:
-        if topic.lower() in clean_title.lower():
-            for word in re.findall(r"\b\w+\b", clean_title):
-                if word.lower() == topic.lower():
-                    if word not in seen:
-                        keyword_scores[word] = keyword_scores.get(word, 0) + 10
-                        seen.add(word)
-                    break
-            else:
-                if topic not in seen:
-                    keyword_scores[topic] = keyword_scores.get(topic, 0) + 10
-                    seen.add(topic)
-
-    english_terms = re.findall(r"\b[A-Z][A-Za-z]+\b|\b[a-z]{4,}\b", clean_title)
-    for term in english_terms:
-        if term in config.STOP_WORDS or term.lower() in config.STOP_WORDS:
-            continue
-        if term not in seen and len(term) >= config.MIN_KEYWORD_LENGTH:
-            if term[0].isupper() or len(term) > 4:
-                keyword_scores[term] = keyword_scores.get(term, 0) + 5
-                seen.add(term)
-
-    processed_title = clean_title
-    for modifier in config.MODIFIER_WORDS:
-        processed_title = re.sub(rf"\b{modifier}\b", "", processed_title)
-    processed_title = processed_title.strip()
-
-    patterns = [
-        (r"([^，。！？\s]{2,})(?:技术|框架|工具|平台|系统)", 1),
-        (r"(?:使用|运行|配置|安装)\s*([^，。！？\s]{2,})", 1),
-        (r"([A-Z][a-z]+(?:[A-Z][a-z]+)*)", 0),
-    ]
-    for pattern, group in patterns:
-        matches = re.findall(pattern, clean_title)
-        for match in matches:
-            keyword = match if isinstance(match, str) else match[group]
-            keyword = keyword.strip()
-            if (
-                keyword
-                and keyword not in config.STOP_WORDS
-                and keyword not in config.MODIFIER_WORDS
-                and len(keyword) >= config.MIN_KEYWORD_LENGTH
-                and keyword not in seen
-            ):
-                keyword_scores[keyword] = keyword_scores.get(keyword, 0) + 3
-                seen.add(keyword)
-
-    chinese_parts = re.split(r"[，。！？、\s]+", processed_title)
-    for part in chinese_parts:
-        chinese_words = re.findall(r"[\u4e00-\u9fff]{2,}", part)
-        for word in chinese_words:
-            if (
-                word not in config.STOP_WORDS
-                and word not in config.MODIFIER_WORDS
-                and len(word) >= config.MIN_KEYWORD_LENGTH
-                and word not in seen
-            ):
-                keyword_scores[word] = keyword_scores.get(word, 0) + 2
-                seen.add(word)
-
-    sorted_keywords = sorted(keyword_scores.items(), key=lambda x: x[1], reverse=True)
-    keywords = [kw for kw, _ in sorted_keywords[: config.MAX_KEYWORDS_PER_POST]]
-
-    if len(keywords) < 2:
-        words = re.findall(r"[\u4e00-\u9fff]{2,}|[A-Za-z]{3,}", clean_title)
-        for word in words:
-            if (
-                word not in config.STOP_WORDS
-                and word not in seen
-                and len(keywords) < config.MAX_KEYWORDS_PER_POST
-            ):
-                keywords.append(word)
-                seen.add(word)
-
-    return keywords[: config.MAX_KEYWORDS_PER_POST]
+    return get_extractor().extract(title, content)
 
 
 def generate_metadata_for_template(
@@ -189,19 +140,27 @@ def generate_metadata_for_template(
     title: str,
     keywords: List[str],
     source_file: Optional[Path] = None,
+    times: Optional[Tuple[float, float]] = None,
 ) -> Dict[str, str]:
-    """Generate the metadata values consumed by template.html."""
+    """Generate the metadata values consumed by template.html.
+
+    ``times`` is an already-known ``(ctime, mtime)`` pair for the source, which
+    saves the ``stat`` calls.
+    """
     description = f"{title} - "
     if keywords:
         description += f"关键词: {', '.join(keywords[:3])}"
     else:
         description += config.SITE_DESCRIPTION
 
-    stat_file = source_file if source_file and source_file.exists() else file_path
-    if stat_file.exists():
-        stat = stat_file.stat()
-        created_date = datetime.fromtimestamp(stat.st_ctime)
-        modified_date = datetime.fromtimestamp(stat.st_mtime)
+    if times is None:
+        stat_file = source_file if source_file and source_file.exists() else file_path
+        if stat_file.exists():
+            stat = stat_file.stat()
+            times = (stat.st_ctime, stat.st_mtime)
+    if times is not None:
+        created_date = datetime.fromtimestamp(times[0])
+        modified_date = datetime.fromtimestamp(times[1])
     else:
         created_date = datetime.now()
         modified_date = datetime.now()
@@ -0,0 +1,182 @@
+"""File watching for ``generate_nav.py --watch``.
+
+Uses watchdog (inotify/FSEvents/...) when it is installed and falls back to
+polling stat snapshots otherwise. Bursts of saves are debounced into a single
+set of changed paths handed to the rebuild callback.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Editor swap/backup files that should never trigger a rebuild.
+_IGNORED_SUFFIXES = (".swp", ".swx", ".tmp", "~")
+_IGNORED_PREFIXES = (".#", ".~")
+
+
+def is_relevant(path: Path) -> bool:
+    name = path.name
+    if name.endswith(_IGNORED_SUFFIXES) or name.startswith(_IGNORED_PREFIXES):
+        return False
+    if path in (config.TEMPLATE_FILE, config.CONFIG_PATH):
+        return True
+    try:
+        path.relative_to(config.NOTES_DIR)
+    except ValueError:
+        return False
+    # Directories matter too: adding or removing one changes the tree.
+    return path.suffix in (".md", ".html") or not path.suffix
+
+
+class PollingWatcher:
+    """Detects changes by comparing ``(mtime_ns, size)`` snapshots of the watched files."""
+
+    kind = "polling"
+
+    def __init__(self, roots: Iterable[Path], interval: float = 1.0):
+        self.roots = list(roots)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot: Dict[Path, Tuple[int, int]] = {}
+        for root in self.roots:
+            if root.is_file():
+                st = root.stat()
+                snapshot[root] = (st.st_mtime_ns, st.st_size)
+                continue
+            stack = [str(root)]
+            while stack:
+                try:
+                    entries = list(os.scandir(stack.pop()))
+                except OSError:
+                    continue
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.endswith((".md", ".html")):
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            continue
+                        snapshot[Path(entry.path)] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self, timeout: Optional[float] = None) -> Set[Path]:
+        """Block until something changed (or ``timeout`` elapsed) and return the changed paths."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            current = self._scan()
+            previous, self._snapshot = self._snapshot, current
+            changed = {p for p in previous.keys() | current.keys() if previous.get(p) != current.get(p)}
+            if changed or (deadline is not None and time.monotonic() >= deadline):
+                return changed
+            time.sleep(self.interval if deadline is None else min(self.interval, max(0.0, deadline - time.monotonic())))
+
+    def close(self) -> None:
+        pass
+
+
+class WatchdogWatcher:
+    """Event based watcher backed by the optional ``watchdog`` package."""
+
+    kind = "watchdog"
+
+    def __init__(self, roots: Iterable[Path]):
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        self._queue: "queue.Queue[Path]" = queue.Queue()
+        events = self._queue
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event) -> None:  # type: ignore[override]
+                if event.event_type in ("opened", "closed_no_write"):
+                    return
+                for attr in ("src_path", "dest_path"):
+                    path = getattr(event, attr, None)
+                    if path:
+                        events.put(Path(os.fsdecode(path)))
+
+        self._observer = Observer()
+        for root in roots:
+            if root.is_dir():
+                self._observer.schedule(Handler(), str(root), recursive=True)
+            else:
+                # Single files are watched through their (non-recursive) parent directory.
+                self._observer.schedule(Handler(), str(root.parent), recursive=False)
+        self._observer.start()
+
+    def wait(self, timeout: Optional[float] = None) -> Set[Path]:
+        try:
+            changed = {self._queue.get(timeout=timeout)}
+        except queue.Empty:
+            return set()
+        while True:
+            try:
+                changed.add(self._queue.get_nowait())
+            except queue.Empty:
+                return changed
+
+    def close(self) -> None:
+        self._observer.stop()
+        self._observer.join()
+
+
+def create_watcher(roots: List[Path], interval: float = 1.0):
+    try:
+        return WatchdogWatcher(roots)
+    except ImportError:
+        return PollingWatcher(roots, interval)
+
+
+def watch(rebuild: Callable[[Set[Path]], None], interval: float = 1.0, debounce: float = 0.3) -> None:
+    """Call ``rebuild`` with the changed paths after each debounced burst of changes.
+
+    A change to config.json restarts the process, since the configuration is
+    read into module constants at import time.
+    """
+    watcher = create_watcher([config.NOTES_DIR, config.TEMPLATE_FILE, config.CONFIG_PATH], interval)
+    logger.info("👀 正在监听 %s、template.html 和 config.json 的变更（%s，Ctrl+C 退出）", config.NOTES_DIR.name, watcher.kind)
+    try:
+        while True:
+            changed = watcher.wait()
+            # Keep collecting until the burst of saves has settled.
+            while True:
+                more = watcher.wait(timeout=debounce)
+                if not more:
+                    break
+                changed |= more
+            changed = {p for p in changed if is_relevant(p)}
+            if not changed:
+                continue
+
+            if config.CONFIG_PATH in changed:
+                logger.info("config.json 已变更，重新启动...")
+                watcher.close()
+                os.execv(sys.executable, [sys.executable, *sys.argv])
+
+            names = ", ".join(sorted(str(p.relative_to(config.ROOT_DIR)) for p in changed)[:5])
+            logger.info("检测到 %s 个变更: %s%s", len(changed), names, " ..." if len(changed) > 5 else "")
+            started = time.perf_counter()
+            try:
+                rebuild(changed)
+            except Exception:
+                logger.exception("处理变更失败，等待下一次变更")
+                continue
+            logger.info("✅ 更新完成（%.2fs）", time.perf_counter() - started)
+    except KeyboardInterrupt:
+        logger.info("停止监听")
+    finally:
+        watcher.close()
@@ -1,11 +1,26 @@
 // Service Worker for Ken's Knowledge Base
 // 提供离线访问和缓存管理
 
-// Bump this when core assets (style/script) change to avoid stale SW caches in browsers like Chrome.
-const CACHE_VERSION = 'v2.2.0';
+// 构建生成的预缓存清单（generate_nav.py 写入 dist/precache-manifest.js）：
+// self.__PRECACHE_MANIFEST = { version, entries: [{ url, revision }] }
+// revision 为 null 的是带内容哈希的文件名，内容变化时 URL 随之变化。
+// importScripts 的文件在更新检查时会逐字节比较，清单变化即触发 Service Worker 更新，无需手动改版本号。
+try {
+    importScripts('/dist/precache-manifest.js');
+} catch (error) {
+    console.log('[SW] 预缓存清单不可用，使用默认核心资源');
+}
+
+const PRECACHE_MANIFEST = self.__PRECACHE_MANIFEST || null;
+
+// 只在缓存结构变化时修改；内容更新由清单中每个 URL 的 revision 控制
+const CACHE_VERSION = 'v3';
 const CACHE_NAME = `blog-cache-${CACHE_VERSION}`;
 
-// 需要缓存的核心资源
+// 缓存中记录各 URL 已缓存 revision 的条目
+const REVISIONS_KEY = '/__precache-revisions__';
+
+// 清单不可用时缓存的核心资源
 const CORE_ASSETS = [
     '/',
     '/index.html',
@@ -20,21 +35,19 @@ const CACHED_PAGES = [];
 // 不需要缓存的资源
 const EXCLUDED_PATHS = [
     '/sw.js',
-    '/manifest.json'
+    '/manifest.json',
+    '/dist/precache-manifest.js'
 ];
 
+// 带内容哈希的静态资源，URL 不变则内容不变
+const IMMUTABLE_PREFIX = '/dist/assets/';
+
 // ====== 安装事件 ======
 self.addEventListener('install', (event) => {
     console.log('[SW] 开始安装 Service Worker');
     
     event.waitUntil(
-        caches.open(CACHE_NAME)
-            .then((cache) => {
-                console.log('[SW] 缓存核心资源');
-                // Force reload to bypass HTTP cache and avoid serving stale core assets.
-                const requests = CORE_ASSETS.map((url) => new Request(url, { cache: 'reload' }));
-                return cache.addAll(requests);
-            })
+        precache()
             .then(() => {
                 console.log('[SW] Service Worker 安装完成');
                 return self.skipWaiting();
@@ -45,6 +58,45 @@ self.addEventListener('install', (event) => {
     );
 });
 
+/**
+ * 按清单预缓存：只下载 revision 变化或尚未缓存的 URL，删除清单中已移除的 URL
+ */
+async function precache() {
+    const cache = await caches.open(CACHE_NAME);
+    const entries = PRECACHE_MANIFEST
+        ? PRECACHE_MANIFEST.entries
+        : CORE_ASSETS.map((url) => ({ url, revision: CACHE_VERSION }));
+
+    const stored = await cache.match(REVISIONS_KEY);
+    const previous = stored ? await stored.json() : {};
+    const revisions = {};
+    const changed = [];
+
+    for (const { url, revision } of entries) {
+        revisions[url] = revision;
+        if (url in previous && previous[url] === revision && await cache.match(url)) {
+            continue;
+        }
+        changed.push(url);
+    }
+
+    console.log(`[SW] 预缓存 ${entries.length} 项，其中 ${changed.length} 项需要下载`);
+    // Force reload to bypass HTTP cache and avoid serving stale core assets.
+    await cache.addAll(changed.map((url) => new Request(url, { cache: 'reload' })));
+
+    // 清单中已移除的 URL，以及不再引用的旧哈希资源
+    const cachedUrls = (await cache.keys()).map((request) => new URL(request.url).pathname);
+    const stale = Object.keys(previous).concat(cachedUrls.filter((url) => url.startsWith(IMMUTABLE_PREFIX)));
+    await Promise.all(
+        stale
+            .filter((url) => !(url in revisions))
+            .map((url) => cache.delete(url))
+    );
+    await cache.put(REVISIONS_KEY, new Response(JSON.stringify(revisions), {
+        headers: { 'Content-Type': 'application/json' }
+    }));
+}
+
 // ====== 激活事件 ======
 self.addEventListener('activate', (event) => {
     console.log('[SW] 激活 Service Worker');
@@ -84,6 +136,12 @@ self.addEventListener('fetch', (event) => {
         return;
     }
     
+    // 带内容哈希的资源永不变化：命中缓存直接返回，不做后台更新
+    if (url.pathname.startsWith(IMMUTABLE_PREFIX)) {
+        event.respondWith(immutableFirst(request));
+        return;
+    }
+    
     // 对于包含 /notes/ 或 /dist/ 的路径，始终使用 Network First 策略
     // /notes/ - 避免中文 URL 编码导致的缓存不匹配问题
     // /dist/ - 动态生成的页面，需要及时更新
@@ -173,6 +231,29 @@ async function cacheFirst(request) {
     }
 }
 
+/**
+ * Immutable 策略
+ * 缓存命中即返回；未命中时从网络获取并缓存
+ */
+async function immutableFirst(request) {
+    const cache = await caches.open(CACHE_NAME);
+    const cached = await cache.match(request);
+    if (cached) {
+        return cached;
+    }
+    
+    try {
+        const response = await fetch(request);
+        if (response && response.status === 200 && request.method === 'GET') {
+            cache.put(request, response.clone()).catch(() => {});
+        }
+        return response;
+    } catch (error) {
+        console.log('[SW] 网络请求失败:', request.url);
+        return new Response('Network error', { status: 503, statusText: 'Service Unavailable' });
+    }
+}
+
 /**
  * Network First 策略
  * 优先从网络获取，如果网络失败，则从缓存读取